@@ -1,9 +1,11 @@
 import streamlit as st
-import json
-import pandas as pd
 from datetime import datetime, timedelta
 import os
-import hashlib
+import time
+
+from gestion_presences import agregats, alertes, calendrier, emploi_du_temps, export, mesures
+from gestion_presences.cache import CacheTableaux
+from gestion_presences.ecole import HEURES_PAR_MATIERE, Ecole, semaine_en_cours
 
 # Configuration de la page
 st.set_page_config(
@@ -12,120 +14,57 @@ st.set_page_config(
     layout="wide"
 )
 
-# Définition des matières par jour avec leurs professeurs
-matieres_par_jour = {
-    "Lundi": [
-        {"nom": "Mathématiques", "prof": "M. Dupont", "tel": "01 23 45 67 89"},
-        {"nom": "Français", "prof": "Mme. Martin", "tel": "01 34 56 78 90"},
-        {"nom": "TPA-concept", "prof": "M. Leroy", "tel": "01 45 67 89 01"}
-    ],
-    "Mardi": [
-        {"nom": "Physique-Chimie", "prof": "Mme. Bernard", "tel": "01 56 78 90 12"},
-        {"nom": "Mathématiques", "prof": "M. Dupont", "tel": "01 23 45 67 89"},
-        {"nom": "TPA-cao", "prof": "M. Petit", "tel": "01 67 89 01 23"},
-        {"nom": "EPS", "prof": "M. Robert", "tel": "01 78 90 12 34"}
-    ],
-    "Mercredi": [
-        {"nom": "Technologie", "prof": "M. Richard", "tel": "01 89 01 23 45"},
-        {"nom": "Informatique", "prof": "Mme. Durand", "tel": "01 90 12 34 56"},
-        {"nom": "Physique-Chimie", "prof": "Mme. Bernard", "tel": "01 56 78 90 12"}
-    ],
-    "Jeudi": [
-        {"nom": "Construction mécanique", "prof": "M. Simon", "tel": "02 12 34 56 78"},
-        {"nom": "Histoire-Géo", "prof": "Mme. Laurent", "tel": "02 23 45 67 89"},
-        {"nom": "Dessin", "prof": "M. Michel", "tel": "02 34 56 78 90"}
-    ],
-    "Vendredi": [
-        {"nom": "Électronique", "prof": "M. Moreau", "tel": "02 45 67 89 01"},
-        {"nom": "Anglais", "prof": "Mme. Thomas", "tel": "02 56 78 90 12"}
-    ]
-}
+# Début du passage, pour les mesures de performance (voir gestion_presences.mesures)
+debut_passage = time.perf_counter()
+
+heures_par_matiere = HEURES_PAR_MATIERE
 
-jours = list(matieres_par_jour.keys())
-heures_par_matiere = 3
+# Moteur de stockage : "json" (presences_data.json + journal), "binaire" (presences_data.bin + journal) ou "sqlite"
+MOTEUR_STOCKAGE = os.environ.get("PRESENCES_STOCKAGE", "json")
 
-# Fonction pour hacher les mots de passe
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+# pandas n'est importé que par les pages qui construisent des tableaux : l'écran de
+# connexion, la gestion des élèves et les boutons de modification s'en passent
 
-# Initialisation des données
-if 'donnees_chargees' not in st.session_state:
-    st.session_state.donnees_chargees = False
-    st.session_state.eleves = []
-    st.session_state.presences = {}
-    st.session_state.mot_de_passe_hash = ""
+# Initialisation de la session (les données elles-mêmes sont partagées, voir plus bas)
+if 'authentifie' not in st.session_state:
     st.session_state.authentifie = False
-    st.session_state.professeurs = {}
 
-# Chargement des données
-def charger_donnees():
-    try:
-        with open('presences_data.json', 'r') as f:
-            data = json.load(f)
-            st.session_state.eleves = data.get('eleves', [f"Élève {i+1}" for i in range(31)])
-            st.session_state.presences = data.get('presences', {})
-            st.session_state.mot_de_passe_hash = data.get('mot_de_passe_hash', hash_password("admin123"))
-            st.session_state.professeurs = data.get('professeurs', {})
-            st.session_state.donnees_chargees = True
-    except FileNotFoundError:
-        # Initialisation par défaut
-        st.session_state.eleves = [f"Élève {i+1}" for i in range(31)]
-        st.session_state.mot_de_passe_hash = hash_password("admin123")
-        
-        # Initialiser les professeurs depuis la structure matieres_par_jour
-        st.session_state.professeurs = {}
-        for jour in matieres_par_jour:
-            for matiere_info in matieres_par_jour[jour]:
-                matiere_nom = matiere_info["nom"]
-                if matiere_nom not in st.session_state.professeurs:
-                    st.session_state.professeurs[matiere_nom] = {
-                        "nom": matiere_info["prof"],
-                        "telephone": matiere_info["tel"]
-                    }
-        
-        st.session_state.donnees_chargees = True
-        sauvegarder_donnees()
+# Établissement (registre des classes, voir gestion_presences.ecole) : chargé une fois par
+# processus, partagé par toutes les sessions. Les données de chaque classe ne sont ouvertes que lorsqu'une session la sélectionne.
+@st.cache_resource
+def charger_ecole():
+    return Ecole(MOTEUR_STOCKAGE, heures_par_matiere=heures_par_matiere)
 
 def sauvegarder_donnees():
-    data = {
-        'eleves': st.session_state.eleves,
-        'presences': st.session_state.presences,
-        'mot_de_passe_hash': st.session_state.mot_de_passe_hash,
-        'professeurs': st.session_state.professeurs
-    }
-    with open('presences_data.json', 'w') as f:
-        json.dump(data, f, indent=4)
+    """Force l'écriture complète des données (compaction du journal pour le moteur JSON)"""
+    with mesures.chrono(page, "écriture (ms)"):
+        stockage.sauvegarder()
+
+def moteur_statistiques():
+    """Moteur de statistiques de la classe, recalculé à chaque nouvelle version de ses données"""
+    return classe_ouverte.statistiques()
 
-def initialiser_semaine():
-    date_actuelle = datetime.now().strftime("%Y-%m-%d")
-    
-    if date_actuelle not in st.session_state.presences:
-        st.session_state.presences[date_actuelle] = {}
-        for jour in jours:
-            st.session_state.presences[date_actuelle][jour] = {}
-            for matiere_info in matieres_par_jour[jour]:
-                matiere_nom = matiere_info["nom"]
-                st.session_state.presences[date_actuelle][jour][matiere_nom] = {}
-                for eleve in st.session_state.eleves:
-                    st.session_state.presences[date_actuelle][jour][matiere_nom][eleve] = ""
+# Tableaux dérivés des données, partagés par toutes les sessions du processus
+@st.cache_resource
+def cache_tableaux():
+    return CacheTableaux()
 
-def obtenir_info_professeur(matiere_nom):
-    """Récupère les informations du professeur pour une matière"""
-    if matiere_nom in st.session_state.professeurs:
-        prof_info = st.session_state.professeurs[matiere_nom]
-        return f"{prof_info['nom']} - 📞 {prof_info['telephone']}"
-    
-    # Fallback : chercher dans matieres_par_jour
-    for jour in matieres_par_jour:
-        for matiere_info in matieres_par_jour[jour]:
-            if matiere_info["nom"] == matiere_nom:
-                return f"{matiere_info['prof']} - 📞 {matiere_info['tel']}"
-    
-    return "Professeur non défini"
+def tableau(nom, fabrique, plage=None, version=None):
+    """Tableau rangé sous (page, classe, nom, plage, version des données), construit par `fabrique()`
+    au premier accès. Il est partagé entre les sessions : ne pas le modifier."""
+    cle = (page, st.session_state.classe, nom, plage, stockage.version if version is None else version)
+    return cache_tableaux().obtenir(cle, fabrique)
 
-# Charger les données au démarrage
-if not st.session_state.donnees_chargees:
-    charger_donnees()
+# API des lecteurs de badges (PRESENCES_INGESTION_PORT) : un serveur par processus, sur le même
+# établissement que les pages
+@st.cache_resource
+def demarrer_ingestion():
+    from gestion_presences import ingestion
+    return ingestion.demarrer(charger_ecole())
+
+ecole = charger_ecole()
+ecole.verifier_fraicheur()
+serveur_ingestion = demarrer_ingestion() if os.environ.get("PRESENCES_INGESTION_PORT") else None
 
 # Page de connexion
 if not st.session_state.authentifie:
@@ -138,13 +77,14 @@ if not st.session_state.authentifie:
             mot_de_passe = st.text_input("Mot de passe", type="password")
             
             if st.form_submit_button("Se connecter"):
-                if hash_password(mot_de_passe) == st.session_state.mot_de_passe_hash:
+                if ecole.verifier_mot_de_passe(mot_de_passe):
                     st.session_state.authentifie = True
                     st.rerun()
                 else:
                     st.error("Mot de passe incorrect")
         st.info("Mot de passe par défaut : admin123")
     
+    mesures.enregistrer("🔐 Connexion", "passage complet (ms)", (time.perf_counter() - debut_passage) * 1000)
     st.stop()
 
 # ============================================
@@ -152,50 +92,89 @@ if not st.session_state.authentifie:
 # ============================================
 
 st.sidebar.title("🏫 Navigation")
+classes = {classe["id"]: classe["nom"] for classe in ecole.classes}
+if "classe_creee" in st.session_state:
+    # Classe créée au passage précédent : elle devient la classe sélectionnée
+    st.session_state.classe = st.session_state.pop("classe_creee")
+if st.session_state.get("classe") not in classes:
+    st.session_state.classe = next(iter(classes))
+st.sidebar.selectbox("Classe", list(classes), format_func=classes.get, key="classe")
+
+# Données de la classe sélectionnée (rechargées si le fichier a été modifié hors de l'application)
+debut_chargement = time.perf_counter()
+classe_ouverte = ecole.classe(st.session_state.classe)
+stockage = classe_ouverte.stockage
+stockage.verifier_fraicheur()
+matieres_par_jour = dict(stockage.emploi_du_temps)
+# Index matière → professeur, jour → créneaux, professeur → créneaux de la classe
+edt = classe_ouverte.emploi_du_temps()
+# Les tableaux tirés de l'emploi du temps ne changent qu'avec lui ou les professeurs
+version_edt = emploi_du_temps.revision(stockage)
+jours = edt.jours
+
 page = st.sidebar.selectbox(
     "Menu",
     ["📋 Tableau de bord", "👥 Gérer les élèves", "👨‍🏫 Gérer les professeurs", 
      "📝 Saisir les présences", "✏️ Modifier une présence", "📊 Statistiques", 
      "📅 Emploi du temps", "⚙️ Paramètres"]
 )
-
-# Initialiser la semaine si nécessaire
-initialiser_semaine()
+mesures.enregistrer(page, "chargement (ms)", (time.perf_counter() - debut_chargement) * 1000)
 
 # Page 1 : Tableau de bord
 if page == "📋 Tableau de bord":
     st.title("📋 Tableau de bord")
+    import pandas as pd
     
     # Afficher l'emploi du temps récapitulatif
     st.subheader("📅 Emploi du temps de la semaine")
     
     # Créer un dataframe pour l'emploi du temps
-    edt_data = []
-    for jour in jours:
-        for matiere_info in matieres_par_jour[jour]:
-            prof_info = obtenir_info_professeur(matiere_info["nom"])
+    def tableau_edt():
+        edt_data = []
+        for creneau in edt.creneaux:
             edt_data.append({
-                "Jour": jour,
-                "Matière": matiere_info["nom"],
-                "Professeur": prof_info.split(" - 📞")[0],
-                "Téléphone": prof_info.split("📞 ")[1] if "📞" in prof_info else "",
+                "Jour": creneau.jour,
+                "Matière": creneau.matiere,
+                "Professeur": creneau.professeur.nom,
+                "Téléphone": creneau.professeur.telephone,
                 "Heures": heures_par_matiere
             })
+        return pd.DataFrame(edt_data)
     
-    edt_df = pd.DataFrame(edt_data)
+    edt_df = tableau("emploi du temps", tableau_edt, version=version_edt)
     st.dataframe(edt_df, use_container_width=True, hide_index=True)
     
     # Stats rapides
     col1, col2, col3 = st.columns(3)
     with col1:
-        total_matieres = sum(len(matieres) for matieres in matieres_par_jour.values())
+        total_matieres = len(edt.creneaux)
         st.metric("Total matières", total_matieres)
     with col2:
-        st.metric("Nombre d'élèves", len(st.session_state.eleves))
+        st.metric("Nombre d'élèves", len(stockage.eleves))
     with col3:
         total_heures = total_matieres * heures_par_matiere
         st.metric("Heures/semaine", f"{total_heures}h")
     
+    # Cumul depuis le début, lu dans les compteurs sans parcourir l'historique
+    cumul = [sum(colonne) for colonne in zip(*agregats.par_eleve(stockage.cumul(), len(stockage.eleves)))] or [0, 0, 0, 0]
+    col1, col2 = st.columns(2)
+    with col1:
+        seances_saisies = cumul[agregats.SEANCES_PRESENTES] + cumul[agregats.SEANCES_ABSENTES]
+        taux_global = cumul[agregats.SEANCES_PRESENTES] * 100 / seances_saisies if seances_saisies else 0
+        st.metric("Taux de présence cumulé", f"{taux_global:.1f}%")
+    with col2:
+        st.metric("Heures d'absence cumulées", f"{cumul[agregats.HEURES_ABSENTES]:g}h")
+    
+    # Alertes d'absence, réévaluées pour les seuls élèves touchés par les dernières saisies
+    st.subheader("🚨 Alertes d'absence")
+    alertes_actives = classe_ouverte.alertes().actives()
+    if alertes_actives:
+        st.dataframe(pd.DataFrame([{"Élève": alerte.eleve, "Règle": alerte.regle, "Détail": alerte.detail}
+                                   for alerte in alertes_actives]),
+                     use_container_width=True, hide_index=True)
+    else:
+        st.success(f"✅ Aucune alerte sur les {alertes.seuils(stockage)['semaines']} dernières semaines")
+    
     # Actions rapides
     st.subheader("Actions rapides")
     col1, col2, col3 = st.columns(3)
@@ -223,7 +202,7 @@ elif page == "👥 Gérer les élèves":
     
     with tab1:
         st.subheader("Liste des élèves")
-        for i, eleve in enumerate(st.session_state.eleves, 1):
+        for i, eleve in enumerate(stockage.eleves, 1):
             st.write(f"{i}. {eleve}")
     
     with tab2:
@@ -234,30 +213,65 @@ elif page == "👥 Gérer les élèves":
             mot_de_passe = st.text_input("Confirmez avec le mot de passe", type="password")
             
             if st.form_submit_button("Continuer"):
-                if hash_password(mot_de_passe) == st.session_state.mot_de_passe_hash:
+                if ecole.verifier_mot_de_passe(mot_de_passe):
                     st.session_state.modification_active = True
                     st.success("Mot de passe correct. Vous pouvez maintenant modifier les noms.")
                 else:
                     st.error("Mot de passe incorrect")
         
         if st.session_state.get('modification_active', False):
+            import pandas as pd
+            st.caption("Les présences sont rattachées à la position de l'élève, pas à son nom : "
+                       "un renommage ne touche pas aux présences. Seules les lignes modifiées sont enregistrées.")
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                recherche = st.text_input("🔎 Rechercher un élève", key="recherche_eleves").strip().lower()
+            positions = [i for i, eleve in enumerate(stockage.eleves) if recherche in eleve.lower()]
+            par_page = 25
+            nb_pages = max(1, -(-len(positions) // par_page))
+            with col2:
+                page_noms = st.number_input("Page", min_value=1, max_value=nb_pages, value=1, key="page_eleves")
+            positions = positions[(page_noms - 1) * par_page:page_noms * par_page]
+            st.caption(f"Page {page_noms}/{nb_pages}")
+            
             with st.form("form_noms"):
-                nouveaux_noms = []
-                for i in range(31):
-                    nom_actuel = st.session_state.eleves[i] if i < len(st.session_state.eleves) else f"Élève {i+1}"
-                    nouveau_nom = st.text_input(f"Élève {i+1}", value=nom_actuel, key=f"eleve_{i}")
-                    nouveaux_noms.append(nouveau_nom)
+                lignes_noms = pd.DataFrame({"N°": [i + 1 for i in positions],
+                                            "Nom": [stockage.eleves[i] for i in positions]},
+                                           index=positions)
+                noms_modifies = st.data_editor(
+                    lignes_noms,
+                    num_rows="fixed",
+                    hide_index=True,
+                    disabled=["N°"],
+                    use_container_width=True,
+                    key=f"noms_{st.session_state.classe}_{stockage.revisions.get('eleves')}_{recherche}_{page_noms}",
+                )
                 
                 if st.form_submit_button("Enregistrer les modifications"):
-                    st.session_state.eleves = nouveaux_noms
-                    sauvegarder_donnees()
-                    st.session_state.modification_active = False
-                    st.success("Noms mis à jour avec succès !")
-                    st.rerun()
+                    renommages = {position: nom for position, nom in noms_modifies["Nom"].fillna("").items()
+                                  if nom != lignes_noms.at[position, "Nom"]}
+                    try:
+                        renommes = stockage.renommer_eleves(renommages)
+                    except ValueError as erreur:
+                        st.error(f"❌ {erreur}")
+                    else:
+                        st.session_state.resultat_noms = len(renommes)
+                        st.rerun()
+            
+            renommes = st.session_state.pop('resultat_noms', None)
+            if renommes:
+                st.success(f"✅ {renommes} nom(s) mis à jour avec succès !")
+            elif renommes == 0:
+                st.info("Aucune modification à enregistrer.")
+            
+            if st.button("🔒 Terminer les modifications"):
+                st.session_state.modification_active = False
+                st.rerun()
 
 # NOUVELLE PAGE : Gérer les professeurs
 elif page == "👨‍🏫 Gérer les professeurs":
     st.title("👨‍🏫 Gestion des professeurs")
+    import pandas as pd
     
     tab1, tab2 = st.tabs(["📋 Liste des professeurs", "✏️ Modifier les professeurs"])
     
@@ -265,27 +279,12 @@ elif page == "👨‍🏫 Gérer les professeurs":
         st.subheader("Liste des professeurs par matière")
         
         # Créer un dataframe des professeurs
-        prof_data = []
-        for jour in jours:
-            for matiere_info in matieres_par_jour[jour]:
-                matiere_nom = matiere_info["nom"]
-                prof_info = st.session_state.professeurs.get(matiere_nom, {
-                    "nom": matiere_info["prof"],
-                    "telephone": matiere_info["tel"]
-                })
-                prof_data.append({
-                    "Matière": matiere_nom,
-                    "Professeur": prof_info["nom"],
-                    "Téléphone": prof_info["telephone"],
-                    "Jour(s)": jour
-                })
-        
-        # Supprimer les doublons
-        df_prof = pd.DataFrame(prof_data)
-        df_prof_unique = df_prof.drop_duplicates(subset=["Matière"])
-        
-        st.dataframe(df_prof_unique[["Matière", "Professeur", "Téléphone"]], 
-                    use_container_width=True, hide_index=True)
+        df_prof = tableau("professeurs", lambda: pd.DataFrame(
+            [{"Matière": matiere, "Professeur": edt.professeur(matiere).nom,
+              "Téléphone": edt.professeur(matiere).telephone} for matiere in edt.matieres],
+            columns=["Matière", "Professeur", "Téléphone"]), version=version_edt)
+        
+        st.dataframe(df_prof, use_container_width=True, hide_index=True)
     
     with tab2:
         st.subheader("Modifier les informations des professeurs")
@@ -295,7 +294,7 @@ elif page == "👨‍🏫 Gérer les professeurs":
             mot_de_passe = st.text_input("Confirmez avec le mot de passe", type="password")
             
             if st.form_submit_button("Continuer"):
-                if hash_password(mot_de_passe) == st.session_state.mot_de_passe_hash:
+                if ecole.verifier_mot_de_passe(mot_de_passe):
                     st.session_state.modif_prof_active = True
                     st.success("Accès autorisé. Vous pouvez modifier les informations.")
                 else:
@@ -303,11 +302,7 @@ elif page == "👨‍🏫 Gérer les professeurs":
         
         if st.session_state.get('modif_prof_active', False):
             # Liste de toutes les matières uniques
-            toutes_matieres = []
-            for jour in matieres_par_jour:
-                for matiere_info in matieres_par_jour[jour]:
-                    if matiere_info["nom"] not in toutes_matieres:
-                        toutes_matieres.append(matiere_info["nom"])
+            toutes_matieres = edt.matieres
             
             with st.form("form_modif_prof"):
                 st.subheader("Modifier les informations")
@@ -315,7 +310,7 @@ elif page == "👨‍🏫 Gérer les professeurs":
                 matiere_selectionnee = st.selectbox("Sélectionnez une matière", toutes_matieres)
                 
                 # Récupérer les informations actuelles
-                prof_info_actuel = st.session_state.professeurs.get(matiere_selectionnee, {})
+                prof_info_actuel = stockage.professeurs.get(matiere_selectionnee, {})
                 nom_actuel = prof_info_actuel.get("nom", "")
                 tel_actuel = prof_info_actuel.get("telephone", "")
                 
@@ -327,11 +322,12 @@ elif page == "👨‍🏫 Gérer les professeurs":
                 with col1:
                     if st.form_submit_button("💾 Enregistrer les modifications"):
                         if nouveau_nom and nouveau_tel:
-                            st.session_state.professeurs[matiere_selectionnee] = {
+                            professeurs = dict(stockage.professeurs)
+                            professeurs[matiere_selectionnee] = {
                                 "nom": nouveau_nom,
                                 "telephone": nouveau_tel
                             }
-                            sauvegarder_donnees()
+                            stockage.ecrire_parametre('professeurs', professeurs)
                             st.success(f"✅ Informations mises à jour pour {matiere_selectionnee}")
                             st.rerun()
                         else:
@@ -342,94 +338,135 @@ elif page == "👨‍🏫 Gérer les professeurs":
                         st.session_state.modif_prof_active = False
                         st.rerun()
 
-# Page 4 : Saisir les présences (MODIFIÉE pour afficher prof)
+# Page 4 : Saisir les présences (grille de la semaine entière)
 elif page == "📝 Saisir les présences":
     st.title("📝 Saisie des présences")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        jour = st.selectbox("Sélectionnez le jour", jours)
-    
-    with col2:
-        # Afficher uniquement les matières du jour sélectionné
-        matieres_du_jour = [m["nom"] for m in matieres_par_jour[jour]]
-        matiere_selectionnee = st.selectbox("Sélectionnez la matière", matieres_du_jour)
-    
-    # Récupérer les informations du professeur
-    prof_info = obtenir_info_professeur(matiere_selectionnee)
-    
-    # Afficher les informations de la matière et du professeur
-    st.subheader(f"Présences pour le {jour}")
-    
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.info(f"**Matière:** {matiere_selectionnee}")
-    with col2:
-        st.info(f"**Professeur:** {prof_info.split(' - 📞')[0]}")
-    with col3:
-        if "📞" in prof_info:
-            st.info(f"**Téléphone:** {prof_info.split('📞 ')[1]}")
-    
-    date_actuelle = datetime.now().strftime("%Y-%m-%d")
-    
-    # Créer un formulaire pour les présences
-    with st.form("form_presences"):
-        presences_data = {}
+    import pandas as pd
+    
+    semaine_actuelle = semaine_en_cours()
+    cle_grille = f"grille_{st.session_state.classe}_{semaine_actuelle}"
+    
+    # Colonnes de la grille : un créneau (jour, matière) par colonne
+    creneaux_grille = {f"{c.jour} · {c.matiere}": (c.jour, c.matiere) for c in edt.creneaux}
+    symboles = {"yes": "✅", "no": "❌"}
+    statuts_grille = {"✅": "yes", "❌": "no"}
+    
+    def lire_grille():
+        # Une seule requête pour les statuts de toute la semaine
+        statuts_semaine = stockage.statuts_semaine(semaine_actuelle)
+        return pd.DataFrame(
+            {
+                colonne: [symboles.get(statuts_semaine.get(creneau, {}).get(eleve)) for eleve in stockage.eleves]
+                for colonne, creneau in creneaux_grille.items()
+            },
+            index=pd.Index(stockage.eleves, name="Élève"),
+        )
+    
+    # Grille telle que l'enseignant la voit : base de la fusion avec les saisies
+    # faites entre-temps par d'autres sessions, relue après chaque enregistrement.
+    # Elle n'est remplacée qu'avec un nouvel éditeur (génération suivante) : des
+    # modifications en cours ne sont jamais réappliquées sur une base non vue.
+    stockage.verifier_fraicheur()
+    if st.session_state.get(f"{cle_grille}_version") != stockage.version:
+        # Version relevée avant la lecture : une écriture intercalée sera vue comme un conflit
+        version = stockage.version
+        grille = lire_grille()
+        base = st.session_state.get(f"{cle_grille}_base")
+        if base is None or not grille.equals(base):
+            st.session_state[f"{cle_grille}_base"] = grille
+            st.session_state[f"{cle_grille}_generation"] = st.session_state.get(f"{cle_grille}_generation", 0) + 1
+        st.session_state[f"{cle_grille}_version"] = version
+    
+    def enregistrer_grille(grille_vue, cle_editeur, generation):
+        """Écrit les cellules modifiées, avec le statut que l'enseignant avait sous les yeux
+        pour ne pas écraser une saisie faite entre-temps par une autre session"""
+        modifications = {}
+        vus = {}
+        for ligne, valeurs in st.session_state.get(cle_editeur, {}).get("edited_rows", {}).items():
+            eleve = grille_vue.index[int(ligne)]
+            for colonne, valeur in valeurs.items():
+                avant = grille_vue.iloc[int(ligne)][colonne]
+                avant = None if pd.isna(avant) else avant
+                if avant != valeur:
+                    modifications.setdefault(creneaux_grille[colonne], {})[eleve] = statuts_grille.get(valeur, "")
+                    vus.setdefault(creneaux_grille[colonne], {})[eleve] = statuts_grille.get(avant, "")
+        with mesures.chrono(page, "écriture (ms)"):
+            conflits = stockage.ecrire_lot(semaine_actuelle, modifications, vus,
+                                           st.session_state[f"{cle_grille}_version"]) if modifications else []
         
-        # Diviser les élèves en deux colonnes pour plus de lisibilité
-        col1, col2 = st.columns(2)
+        # Nouvelle grille sur les données à jour, qui incluent les saisies des autres sessions
+        st.session_state[f"{cle_grille}_version"] = stockage.version
+        st.session_state[f"{cle_grille}_base"] = lire_grille()
+        st.session_state[f"{cle_grille}_generation"] = generation + 1
+        st.session_state[f"{cle_grille}_resultat"] = (modifications, conflits)
+    
+    @st.fragment
+    def saisie_semaine():
+        """Grille de la semaine : l'enregistrement ne réexécute que cette zone"""
+        st.subheader(f"Semaine {semaine_actuelle}")
+        st.caption("Une ligne par élève, une colonne par créneau : ✅ présent, ❌ absent, case vide = non défini. "
+                   "Seules les cellules modifiées sont enregistrées, en une seule écriture.")
         
-        for i, eleve in enumerate(st.session_state.eleves):
-            target_col = col1 if i % 2 == 0 else col2
-            
-            with target_col:
-                valeur_actuelle = st.session_state.presences.get(date_actuelle, {}).get(jour, {}).get(matiere_selectionnee, {}).get(eleve, "")
-                statut_initial = valeur_actuelle == "yes"
-                
-                presence = st.checkbox(
-                    eleve,
-                    value=statut_initial,
-                    key=f"presence_{jour}_{matiere_selectionnee}_{eleve}"
-                )
-                presences_data[eleve] = "yes" if presence else "no"
+        grille_initiale = st.session_state[f"{cle_grille}_base"]
+        generation = st.session_state.get(f"{cle_grille}_generation", 0)
+        cle_editeur = f"{cle_grille}_{generation}"
         
-        # Bouton de soumission
-        col1, col2, col3 = st.columns([2, 1, 2])
-        with col2:
-            soumettre = st.form_submit_button("💾 Enregistrer les présences", use_container_width=True)
-        
-        if soumettre:
-            # Initialiser la structure si nécessaire
-            if date_actuelle not in st.session_state.presences:
-                st.session_state.presences[date_actuelle] = {}
-            if jour not in st.session_state.presences[date_actuelle]:
-                st.session_state.presences[date_actuelle][jour] = {}
-            if matiere_selectionnee not in st.session_state.presences[date_actuelle][jour]:
-                st.session_state.presences[date_actuelle][jour][matiere_selectionnee] = {}
-            
-            # Mettre à jour les données
-            for eleve, statut in presences_data.items():
-                st.session_state.presences[date_actuelle][jour][matiere_selectionnee][eleve] = statut
-            
-            sauvegarder_donnees()
-            st.success(f"✅ Présences enregistrées pour le {jour} en {matiere_selectionnee} !")
+        with st.form("form_presences"):
+            st.data_editor(
+                grille_initiale,
+                use_container_width=True,
+                num_rows="fixed",
+                column_config={
+                    colonne: st.column_config.SelectboxColumn(
+                        colonne, options=["✅", "❌"], help=f"{edt.professeur(matiere).nom} - 📞 {edt.professeur(matiere).telephone}"
+                    )
+                    for colonne, (_, matiere) in creneaux_grille.items()
+                },
+                key=cle_editeur,
+            )
+        
+            col1, col2, col3 = st.columns([2, 1, 2])
+            with col2:
+                # Enregistrement dans le rappel : la grille affichée ensuite est déjà relue
+                st.form_submit_button("💾 Enregistrer les présences", use_container_width=True,
+                                      on_click=enregistrer_grille, args=(grille_initiale, cle_editeur, generation))
+        
+        resultat = st.session_state.pop(f"{cle_grille}_resultat", None)
+        if resultat is not None:
+            modifications, conflits = resultat
+            en_conflit = {(jour, matiere, eleve) for jour, matiere, eleve, _, _ in conflits}
+            ecrites = [(creneau, eleve) for creneau, statuts in modifications.items()
+                       for eleve in statuts if (*creneau, eleve) not in en_conflit]
+            if ecrites:
+                st.success(f"✅ {len(ecrites)} présence(s) enregistrée(s) sur "
+                           f"{len({creneau for creneau, _ in ecrites})} créneau(x) !")
+            elif not conflits:
+                st.info("Aucune modification à enregistrer.")
+            if conflits:
+                st.warning(f"⚠️ {len(conflits)} cellule(s) modifiée(s) entre-temps par une autre session "
+                           "n'ont pas été écrasées :")
+                st.dataframe(pd.DataFrame(
+                    [{"Jour": jour, "Matière": matiere, "Élève": eleve,
+                      "Enregistré": symboles.get(actuel, "⚪"), "Votre saisie": symboles.get(saisi, "⚪")}
+                     for jour, matiere, eleve, actuel, saisi in conflits]),
+                    use_container_width=True, hide_index=True)
             
-            # Afficher un récapitulatif
+            # Afficher un récapitulatif de la semaine
             st.subheader("📊 Récapitulatif")
-            presents = list(presences_data.values()).count("yes")
-            absents = list(presences_data.values()).count("no")
-            
-            col1, col2, col3, col4 = st.columns(4)
+            valeurs = grille_initiale.stack()
+            presents = int((valeurs == "✅").sum())
+            absents = int((valeurs == "❌").sum())
+        
+            col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Présents", f"{presents} élèves")
+                st.metric("Présences", presents)
             with col2:
-                st.metric("Absents", f"{absents} élèves")
+                st.metric("Absences", absents)
             with col3:
-                taux = (presents / len(st.session_state.eleves)) * 100 if st.session_state.eleves else 0
+                taux = presents * 100 / (presents + absents) if presents + absents else 0
                 st.metric("Taux présence", f"{taux:.1f}%")
-            with col4:
-                st.metric("Professeur", prof_info.split(" - 📞")[0])
+    
+    saisie_semaine()
 
 # Page 5 : Modifier une présence (MODIFIÉE pour afficher prof)
 elif page == "✏️ Modifier une présence":
@@ -441,277 +478,197 @@ elif page == "✏️ Modifier une présence":
         mot_de_passe = st.text_input("Confirmez avec le mot de passe", type="password")
         
         if st.form_submit_button("Vérifier le mot de passe"):
-            if hash_password(mot_de_passe) == st.session_state.mot_de_passe_hash:
+            if ecole.verifier_mot_de_passe(mot_de_passe):
                 st.session_state.modif_autorisee = True
                 st.success("Accès autorisé")
             else:
                 st.error("Mot de passe incorrect")
     
-    if st.session_state.get('modif_autorisee', False):
-        date_actuelle = datetime.now().strftime("%Y-%m-%d")
+    @st.fragment
+    def modifier_presence():
+        """Sélection et boutons de modification : un clic ne réexécute que cette zone"""
+        stockage.verifier_fraicheur()
+        semaine_actuelle = semaine_en_cours()
         
-        if date_actuelle not in st.session_state.presences:
-            st.warning("Aucune donnée de présence pour cette semaine.")
-        else:
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                eleve = st.selectbox("Sélectionnez l'élève", st.session_state.eleves, key="modif_eleve")
-            
-            with col2:
-                jour = st.selectbox("Sélectionnez le jour", jours, key="modif_jour")
-            
-            with col3:
-                matieres_du_jour = [m["nom"] for m in matieres_par_jour[jour]]
-                matiere = st.selectbox("Sélectionnez la matière", matieres_du_jour, key="modif_matiere")
-            
-            # Récupérer les informations du professeur
-            prof_info = obtenir_info_professeur(matiere)
-            
-            # Afficher les informations
-            st.info(f"**Matière:** {matiere} | **Professeur:** {prof_info}")
-            
-            # Récupérer le statut actuel
-            statut_actuel = st.session_state.presences[date_actuelle][jour][matiere].get(eleve, "non défini")
-            
-            st.info(f"Statut actuel de **{eleve}** : **{statut_actuel}**")
-            
-            # Boutons pour modifier
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                if st.button("✅ Présent", use_container_width=True, key="btn_present"):
-                    st.session_state.presences[date_actuelle][jour][matiere][eleve] = "yes"
-                    sauvegarder_donnees()
-                    st.success(f"✅ {eleve} marqué comme présent en {matiere}")
-                    st.rerun()
-            
-            with col2:
-                if st.button("❌ Absent", use_container_width=True, key="btn_absent"):
-                    st.session_state.presences[date_actuelle][jour][matiere][eleve] = "no"
-                    sauvegarder_donnees()
-                    st.success(f"✅ {eleve} marqué comme absent en {matiere}")
-                    st.rerun()
-            
-            with col3:
-                if st.button("🔄 Effacer", use_container_width=True, key="btn_effacer"):
-                    st.session_state.presences[date_actuelle][jour][matiere][eleve] = ""
-                    sauvegarder_donnees()
-                    st.success(f"✅ Présence effacée pour {eleve}")
-                    st.rerun()
-            
-            with col4:
-                if st.button("📋 Voir toutes les présences", use_container_width=True, key="btn_voir_toutes"):
-                    data = []
-                    for j in jours:
-                        for m_info in matieres_par_jour[j]:
-                            m_nom = m_info["nom"]
-                            statut = st.session_state.presences[date_actuelle][j][m_nom].get(eleve, "")
-                            prof = obtenir_info_professeur(m_nom)
-                            data.append({
-                                "Jour": j,
-                                "Matière": m_nom,
-                                "Professeur": prof.split(" - 📞")[0],
-                                "Statut": "✅ Présent" if statut == "yes" else "❌ Absent" if statut == "no" else "⚪ Non défini"
-                            })
-                    
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
+        libelles = {"yes": "présent", "no": "absent"}
+        
+        def marquer(statut, message):
+            # Exécuté avant le rendu : le statut affiché ensuite est déjà à jour, sans second passage
+            eleve = st.session_state.modif_eleve
+            creneau = (st.session_state.modif_jour, st.session_state.modif_matiere)
+            # Le statut affiché sert de référence : s'il a changé entre-temps, rien n'est écrasé
+            with mesures.chrono(page, "écriture (ms)"):
+                conflits = stockage.ecrire_lot(semaine_actuelle, {creneau: {eleve: statut}},
+                                               vus={creneau: {eleve: st.session_state.modif_statut_vu}},
+                                               version=st.session_state.modif_version_vue)
+            if conflits:
+                st.session_state.message_modif = (st.warning, f"⚠️ Le statut de {eleve} a été modifié entre-temps "
+                                                  f"par une autre session ({libelles.get(conflits[0][3], 'non défini')}) : "
+                                                  "vérifiez-le avant de le changer.")
+            else:
+                st.session_state.message_modif = (st.success, message.format(eleve=eleve, matiere=creneau[1]))
+        
+        # Données creuses : une semaine sans saisie se lit comme « non défini »
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            eleve = st.selectbox("Sélectionnez l'élève", stockage.eleves, key="modif_eleve")
+        
+        with col2:
+            jour = st.selectbox("Sélectionnez le jour", jours, key="modif_jour")
+        
+        with col3:
+            matieres_du_jour = [creneau.matiere for creneau in edt.creneaux_du_jour[jour]]
+            matiere = st.selectbox("Sélectionnez la matière", matieres_du_jour, key="modif_matiere")
+        
+        # Récupérer les informations du professeur
+        prof_info = edt.professeur(matiere)
+        
+        # Afficher les informations
+        st.info(f"**Matière:** {matiere} | **Professeur:** {prof_info.nom} - 📞 {prof_info.telephone}")
+        
+        if "message_modif" in st.session_state:
+            afficher, message = st.session_state.pop("message_modif")
+            afficher(message)
+        
+        # Récupérer le statut actuel, et la version des données à laquelle il est lu
+        st.session_state.modif_version_vue = stockage.version
+        statut_actuel = stockage.statut(semaine_actuelle, jour, matiere, eleve)
+        st.session_state.modif_statut_vu = statut_actuel
+        
+        st.info(f"Statut actuel de **{eleve}** : **{statut_actuel}**")
+        
+        # Semaine consultée par « Voir toutes les présences » (les modifications portent sur la semaine en cours)
+        semaine_consultee = st.selectbox(
+            "Semaine consultée",
+            [semaine_actuelle] + [s for s in reversed(stockage.semaines()) if s != semaine_actuelle],
+            key="modif_semaine_consultee")
+        
+        # Boutons pour modifier
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.button("✅ Présent", use_container_width=True, key="btn_present",
+                      on_click=marquer, args=("yes", "✅ {eleve} marqué comme présent en {matiere}"))
+        
+        with col2:
+            st.button("❌ Absent", use_container_width=True, key="btn_absent",
+                      on_click=marquer, args=("no", "✅ {eleve} marqué comme absent en {matiere}"))
+        
+        with col3:
+            st.button("🔄 Effacer", use_container_width=True, key="btn_effacer",
+                      on_click=marquer, args=("", "✅ Présence effacée pour {eleve}"))
+        
+        with col4:
+            voir_toutes = st.button("📋 Voir toutes les présences", use_container_width=True, key="btn_voir_toutes")
+        
+        if voir_toutes:
+            import pandas as pd
+            statuts_eleve = stockage.statuts_eleve(semaine_consultee, eleve)
+            libelles = {"yes": "✅ Présent", "no": "❌ Absent"}
+            df = pd.DataFrame([{
+                "Jour": creneau.jour,
+                "Matière": creneau.matiere,
+                "Professeur": creneau.professeur.nom,
+                "Statut": libelles.get(statuts_eleve.get((creneau.jour, creneau.matiere)), "⚪ Non défini")
+            } for creneau in edt.creneaux])
+            st.dataframe(df, use_container_width=True)
+    
+    if st.session_state.get('modif_autorisee', False):
+        modifier_presence()
 
 # Page 6 : Statistiques (MODIFIÉE pour inclure professeurs)
 elif page == "📊 Statistiques":
     st.title("📊 Statistiques de présence")
     
-    date_actuelle = datetime.now().strftime("%Y-%m-%d")
-    
-    if date_actuelle not in st.session_state.presences:
-        st.warning("Aucune donnée de présence pour cette semaine.")
-    else:
-        tab1, tab2, tab3 = st.tabs(["📈 Par élève", "📚 Par matière", "👨‍🏫 Par professeur"])
+    @st.fragment
+    def statistiques():
+        """Choix de la période et tableaux : changer de période ne réexécute que cette zone"""
+        semaine_actuelle = semaine_en_cours()
+        periode = st.radio("Période", ["📅 Semaine en cours", "📆 Plage de dates", "🗂️ Depuis le début"], horizontal=True)
+        # Les cumuls sont lus dans les compteurs par semaine/mois tenus à jour à chaque écriture
+        semaine_stats = semaine_actuelle if periode == "📅 Semaine en cours" else None
+        plage = None
+        if periode == "📆 Plage de dates":
+            aujourd_hui = datetime.now().date()
+            plage = st.date_input("Du … au", value=(aujourd_hui - timedelta(weeks=12), aujourd_hui),
+                                  max_value=aujourd_hui)
         
-        with tab1:
-            # Statistiques par élève
-            stats_eleves = []
-            
-            for eleve in st.session_state.eleves:
-                total_present = 0
-                total_absent = 0
-                
-                for jour in jours:
-                    for matiere_info in matieres_par_jour[jour]:
-                        matiere_nom = matiere_info["nom"]
-                        statut = st.session_state.presences[date_actuelle][jour][matiere_nom].get(eleve, "")
-                        if statut == "yes":
-                            total_present += heures_par_matiere
-                        elif statut == "no":
-                            total_absent += heures_par_matiere
-                
-                total_heures = total_present + total_absent
-                taux = (total_present / total_heures * 100) if total_heures > 0 else 0
-                
-                stats_eleves.append({
-                    "Élève": eleve,
-                    "Heures présentes": total_present,
-                    "Heures absentes": total_absent,
-                    "Taux de présence": f"{taux:.1f}%"
-                })
-            
-            df_eleves = pd.DataFrame(stats_eleves)
-            st.dataframe(df_eleves, use_container_width=True)
-            
-            # Graphique
-            df_chart = df_eleves.copy()
-            df_chart["Taux numérique"] = df_chart["Taux de présence"].str.replace('%', '').astype(float)
-            st.bar_chart(df_chart.set_index("Élève")["Taux numérique"])
-        
-        with tab2:
-            # Statistiques par matière
-            stats_matieres = []
-            for jour in jours:
-                for matiere_info in matieres_par_jour[jour]:
-                    matiere_nom = matiere_info["nom"]
-                    prof_info = obtenir_info_professeur(matiere_nom)
-                    
-                    total_present_matiere = 0
-                    total_absent_matiere = 0
-                    
-                    for eleve in st.session_state.eleves:
-                        statut = st.session_state.presences[date_actuelle][jour][matiere_nom].get(eleve, "")
-                        if statut == "yes":
-                            total_present_matiere += 1
-                        elif statut == "no":
-                            total_absent_matiere += 1
-                    
-                    total_eleves_matiere = total_present_matiere + total_absent_matiere
-                    taux_matiere = (total_present_matiere / total_eleves_matiere * 100) if total_eleves_matiere > 0 else 0
-                    
-                    stats_matieres.append({
-                        "Jour": jour,
-                        "Matière": matiere_nom,
-                        "Professeur": prof_info.split(" - 📞")[0],
-                        "Présents": total_present_matiere,
-                        "Absents": total_absent_matiere,
-                        "Taux": f"{taux_matiere:.1f}%"
-                    })
-            
-            df_matieres = pd.DataFrame(stats_matieres)
-            st.dataframe(df_matieres, use_container_width=True)
+        if semaine_stats is not None and not stockage.semaine_existe(semaine_actuelle):
+            st.warning("Aucune donnée de présence pour cette semaine.")
+        elif plage is not None and len(plage) < 2:
+            st.info("Choisissez la date de fin de la plage.")
+        else:
+            # Le moteur vectorisé calcule les trois vues à partir d'un même cadre
+            moteur = moteur_statistiques()
+            creneaux_edt = [(creneau.jour, creneau.matiere) for creneau in edt.creneaux]
+            professeur_par_matiere = edt.professeur_par_matiere
+            with mesures.chrono(page, "statistiques (ms)"):
+                df_eleves, df_matieres, df_profs = tableau("statistiques", lambda: (
+                    moteur.par_eleve(semaine_stats, plage),
+                    moteur.par_matiere(creneaux_edt, professeur_par_matiere, semaine_stats, plage),
+                    moteur.par_professeur(creneaux_edt, professeur_par_matiere, semaine_stats, plage),
+                ), plage=semaine_stats or (tuple(plage) if plage else None))
         
-        with tab3:
-            # Statistiques par professeur
-            stats_profs = {}
-            
-            for jour in jours:
-                for matiere_info in matieres_par_jour[jour]:
-                    matiere_nom = matiere_info["nom"]
-                    prof_info = obtenir_info_professeur(matiere_nom)
-                    prof_nom = prof_info.split(" - 📞")[0]
-                    
-                    if prof_nom not in stats_profs:
-                        stats_profs[prof_nom] = {
-                            "matieres": [],
-                            "total_presents": 0,
-                            "total_absents": 0
-                        }
-                    
-                    if matiere_nom not in stats_profs[prof_nom]["matieres"]:
-                        stats_profs[prof_nom]["matieres"].append(matiere_nom)
-                    
-                    for eleve in st.session_state.eleves:
-                        statut = st.session_state.presences[date_actuelle][jour][matiere_nom].get(eleve, "")
-                        if statut == "yes":
-                            stats_profs[prof_nom]["total_presents"] += 1
-                        elif statut == "no":
-                            stats_profs[prof_nom]["total_absents"] += 1
-            
-            # Créer le dataframe
-            prof_data = []
-            for prof_nom, data in stats_profs.items():
-                total = data["total_presents"] + data["total_absents"]
-                taux = (data["total_presents"] / total * 100) if total > 0 else 0
-                prof_data.append({
-                    "Professeur": prof_nom,
-                    "Matières": ", ".join(data["matieres"]),
-                    "Séances avec présence": data["total_presents"],
-                    "Séances avec absence": data["total_absents"],
-                    "Taux présence": f"{taux:.1f}%"
-                })
+            tab1, tab2, tab3 = st.tabs(["📈 Par élève", "📚 Par matière", "👨‍🏫 Par professeur"])
+        
+            with tab1:
+                # Statistiques par élève
+                st.dataframe(df_eleves, use_container_width=True)
             
-            df_profs = pd.DataFrame(prof_data)
-            st.dataframe(df_profs, use_container_width=True)
+                # Graphique
+                df_chart = df_eleves.copy()
+                df_chart["Taux numérique"] = df_chart["Taux de présence"].str.replace('%', '').astype(float)
+                st.bar_chart(df_chart.set_index("Élève")["Taux numérique"])
+        
+            with tab2:
+                # Statistiques par matière
+                st.dataframe(df_matieres, use_container_width=True)
+        
+            with tab3:
+                # Statistiques par professeur
+                st.dataframe(df_profs, use_container_width=True)
+        
+            if plage is not None:
+                # Évolution semaine par semaine, lue dans les cumuls hebdomadaires
+                st.subheader("📆 Évolution par semaine")
+                df_semaines = tableau("par semaine", lambda: moteur.par_semaine(*plage), plage=tuple(plage))
+                taux_semaines = df_semaines["Taux de présence"].str.replace('%', '').astype(float)
+                st.line_chart(taux_semaines.set_axis(df_semaines["Semaine"]).rename("Taux numérique"))
+                st.dataframe(df_semaines, use_container_width=True, hide_index=True)
+    
+    statistiques()
 
 # Page 7 : Emploi du temps (MODIFIÉE pour inclure professeurs)
 elif page == "📅 Emploi du temps":
     st.title("📅 Emploi du temps complet")
+    import pandas as pd
     
     tab1, tab2 = st.tabs(["📋 Vue par jour", "👨‍🏫 Vue par professeur"])
     
     with tab1:
         st.subheader("Emploi du temps par jour")
-        
-        for jour in jours:
-            with st.expander(f"📌 {jour}", expanded=True):
-                col1, col2, col3, col4 = st.columns([3, 4, 3, 2])
-                with col1:
-                    st.markdown("**Matière**")
-                with col2:
-                    st.markdown("**Professeur**")
-                with col3:
-                    st.markdown("**Téléphone**")
-                with col4:
-                    st.markdown("**Heures**")
-                
-                for matiere_info in matieres_par_jour[jour]:
-                    prof_info = obtenir_info_professeur(matiere_info["nom"])
-                    prof_nom = prof_info.split(" - 📞")[0]
-                    prof_tel = prof_info.split("📞 ")[1] if "📞" in prof_info else ""
-                    
-                    col1, col2, col3, col4 = st.columns([3, 4, 3, 2])
-                    with col1:
-                        st.write(matiere_info["nom"])
-                    with col2:
-                        st.write(prof_nom)
-                    with col3:
-                        st.write(prof_tel)
-                    with col4:
-                        st.write(f"{heures_par_matiere}h")
+        st.dataframe(tableau("par jour", lambda: pd.DataFrame(
+            [{"Jour": c.jour, "Matière": c.matiere, "Professeur": c.professeur.nom,
+              "Téléphone": c.professeur.telephone, "Heures": f"{heures_par_matiere}h"} for c in edt.creneaux],
+            columns=["Jour", "Matière", "Professeur", "Téléphone", "Heures"]), version=version_edt),
+            use_container_width=True, hide_index=True)
     
     with tab2:
         st.subheader("Emploi du temps par professeur")
-        
-        # Regrouper par professeur
-        profs_matieres = {}
-        for jour in jours:
-            for matiere_info in matieres_par_jour[jour]:
-                prof_info = obtenir_info_professeur(matiere_info["nom"])
-                prof_nom = prof_info.split(" - 📞")[0]
-                
-                if prof_nom not in profs_matieres:
-                    profs_matieres[prof_nom] = []
-                
-                profs_matieres[prof_nom].append({
-                    "jour": jour,
-                    "matiere": matiere_info["nom"],
-                    "telephone": prof_info.split("📞 ")[1] if "📞" in prof_info else ""
-                })
-        
-        for prof_nom, matieres in profs_matieres.items():
-            with st.expander(f"👨‍🏫 {prof_nom}", expanded=True):
-                for item in matieres:
-                    col1, col2, col3 = st.columns([2, 3, 3])
-                    with col1:
-                        st.write(f"**{item['jour']}**")
-                    with col2:
-                        st.write(item['matiere'])
-                    with col3:
-                        if item['telephone']:
-                            st.write(f"📞 {item['telephone']}")
+        st.dataframe(tableau("par professeur", lambda: pd.DataFrame(
+            [{"Professeur": prof_nom, "Jour": c.jour, "Matière": c.matiere, "Téléphone": c.professeur.telephone}
+             for prof_nom, creneaux_prof in edt.creneaux_du_professeur.items() for c in creneaux_prof],
+            columns=["Professeur", "Jour", "Matière", "Téléphone"]), version=version_edt),
+            use_container_width=True, hide_index=True)
 
 # Page 8 : Paramètres
 elif page == "⚙️ Paramètres":
     st.title("⚙️ Paramètres")
+    import pandas as pd
+    from gestion_presences import rapports
     
-    tab1, tab2, tab3 = st.tabs(["🔑 Mot de passe", "💾 Données", "ℹ️ Informations"])
+    tab1, tab2, tab3, tab4 = st.tabs(["🔑 Mot de passe", "💾 Données", "🏫 Classes", "ℹ️ Informations"])
     
     with tab1:
         st.subheader("Modifier le mot de passe")
@@ -722,15 +679,14 @@ elif page == "⚙️ Paramètres":
             confirmation = st.text_input("Confirmez le nouveau mot de passe", type="password")
             
             if st.form_submit_button("Modifier le mot de passe"):
-                if hash_password(ancien_mdp) != st.session_state.mot_de_passe_hash:
+                if not ecole.verifier_mot_de_passe(ancien_mdp):
                     st.error("Ancien mot de passe incorrect")
                 elif nouveau_mdp != confirmation:
                     st.error("Les nouveaux mots de passe ne correspondent pas")
                 elif len(nouveau_mdp) < 4:
                     st.error("Le mot de passe doit faire au moins 4 caractères")
                 else:
-                    st.session_state.mot_de_passe_hash = hash_password(nouveau_mdp)
-                    sauvegarder_donnees()
+                    ecole.definir_mot_de_passe(nouveau_mdp)
                     st.success("✅ Mot de passe modifié avec succès !")
     
     with tab2:
@@ -748,40 +704,250 @@ elif page == "⚙️ Paramètres":
                 st.warning("Cette action va effacer toutes les présences de la semaine en cours")
                 confirmation = st.text_input("Tapez 'CONFIRMER' pour continuer")
                 if confirmation == "CONFIRMER":
-                    date_actuelle = datetime.now().strftime("%Y-%m-%d")
-                    if date_actuelle in st.session_state.presences:
-                        del st.session_state.presences[date_actuelle]
-                    initialiser_semaine()
-                    sauvegarder_donnees()
+                    semaine_actuelle = semaine_en_cours()
+                    stockage.effacer_semaine(semaine_actuelle)
                     st.success("✅ Semaine réinitialisée !")
                     st.rerun()
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("🧮 Vérifier les compteurs", use_container_width=True):
+                ecarts = stockage.verifier_agregats()
+                if ecarts:
+                    st.error(f"{len(ecarts)} compteur(s) incohérent(s)")
+                    st.write("\n".join(f"- {ecart}" for ecart in ecarts))
+                else:
+                    st.success("✅ Les compteurs sont cohérents avec les présences")
+        
+        with col2:
+            if st.button("🛠️ Recalculer les compteurs", use_container_width=True):
+                stockage.reconstruire_agregats()
+                st.success("✅ Compteurs recalculés !")
+        
+        st.subheader("📤 Exporter l'historique")
+        st.caption("Une ligne par élève et par créneau saisi : classe, date, semaine, jour, matière, professeur, élève, statut, heures.")
+        formats = list(export.FORMATS) if export.parquet_disponible() else ["CSV"]
+        format_export = st.radio("Format", formats, horizontal=True, key="format_export")
+        toutes_classes = st.checkbox("Exporter toutes les classes", key="export_toutes_classes")
+        if not export.parquet_disponible():
+            st.caption("Le format Parquet nécessite le paquet `pyarrow`.")
+        
+        if st.button("📦 Préparer l'export", use_container_width=True):
+            # L'export est écrit par blocs dans un fichier temporaire, jamais construit en mémoire
+            ancien = st.session_state.pop("fichier_export", None)
+            if ancien is not None:
+                ancien.supprimer()
+            if toutes_classes:
+                # Les classes sont ouvertes une à une, au fil de l'écriture
+                classes_export = ((classe["nom"], ecole.classe(classe["id"]).stockage)
+                                  for classe in ecole.classes)
+            else:
+                classes_export = [(ecole.nom_classe(st.session_state.classe), stockage)]
+            try:
+                # Supprimé à la fin de la session, quand l'état de session est libéré
+                st.session_state.fichier_export = export.exporter(classes_export, format_export)
+            except ValueError as erreur:
+                st.error(f"❌ Export impossible : {erreur}")
+        
+        fichier_export = st.session_state.get("fichier_export")
+        if fichier_export is not None and os.path.exists(fichier_export.chemin):
+            # Le fichier n'est lu qu'au clic, pas à chaque passage
+            st.download_button(
+                "⬇️ Télécharger l'export",
+                data=fichier_export.lire,
+                file_name=f"presences_{datetime.now():%Y%m%d}{fichier_export.extension}",
+                use_container_width=True,
+            )
+        
+        st.subheader("🧾 Rapports de fin de période")
+        st.caption("Un rapport par élève (heures présentes et absentes par matière et par professeur) et une synthèse "
+                   "par classe, générés en arrière-plan à partir d'un instantané des données.")
+        aujourd_hui = datetime.now().date()
+        plage_rapports = st.date_input("Du … au", value=(aujourd_hui - timedelta(weeks=12), aujourd_hui),
+                                       max_value=aujourd_hui, key="plage_rapports")
+        format_rapports = st.radio("Format des rapports", list(rapports.FORMATS), horizontal=True, key="format_rapports")
+        rapports_toutes_classes = st.checkbox("Rapports de toutes les classes", key="rapports_toutes_classes")
+        
+        travail_rapports = st.session_state.get("travail_rapports")
+        suivi_actif = travail_rapports is not None and not travail_rapports.termine
+        if st.button("🚀 Générer les rapports", use_container_width=True,
+                     disabled=suivi_actif or len(plage_rapports) < 2):
+            if travail_rapports is not None:
+                travail_rapports.supprimer()
+            if rapports_toutes_classes:
+                classes_rapports = [(classe["id"], classe["nom"], ecole.classe(classe["id"])) for classe in ecole.classes]
+            else:
+                classes_rapports = [(st.session_state.classe, ecole.nom_classe(st.session_state.classe), classe_ouverte)]
+            st.session_state.travail_rapports = rapports.lancer(classes_rapports, *plage_rapports, format_rapports)
+            suivi_actif = True
+        
+        def suivi_rapports():
+            """Progression de la génération : seule cette zone est réexécutée pendant qu'elle tourne"""
+            travail = st.session_state.get("travail_rapports")
+            if travail is None:
+                return
+            if not travail.termine:
+                st.progress(travail.progression, text=f"{travail.faits}/{travail.total} rapports générés…")
+            elif suivi_actif:
+                # Génération terminée : un passage complet arrête le suivi
+                st.rerun()
+            elif travail.erreur is not None:
+                st.error(f"La génération des rapports a échoué : {travail.erreur}")
+            elif os.path.exists(travail.archive):
+                st.success(f"✅ {travail.total} rapports générés en {travail.duree:.1f} s")
+                with open(travail.archive, "rb") as f:
+                    st.download_button("⬇️ Télécharger les rapports", data=f,
+                                       file_name=f"rapports_{datetime.now():%Y%m%d}.zip",
+                                       use_container_width=True)
+        
+        st.fragment(suivi_rapports, run_every=1 if suivi_actif else None)()
     
     with tab3:
+        st.subheader("Classes de l'établissement")
+        st.dataframe(pd.DataFrame([{"Classe": classe["nom"], "Fichier": classe["fichier"]} for classe in ecole.classes]),
+                     use_container_width=True, hide_index=True)
+        
+        with st.form("form_nouvelle_classe"):
+            st.write("**Créer une classe**")
+            nom_classe = st.text_input("Nom de la classe")
+            nb_eleves = st.number_input("Nombre d'élèves", min_value=1, max_value=200, value=31)
+            copier_edt = st.checkbox(f"Reprendre l'emploi du temps de {ecole.nom_classe(st.session_state.classe)}", value=True)
+            if st.form_submit_button("➕ Créer la classe"):
+                if not nom_classe.strip():
+                    st.error("Le nom de la classe est obligatoire")
+                elif nom_classe.strip() in classes.values():
+                    st.error("Une classe porte déjà ce nom")
+                else:
+                    edt_copie = matieres_par_jour if copier_edt else None
+                    nouvelle = ecole.creer_classe(nom_classe.strip(), int(nb_eleves), edt_copie)
+                    st.session_state.classe_creee = nouvelle
+                    st.success(f"✅ Classe {nom_classe.strip()} créée !")
+                    st.rerun()
+        
+        with st.form("form_renommer_classe"):
+            st.write(f"**Renommer {ecole.nom_classe(st.session_state.classe)}**")
+            nouveau_nom_classe = st.text_input("Nouveau nom", value=ecole.nom_classe(st.session_state.classe))
+            if st.form_submit_button("✏️ Renommer"):
+                ecole.renommer_classe(st.session_state.classe, nouveau_nom_classe.strip())
+                st.rerun()
+        
+        st.write(f"**Emploi du temps de {ecole.nom_classe(st.session_state.classe)}**")
+        with st.form("form_emploi_du_temps"):
+            # Professeur affiché : la fiche effective (la fiche professeur prime sur l'emploi du temps)
+            lignes_edt = pd.DataFrame(
+                [{"Jour": jour, "Matière": m["nom"], "Professeur": edt.professeur(m["nom"]).nom,
+                  "Téléphone": edt.professeur(m["nom"]).telephone}
+                 for jour in jours for m in matieres_par_jour[jour]],
+                columns=["Jour", "Matière", "Professeur", "Téléphone"])
+            edt_modifie = st.data_editor(
+                lignes_edt,
+                column_config={"Jour": st.column_config.SelectboxColumn("Jour", options=list(calendrier.JOURS))},
+                num_rows="dynamic",
+                hide_index=True,
+                use_container_width=True,
+                key=f"edt_{st.session_state.classe}",
+            )
+            if st.form_submit_button("💾 Enregistrer l'emploi du temps"):
+                nouvel_edt = {}
+                fiches = {}
+                for ligne in edt_modifie.fillna("").to_dict("records"):
+                    jour, matiere = str(ligne["Jour"]).strip(), str(ligne["Matière"]).strip()
+                    if jour and matiere:
+                        prof, tel = str(ligne["Professeur"]).strip(), str(ligne["Téléphone"]).strip()
+                        nouvel_edt.setdefault(jour, []).append({"nom": matiere, "prof": prof, "tel": tel})
+                        # Seules les fiches modifiées sont réécrites
+                        if (prof, tel) != tuple(edt.professeur(matiere)):
+                            fiches[matiere] = {"nom": prof, "telephone": tel}
+                stockage.ecrire_parametre('emploi_du_temps', nouvel_edt)
+                professeurs = {**stockage.professeurs, **fiches}
+                if professeurs != stockage.professeurs:
+                    stockage.ecrire_parametre('professeurs', professeurs)
+                st.success("✅ Emploi du temps enregistré !")
+                st.rerun()
+        
+        with st.form("form_alertes"):
+            st.write(f"**Seuils d'alerte de {ecole.nom_classe(st.session_state.classe)}**")
+            st.caption("Une règle dont le seuil vaut 0 est désactivée.")
+            seuils_classe = alertes.seuils(stockage)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                seuil_heures = st.number_input("Heures d'absence (plus de)", min_value=0, max_value=500,
+                                               value=int(seuils_classe["heures"]))
+            with col2:
+                seuil_semaines = st.number_input("Sur les dernières semaines", min_value=1, max_value=52,
+                                                 value=int(seuils_classe["semaines"]))
+            with col3:
+                seuil_consecutives = st.number_input("Absences d'affilée dans une matière", min_value=0,
+                                                     max_value=50, value=int(seuils_classe["consecutives"]))
+            if st.form_submit_button("💾 Enregistrer les seuils"):
+                stockage.ecrire_parametre('alertes', {"heures": int(seuil_heures), "semaines": int(seuil_semaines),
+                                                      "consecutives": int(seuil_consecutives)})
+                st.success("✅ Seuils d'alerte enregistrés !")
+                st.rerun()
+    
+    with tab4:
         st.subheader("Informations système")
         
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("Nombre d'élèves", len(st.session_state.eleves))
+            st.metric("Nombre d'élèves", len(stockage.eleves))
         
         with col2:
-            total_matieres = sum(len(matieres_par_jour[jour]) for jour in jours)
-            st.metric("Nombre de matières", total_matieres)
+            st.metric("Nombre de matières", len(edt.creneaux))
         
         with col3:
-            unique_profs = len(set(
-                obtenir_info_professeur(m["nom"]).split(" - 📞")[0]
-                for jour in jours
-                for m in matieres_par_jour[jour]
-            ))
-            st.metric("Nombre de professeurs", unique_profs)
+            st.metric("Nombre de professeurs", len(edt.creneaux_du_professeur))
         
         st.info(f"📅 Semaine du {datetime.now().strftime('%d/%m/%Y')}")
-        st.info(f"🗃️ Données sauvegardées dans: presences_data.json")
+        st.info(f"🗃️ Données sauvegardées dans: {stockage.emplacement}")
+        if serveur_ingestion is not None:
+            st.info(f"📡 API des lecteurs de badges : http://{serveur_ingestion.hote}:{serveur_ingestion.port}/presences"
+                    f" — {serveur_ingestion.evenements_ecrits} événement(s) reçu(s)")
+        
+        st.subheader("🗄️ Cache des tableaux")
+        resume_cache = cache_tableaux().resume()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Tableaux en cache", resume_cache["entrees"])
+        with col2:
+            st.metric("Mémoire", f"{resume_cache['taille'] / 1024:.0f} Ko")
+        with col3:
+            st.metric("Succès / échecs", f"{resume_cache['succes']} / {resume_cache['echecs']}")
+        with col4:
+            st.metric("Taux de succès", f"{resume_cache['taux'] * 100:.0f}%")
+        if st.button("🧹 Vider le cache des tableaux"):
+            cache_tableaux().vider()
+            st.rerun()
+        
+        st.subheader("⏱️ Mesures de performance")
+        if mesures.ACTIVES:
+            st.caption("Durées en millisecondes et tailles en Ko, sur les derniers passages de ce processus "
+                       "(p50/p90/p99 : médiane et centiles).")
+            lignes_mesures = mesures.centiles()
+            if lignes_mesures:
+                st.dataframe(pd.DataFrame(lignes_mesures), use_container_width=True, hide_index=True)
+            else:
+                st.info("Aucune mesure pour le moment.")
+            if mesures.FICHIER:
+                st.caption(f"Mesures également ajoutées à {mesures.FICHIER}")
+            if st.button("🔄 Réinitialiser les mesures"):
+                mesures.reinitialiser()
+                st.rerun()
+        else:
+            st.caption("Désactivées : lancez l'application avec `PRESENCES_MESURES=1` pour les afficher "
+                       "(et `PRESENCES_MESURES_FICHIER=mesures.jsonl` pour les conserver).")
 
 # Pied de page
 st.sidebar.markdown("---")
 st.sidebar.info(f"📅 {datetime.now().strftime('%A %d %B %Y')}")
+# Les modifications sont écrites sur disque en arrière-plan, regroupées
+en_attente = stockage.ecritures_en_attente()
+if en_attente:
+    st.sidebar.caption(f"⏳ {en_attente} modification(s) en cours d'écriture")
+else:
+    st.sidebar.caption("💾 Toutes les modifications sont enregistrées")
 
 if st.sidebar.button("🚪 Déconnexion", use_container_width=True):
     st.session_state.authentifie = False
@@ -791,3 +957,8 @@ if st.sidebar.button("🚪 Déconnexion", use_container_width=True):
 st.sidebar.markdown("---")
 st.sidebar.caption("🏫 Gestion des Présences v2.0")
 st.sidebar.caption("Avec gestion des professeurs")
+
+if mesures.ACTIVES:
+    mesures.enregistrer(page, "passage complet (ms)", (time.perf_counter() - debut_passage) * 1000)
+    mesures.enregistrer(page, "taille des données (Ko)", stockage.taille() / 1024)
+    mesures.enregistrer(page, "état de session (Ko)", mesures.taille_ko(st.session_state.to_dict().values()))
@@ -0,0 +1,167 @@
+"""Banc de mesure des chemins critiques, sans Streamlit.
+
+Génère un établissement synthétique (K classes de N élèves, M semaines de
+présences) dans un dossier temporaire puis chronomètre le chargement, la
+sauvegarde, la mise à jour d'une cellule, la lecture d'une semaine pour la
+grille de saisie (qui remplace l'initialisation de la semaine : rien n'est
+pré-alloué) et chaque vue statistique. Le démarrage à froid (nouveau processus
+qui importe Streamlit et exécute app_presence.py jusqu'à l'écran de connexion,
+avec streamlit.testing) est mesuré dans un sous-processus, qui vérifie aussi
+que l'écran s'affiche sans erreur et que pandas n'a pas été importé.
+
+    python -m benchmarks.bench_presences --eleves 31 --semaines 40 --classes 3 --moteur sqlite
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from gestion_presences import calendrier, journal
+from gestion_presences.ecole import Ecole
+from gestion_presences.statistiques import MoteurStatistiques
+from gestion_presences.stockage import MOTEURS
+
+
+def chronometrer(fonction, repetitions):
+    """Durée médiane d'un appel, en millisecondes"""
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append((time.perf_counter() - debut) * 1000)
+    return statistics.median(durees)
+
+
+APPLICATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app_presence.py")
+
+# Premier passage du script de l'application, jusqu'au st.stop() de l'écran de connexion
+DEMARRAGE = """
+import sys
+from streamlit.testing.v1 import AppTest
+application = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+if application.exception or not application.text_input:
+    sys.exit("écran de connexion non affiché")
+sys.exit("pandas est importé avant l'écran de connexion" if "pandas" in sys.modules else 0)
+"""
+
+
+def demarrage_a_froid(moteur, dossier, repetitions):
+    """Durée médiane d'un démarrage de processus jusqu'à l'écran de connexion, en millisecondes"""
+    environnement = {cle: valeur for cle, valeur in os.environ.items() if cle != "PRESENCES_INGESTION_PORT"}
+    environnement["PRESENCES_STOCKAGE"] = moteur
+
+    def demarrer():
+        resultat = subprocess.run([sys.executable, "-c", DEMARRAGE, APPLICATION], cwd=dossier,
+                                  env=environnement, stderr=subprocess.PIPE, text=True)
+        if resultat.returncode:
+            raise RuntimeError(resultat.stderr.strip().splitlines()[-1])
+    return chronometrer(demarrer, repetitions)
+
+
+def generer(ecole, nb_classes, nb_eleves, semaines, graine=0):
+    """Crée les classes et remplit chaque semaine (un lot par semaine et par classe)"""
+    hasard = random.Random(graine)
+    identifiants = [classe["id"] for classe in ecole.classes][:nb_classes]
+    while len(identifiants) < nb_classes:
+        identifiants.append(ecole.creer_classe(f"Classe {len(identifiants) + 1}", nb_eleves))
+    for identifiant in identifiants:
+        stockage = ecole.classe(identifiant).stockage
+        if len(stockage.eleves) != nb_eleves:
+            stockage.ecrire_parametre('eleves', [f"Élève {i + 1}" for i in range(nb_eleves)])
+        creneaux_edt = [(creneau.jour, creneau.matiere) for creneau in ecole.classe(identifiant).emploi_du_temps().creneaux]
+        for semaine in semaines:
+            stockage.ecrire_lot(semaine, {
+                creneau: {eleve: "yes" if hasard.random() < 0.9 else "no" for eleve in stockage.eleves}
+                for creneau in creneaux_edt
+            })
+        stockage.sauvegarder()
+    return identifiants
+
+
+def mesurer(moteur, nb_eleves, nb_semaines, nb_classes, repetitions):
+    resultats = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        premiere = date.today() - timedelta(weeks=nb_semaines - 1)
+        semaines = calendrier.semaines_entre(premiere, date.today())
+        debut = time.perf_counter()
+        ecole = Ecole(moteur, dossier)
+        identifiants = generer(ecole, nb_classes, nb_eleves, semaines)
+        resultats["génération (toutes classes)"] = (time.perf_counter() - debut) * 1000
+
+        identifiant = identifiants[-1]
+        derniere = semaines[-1]
+        plage = (premiere, date.today())
+
+        def charger():
+            # Nouvelle instance : relit les fichiers comme au démarrage d'un processus
+            Ecole(moteur, dossier).classe(identifiant).stockage.agregats()
+
+        resultats["chargement d'une classe"] = chronometrer(charger, repetitions)
+        resultats["ouverture d'une classe + une semaine"] = chronometrer(
+            lambda: Ecole(moteur, dossier).classe(identifiant).stockage.statuts_semaine(derniere), repetitions)
+        resultats["démarrage à froid (écran de connexion)"] = demarrage_a_froid(moteur, dossier, min(repetitions, 5))
+
+        classe = ecole.classe(identifiant)
+        stockage = classe.stockage
+        eleve = stockage.eleves[0]
+        jour, matiere = next(iter(classe.emploi_du_temps().creneaux))[:2]
+        statuts = iter(["yes", "no"] * repetitions * 2)
+        resultats["mise à jour d'une cellule"] = chronometrer(
+            lambda: stockage.ecrire_presences(derniere, jour, matiere, {eleve: next(statuts)}), repetitions)
+        resultats["modification + sauvegarde complète"] = chronometrer(
+            lambda: (stockage.ecrire_presences(derniere, jour, matiere, {eleve: next(statuts)}),
+                     stockage.sauvegarder()), repetitions)
+        resultats["lecture d'une semaine (grille)"] = chronometrer(
+            lambda: stockage.statuts_semaine(derniere), repetitions)
+        resultats["lecture d'une semaine vide"] = chronometrer(
+            lambda: stockage.statuts_semaine(calendrier.semaine_iso(date.today() + timedelta(weeks=1))),
+            repetitions)
+
+        moteur_stats = classe.statistiques()
+        edt = classe.emploi_du_temps()
+        creneaux_edt = [(creneau.jour, creneau.matiere) for creneau in edt.creneaux]
+        vues = {
+            "stats par élève (semaine)": lambda: moteur_stats.par_eleve(derniere),
+            "stats par élève (cumul)": lambda: moteur_stats.par_eleve(),
+            "stats par élève (plage)": lambda: moteur_stats.par_eleve(plage=plage),
+            "stats par matière (cumul)": lambda: moteur_stats.par_matiere(creneaux_edt, edt.professeur_par_matiere),
+            "stats par professeur (cumul)": lambda: moteur_stats.par_professeur(
+                creneaux_edt, edt.professeur_par_matiere),
+            "stats par semaine (plage)": lambda: moteur_stats.par_semaine(*plage),
+        }
+        # Premier calcul d'une vue par semaine : construction du cadre NumPy de la semaine
+        resultats["cadre statistique (construction)"] = chronometrer(
+            lambda: MoteurStatistiques(stockage).cadre(derniere), repetitions)
+        for nom, vue in vues.items():
+            resultats[nom] = chronometrer(vue, repetitions)
+        journal.vider_tous()
+    return resultats
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parseur.add_argument("--eleves", type=int, default=31)
+    parseur.add_argument("--semaines", type=int, default=36)
+    parseur.add_argument("--classes", type=int, default=1)
+    parseur.add_argument("--moteur", choices=MOTEURS, default="json")
+    parseur.add_argument("--repetitions", type=int, default=20)
+    options = parseur.parse_args(arguments)
+
+    gc.collect()
+    resultats = mesurer(options.moteur, options.eleves, options.semaines, options.classes, options.repetitions)
+    print(f"moteur={options.moteur} élèves={options.eleves} semaines={options.semaines} "
+          f"classes={options.classes} (médiane de {options.repetitions} essais)")
+    largeur = max(len(nom) for nom in resultats)
+    for nom, duree in resultats.items():
+        print(f"{nom:<{largeur}}  {duree:10.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Client de substitution des lecteurs de badges pour l'API d'ingestion.
+
+Simule L lecteurs qui envoient en parallèle, par lots, les arrivées du matin
+(date du jour, première matière du jour, statut "yes") des élèves de toutes
+les classes, puis affiche le débit et la latence des requêtes. Sans `--url`,
+un établissement synthétique est créé dans un dossier temporaire et le
+serveur démarré dans ce processus ; le nombre de cellules écrites est alors
+vérifié dans le stockage.
+
+    python -m benchmarks.lecteurs_badges --lecteurs 8 --evenements 5000 --lot 20 --moteur sqlite
+    python -m benchmarks.lecteurs_badges --url http://127.0.0.1:8765 --dossier .
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from urllib.parse import urlsplit
+
+from gestion_presences import calendrier, ingestion, journal
+from gestion_presences.ecole import Ecole
+from gestion_presences.stockage import MOTEURS
+
+
+def evenements_du_matin(ecole, nombre, aujourd_hui=None, graine=0):
+    """Arrivées d'élèves tirées au hasard parmi toutes les classes"""
+    hasard = random.Random(graine)
+    aujourd_hui = aujourd_hui or date.today()
+    arrivees = []
+    for classe in ecole.classes:
+        ouverte = ecole.classe(classe["id"])
+        edt = ouverte.emploi_du_temps()
+        jour = edt.jours[min(aujourd_hui.weekday(), len(edt.jours) - 1)]
+        # Date de ce jour dans la semaine en cours (le week-end, souvent un jour précédent)
+        date_jour = calendrier.date_du_jour(calendrier.semaine_iso(aujourd_hui), jour).isoformat()
+        matiere = edt.creneaux_du_jour[jour][0].matiere
+        arrivees += [(classe["id"], date_jour, jour, matiere, eleve) for eleve in ouverte.stockage.eleves]
+    return [
+        {"date": date_jour, "jour": jour, "matiere": matiere, "eleve": eleve,
+         "statut": "yes", "classe": classe}
+        for classe, date_jour, jour, matiere, eleve in (hasard.choice(arrivees) for _ in range(nombre))
+    ]
+
+
+def envoyer(url, evenements, nb_lecteurs, taille_lot):
+    """Envoie les lots depuis `nb_lecteurs` connexions ; retourne (durée en s, latences en ms, acceptés, rejets)"""
+    adresse = urlsplit(url)
+    lots = [evenements[i:i + taille_lot] for i in range(0, len(evenements), taille_lot)]
+    latences = []
+    totaux = {"acceptes": 0, "rejets": 0}
+    verrou = threading.Lock()
+
+    def lecteur(numero):
+        connexion = http.client.HTTPConnection(adresse.hostname, adresse.port)
+        for lot in lots[numero::nb_lecteurs]:
+            debut = time.perf_counter()
+            connexion.request("POST", "/presences", json.dumps(lot),
+                              {"Content-Type": "application/json"})
+            reponse = json.loads(connexion.getresponse().read())
+            with verrou:
+                latences.append((time.perf_counter() - debut) * 1000)
+                totaux["acceptes"] += reponse.get("acceptes", 0)
+                totaux["rejets"] += len(reponse.get("rejets", ()))
+        connexion.close()
+
+    fils = [threading.Thread(target=lecteur, args=(numero,)) for numero in range(nb_lecteurs)]
+    debut = time.perf_counter()
+    for fil in fils:
+        fil.start()
+    for fil in fils:
+        fil.join()
+    return time.perf_counter() - debut, latences, totaux["acceptes"], totaux["rejets"]
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parseur.add_argument("--url", help="serveur déjà démarré (sinon, serveur local sur données synthétiques)")
+    parseur.add_argument("--dossier", default=".", help="données du serveur visé par --url (élèves, emploi du temps)")
+    parseur.add_argument("--moteur", choices=MOTEURS, default="json")
+    parseur.add_argument("--classes", type=int, default=3)
+    parseur.add_argument("--lecteurs", type=int, default=8)
+    parseur.add_argument("--evenements", type=int, default=3000)
+    parseur.add_argument("--lot", type=int, default=20)
+    options = parseur.parse_args(arguments)
+
+    with tempfile.TemporaryDirectory() as temporaire:
+        ecole = Ecole(options.moteur, options.dossier if options.url else temporaire)
+        serveur = None
+        if not options.url:
+            while len(ecole.classes) < options.classes:
+                ecole.creer_classe(f"Classe {len(ecole.classes) + 1}")
+            serveur = ingestion.demarrer(ecole, "127.0.0.1", 0)
+        url = options.url or f"http://127.0.0.1:{serveur.port}"
+        evenements = evenements_du_matin(ecole, options.evenements)
+        duree, latences, acceptes, rejets = envoyer(url, evenements, options.lecteurs, options.lot)
+
+        print(f"{len(evenements)} événements en {len(latences)} requêtes ({options.lecteurs} lecteurs, "
+              f"lots de {options.lot}) : {duree:.2f} s, {len(evenements) / duree:.0f} événements/s")
+        centiles = statistics.quantiles(latences, n=100) if len(latences) > 1 else latences * 99
+        print(f"latence par requête : p50 {centiles[49]:.1f} ms, p99 {centiles[98]:.1f} ms")
+        print(f"acceptés : {acceptes}, rejetés : {rejets}")
+        if serveur is not None:
+            semaine = calendrier.semaine_iso(date.today())
+            attendues = {(e["classe"], e["jour"], e["matiere"], e["eleve"]) for e in evenements}
+            ecrites = sum(
+                len(statuts)
+                for classe in ecole.classes
+                for statuts in ecole.classe(classe["id"]).stockage.statuts_semaine(semaine).values())
+            print(f"lots écrits : {serveur.lots_ecrits}, cellules écrites : {ecrites}/{len(attendues)}")
+            journal.vider_tous()
+            if ecrites != len(attendues):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
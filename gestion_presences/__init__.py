@@ -0,0 +1 @@
+"""Bibliothèque de gestion des présences, utilisable sans Streamlit (point d'entrée : ecole.Ecole)"""
@@ -0,0 +1,180 @@
+"""Compteurs de présence cumulés, mis à jour par différence à chaque écriture.
+
+Les compteurs sont une structure JSON simple conservée avec les données :
+
+    {"eleves": [compteur par position d'élève],
+     "creneaux": {jour: {matiere: compteur}},
+     "semaines": {"2026-W42": bloc}, "mois": {"2026-10": bloc}}
+
+où un compteur vaut [seances_presentes, seances_absentes, heures_presentes,
+heures_absentes] et un bloc a la forme {"eleves": ..., "creneaux": ...}.
+Le niveau supérieur est lui-même le bloc du cumul depuis le début ; les
+blocs par semaine ISO et par mois (voir le module calendrier) permettent de
+répondre à une plage de dates en lisant quelques dizaines de blocs. Les
+totaux par matière et par professeur se déduisent des compteurs par
+créneau, sans parcourir l'historique.
+"""
+from . import calendrier, creneaux
+
+SEANCES_PRESENTES, SEANCES_ABSENTES, HEURES_PRESENTES, HEURES_ABSENTES = range(4)
+
+FAMILLES = ("semaines", "mois")
+
+
+def nouveaux():
+    return {"eleves": [], "creneaux": {}, "semaines": {}, "mois": {}}
+
+
+def _bloc():
+    return {"eleves": [], "creneaux": {}}
+
+
+def _compteur():
+    return [0, 0, 0, 0]
+
+
+def famille(cle):
+    """Famille d'une clé de période : "semaines" ("2026-W42") ou "mois" ("2026-10")"""
+    return "semaines" if "-W" in cle else "mois"
+
+
+def periodes(semaine):
+    """Clés de la semaine et du mois auxquels sont rattachées les présences de `semaine`"""
+    semaine = calendrier.semaine_iso(semaine)
+    return semaine, calendrier.mois_de_semaine(semaine)
+
+
+def appliquer_delta(agregats, semaine, jour, matiere, heures, avant, apres):
+    """Met à jour les compteurs pour le passage d'un créneau des masques `avant` aux masques `apres`"""
+    presents_avant, enregistres_avant = avant
+    presents_apres, enregistres_apres = apres
+    modifies = (presents_avant ^ presents_apres) | (enregistres_avant ^ enregistres_apres)
+    if not modifies:
+        return
+    semaine, mois = periodes(semaine)
+    blocs = (agregats,
+             agregats.setdefault("semaines", {}).setdefault(semaine, _bloc()),
+             agregats.setdefault("mois", {}).setdefault(mois, _bloc()))
+    compteurs_creneau = [bloc["creneaux"].setdefault(jour, {}).setdefault(matiere, _compteur())
+                         for bloc in blocs]
+    while modifies:
+        bit = modifies & -modifies
+        modifies ^= bit
+        position = bit.bit_length() - 1
+        for bloc in blocs:
+            while len(bloc["eleves"]) <= position:
+                bloc["eleves"].append(_compteur())
+        compteurs = [bloc["eleves"][position] for bloc in blocs] + compteurs_creneau
+        for signe, presents, enregistres in ((-1, presents_avant, enregistres_avant),
+                                             (1, presents_apres, enregistres_apres)):
+            if enregistres & bit:
+                absent = 0 if presents & bit else 1
+                for compteur in compteurs:
+                    compteur[SEANCES_PRESENTES + absent] += signe
+                    compteur[HEURES_PRESENTES + absent] += signe * heures
+
+
+def reconstruire(masques, heures):
+    """Recalcule entièrement les compteurs ; `heures` donne les heures d'une matière"""
+    agregats = nouveaux()
+    for semaine, jour, matiere, presents, enregistres in masques:
+        appliquer_delta(agregats, semaine, jour, matiere, heures(matiere), creneaux.VIDE, (presents, enregistres))
+    return agregats
+
+
+def blocs_periodes(agregats, cles):
+    """{clé: bloc} des périodes demandées présentes dans les compteurs"""
+    return {cle: agregats[famille(cle)][cle] for cle in cles if cle in agregats.get(famille(cle), {})}
+
+
+def plan_periode(debut, fin):
+    """Clés des blocs à lire pour couvrir les semaines de `debut` à `fin`.
+
+    Un mois dont toutes les semaines sont dans la plage est lu d'un bloc,
+    les semaines restantes une à une.
+    """
+    semaines = calendrier.semaines_entre(debut, fin)
+    dans_la_plage = set(semaines)
+    cles = []
+    for semaine in semaines:
+        mois = calendrier.mois_de_semaine(semaine)
+        if dans_la_plage.issuperset(calendrier.semaines_du_mois(mois)):
+            if mois not in cles:
+                cles.append(mois)
+        else:
+            cles.append(semaine)
+    return cles
+
+
+def fusionner(blocs):
+    """Somme de plusieurs blocs de compteurs"""
+    total = _bloc()
+    for bloc in blocs:
+        for position, compteur in enumerate(bloc["eleves"]):
+            while len(total["eleves"]) <= position:
+                total["eleves"].append(_compteur())
+            _ajouter(total["eleves"][position], compteur)
+        for jour, matieres in bloc["creneaux"].items():
+            for matiere, compteur in matieres.items():
+                _ajouter(total["creneaux"].setdefault(jour, {}).setdefault(matiere, _compteur()), compteur)
+    return total
+
+
+def _ajouter(total, compteur):
+    for colonne, valeur in enumerate(compteur):
+        total[colonne] += valeur
+
+
+def par_eleve(agregats, nb_eleves):
+    """Compteur de chaque élève, dans l'ordre des positions"""
+    eleves = agregats["eleves"]
+    return [list(eleves[i]) if i < len(eleves) else _compteur() for i in range(nb_eleves)]
+
+
+def total(bloc):
+    """Somme des compteurs de tous les élèves d'un bloc"""
+    somme = _compteur()
+    for compteur in bloc["eleves"]:
+        _ajouter(somme, compteur)
+    return somme
+
+
+def par_creneau(agregats, jour, matiere):
+    return list(agregats["creneaux"].get(jour, {}).get(matiere, _compteur()))
+
+
+def par_regroupement(agregats, creneaux_edt, regroupement):
+    """Somme les compteurs des créneaux de l'emploi du temps par `regroupement(jour, matiere)`"""
+    totaux = {}
+    for jour, matiere in creneaux_edt:
+        _ajouter(totaux.setdefault(regroupement(jour, matiere), _compteur()),
+                 par_creneau(agregats, jour, matiere))
+    return totaux
+
+
+def _differences_bloc(attendus, obtenus, prefixe):
+    ecarts = []
+    nb_eleves = max(len(attendus["eleves"]), len(obtenus["eleves"]))
+    for position, (a, b) in enumerate(zip(par_eleve(attendus, nb_eleves), par_eleve(obtenus, nb_eleves))):
+        if a != b:
+            ecarts.append(f"{prefixe}élève n°{position + 1} : {b} au lieu de {a}")
+    cles = {(jour, matiere) for structure in (attendus, obtenus)
+            for jour, matieres in structure["creneaux"].items() for matiere in matieres}
+    for jour, matiere in sorted(cles):
+        a = par_creneau(attendus, jour, matiere)
+        b = par_creneau(obtenus, jour, matiere)
+        if a != b:
+            ecarts.append(f"{prefixe}{jour} / {matiere} : {b} au lieu de {a}")
+    return ecarts
+
+
+def differences(attendus, obtenus):
+    """Liste lisible des compteurs qui diffèrent entre deux structures"""
+    ecarts = _differences_bloc(attendus, obtenus, "")
+    for nom in FAMILLES:
+        blocs_attendus = attendus.get(nom, {})
+        blocs_obtenus = obtenus.get(nom, {})
+        for cle in sorted(set(blocs_attendus) | set(blocs_obtenus)):
+            ecarts += _differences_bloc(blocs_attendus.get(cle, _bloc()),
+                                        blocs_obtenus.get(cle, _bloc()), f"[{cle}] ")
+    return ecarts
@@ -0,0 +1,125 @@
+"""Alertes d'absence évaluées au fil des saisies.
+
+Deux règles, dont les seuils forment le paramètre "alertes" de la classe
+(un seuil à 0 désactive sa règle) :
+
+- plus de `heures` heures d'absence sur les `semaines` dernières semaines,
+  fenêtre glissante qui se termine à la semaine en cours ;
+- au moins `consecutives` absences d'affilée dans une même matière, parmi
+  ses dernières séances saisies dans la fenêtre.
+
+Le moteur garde les statuts des semaines de la fenêtre et les alertes de
+chaque élève. À chaque nouvelle version des données, il suit le fil des
+changements du stockage (Stockage.changements_depuis) : seule une semaine
+écrite est relue, et seuls les élèves touchés sont réévalués. Le coût d'une
+saisie ne dépend ni de l'historique ni du nombre d'élèves de la classe ;
+tout est relu quand un paramètre change ou que les données sont rechargées.
+"""
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+
+from . import calendrier
+
+SEUILS_PAR_DEFAUT = {"heures": 9, "semaines": 4, "consecutives": 3}
+
+HEURES_ABSENTES = "Heures d'absence"
+ABSENCES_CONSECUTIVES = "Absences consécutives"
+
+Alerte = namedtuple("Alerte", "eleve regle detail")
+
+
+def seuils(stockage):
+    """Seuils de la classe, complétés par les valeurs par défaut"""
+    return {**SEUILS_PAR_DEFAUT, **stockage.alertes}
+
+
+def fenetre(semaines, aujourd_hui=None):
+    """Clés des `semaines` dernières semaines, jusqu'à celle d'`aujourd_hui` incluse"""
+    aujourd_hui = aujourd_hui or date.today()
+    return tuple(calendrier.semaines_entre(aujourd_hui - timedelta(weeks=max(1, semaines) - 1), aujourd_hui))
+
+
+class MoteurAlertes:
+    """Alertes d'une classe, mises à jour pour les seuls élèves touchés par les dernières saisies"""
+
+    def __init__(self, stockage):
+        self.stockage = stockage
+        self._version = None
+        self._seuils = SEUILS_PAR_DEFAUT
+        self._fenetre = ()
+        # {semaine: [((jour, matiere), {eleve: statut})]} dans l'ordre de l'emploi du temps
+        self._statuts = {}
+        # {eleve: [Alerte]}
+        self._alertes = {}
+        self._verrou = threading.Lock()
+
+    def actives(self, aujourd_hui=None):
+        """Alertes en cours, dans l'ordre des élèves"""
+        with self._verrou:
+            self._mettre_a_jour(aujourd_hui)
+            return [alerte for eleve in self.stockage.eleves for alerte in self._alertes.get(eleve, ())]
+
+    def _mettre_a_jour(self, aujourd_hui):
+        version, changements = self.stockage.changements_depuis(self._version)
+        regles = seuils(self.stockage)
+        semaines = fenetre(regles["semaines"], aujourd_hui)
+        if changements is None:
+            self._statuts = {}
+            touches = None
+        else:
+            touches = set()
+            for semaine, eleves in changements:
+                if semaine not in semaines:
+                    continue
+                self._statuts.pop(semaine, None)
+                touches = None if touches is None or eleves is None else touches | eleves
+        if semaines != self._fenetre:
+            # La fenêtre a glissé : seules les semaines qui y entrent sont lues
+            touches = None
+        self._statuts = {semaine: self._statuts[semaine] if semaine in self._statuts else self._lire(semaine)
+                         for semaine in semaines}
+        self._seuils = regles
+        self._fenetre = semaines
+        self._version = version
+        if touches is None:
+            self._alertes = {}
+            touches = self.stockage.eleves
+        for eleve in touches:
+            self._alertes[eleve] = self._evaluer(eleve)
+
+    def _lire(self, semaine):
+        """Statuts d'une semaine, créneaux dans l'ordre de l'emploi du temps (les autres à la fin)"""
+        ordre = {(jour, matiere["nom"]): i for i, (jour, matiere) in enumerate(
+            (jour, matiere) for jour, matieres in self.stockage.emploi_du_temps.items() for matiere in matieres)}
+        statuts = self.stockage.statuts_semaine(semaine)
+        return sorted(statuts.items(), key=lambda item: ordre.get(item[0], len(ordre)))
+
+    def _evaluer(self, eleve):
+        heures = 0
+        seances = {}
+        for semaine in self._fenetre:
+            for (_, matiere), statuts in self._statuts[semaine]:
+                statut = statuts.get(eleve, "")
+                if statut:
+                    seances.setdefault(matiere, []).append(statut)
+                    if statut == "no":
+                        heures += self.stockage.heures(matiere)
+
+        alertes = []
+        seuil = self._seuils["heures"]
+        if seuil and heures > seuil:
+            alertes.append(Alerte(eleve, HEURES_ABSENTES,
+                                  f"{heures:g} h sur {len(self._fenetre)} semaine(s) (seuil : {seuil} h)"))
+        seuil = self._seuils["consecutives"]
+        if seuil:
+            for matiere, statuts in seances.items():
+                serie = 0
+                for statut in reversed(statuts):
+                    if statut != "no":
+                        break
+                    serie += 1
+                if serie >= seuil:
+                    alertes.append(Alerte(eleve, ABSENCES_CONSECUTIVES,
+                                          f"{serie} absences d'affilée en {matiere} (seuil : {seuil})"))
+        return alertes
@@ -0,0 +1,238 @@
+"""Archivage par mois des semaines passées du moteur JSON.
+
+Le fichier actif ne garde que les mois récents (SEMAINES_ACTIVES) : à chaque
+écriture du snapshot, les semaines de présences et les blocs de compteurs
+par semaine et par mois d'un mois révolu partent dans un segment compressé,
+`<snapshot>.archives/AAAA-MM.json.gz` :
+
+    {"presences": {semaine: jours}, "semaines": {semaine: bloc}, "mois": {mois: bloc}}
+
+Le snapshot actif garde l'index des clés archivées ("archives") ; à la
+lecture, les présences et les blocs de compteurs deviennent des vues
+`Archivees` qui lisent les segments à la demande, au travers d'un cache LRU
+de segments décompressés. Seuls les segments modifiés sont réécrits : le
+coût du chargement et de la sauvegarde ne dépend pas de l'historique.
+"""
+import copy
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import date, timedelta
+
+from . import agregats, calendrier
+from .journal import ecrire_temporaire, lire_snapshot
+
+# Semaines récentes gardées dans le fichier actif (un mois n'est archivé que révolu)
+SEMAINES_ACTIVES = 10
+
+# Nombre de segments décompressés gardés en mémoire par dossier d'archives
+MAX_SEGMENTS = 24
+
+FAMILLES = ("presences",) + agregats.FAMILLES
+
+_archives = {}
+_archives_verrou = threading.Lock()
+
+
+def mois_de(cle):
+    """Mois d'archivage d'une clé : une semaine "2026-W42" ou un mois "2026-10" """
+    return calendrier.mois_de_semaine(cle) if "-W" in cle else cle
+
+
+def mois_revolu(mois, limite):
+    """Vrai si toutes les semaines du mois sont antérieures à la semaine `limite`"""
+    return calendrier.semaines_du_mois(mois)[-1] < limite
+
+
+class Archives:
+    """Segments compressés d'un fichier de données, un par mois"""
+
+    def __init__(self, dossier, max_segments=MAX_SEGMENTS):
+        self.dossier = dossier
+        self.max_segments = max_segments
+        self._segments = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def chemin(self, mois):
+        return os.path.join(self.dossier, f"{mois}.json.gz")
+
+    def segment(self, mois):
+        """Contenu d'un segment {famille: {clé: valeur}}, à ne pas modifier (cache LRU)"""
+        chemin = self.chemin(mois)
+        try:
+            etat = os.stat(chemin)
+        except FileNotFoundError:
+            return {}
+        signature = (etat.st_mtime_ns, etat.st_size)
+        with self._verrou:
+            if mois in self._segments and self._segments[mois][0] == signature:
+                self._segments.move_to_end(mois)
+                return self._segments[mois][1]
+        with open(chemin, "rb") as f:
+            contenu = json.loads(gzip.decompress(f.read()))
+        with self._verrou:
+            self._segments[mois] = (signature, contenu)
+            self._segments.move_to_end(mois)
+            while len(self._segments) > self.max_segments:
+                self._segments.popitem(last=False)
+        return contenu
+
+    def ecrire(self, mois, contenu):
+        """Remplace atomiquement un segment (supprimé s'il est vide)"""
+        chemin = self.chemin(mois)
+        with self._verrou:
+            self._segments.pop(mois, None)
+        if not any(contenu.values()):
+            if os.path.exists(chemin):
+                os.remove(chemin)
+            return
+        os.makedirs(self.dossier, exist_ok=True)
+        temporaire = chemin + ".tmp"
+        with open(temporaire, "wb") as f:
+            f.write(gzip.compress(json.dumps(contenu, separators=(",", ":")).encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporaire, chemin)
+
+
+def ouvrir_archives(dossier):
+    """Retourne les archives partagées par toutes les sessions pour ce dossier"""
+    cle = os.path.abspath(dossier)
+    with _archives_verrou:
+        if cle not in _archives:
+            _archives[cle] = Archives(dossier)
+        return _archives[cle]
+
+
+class Archivees(MutableMapping):
+    """Valeurs récentes en mémoire + valeurs archivées lues à la demande dans les segments.
+
+    Une valeur archivée qui va être modifiée (`setdefault`, utilisé par
+    journal.appliquer et agregats.appliquer_delta) est d'abord copiée parmi les
+    valeurs récentes ; elle regagne son segment à l'écriture suivante.
+    """
+
+    def __init__(self, archives, famille, recentes, index):
+        self.archives = archives
+        self.famille = famille
+        self.recentes = recentes
+        # {clé: mois} des valeurs archivées
+        self.index = index
+        # Mois dont une valeur archivée a été supprimée : segment à réécrire
+        self.mois_modifies = set()
+
+    def __getitem__(self, cle):
+        if cle in self.recentes:
+            return self.recentes[cle]
+        return self.archives.segment(self.index[cle])[self.famille][cle]
+
+    def setdefault(self, cle, defaut=None):
+        if cle not in self.recentes:
+            self.recentes[cle] = copy.deepcopy(self[cle]) if cle in self.index else defaut
+            self.index.pop(cle, None)
+        return self.recentes[cle]
+
+    def __setitem__(self, cle, valeur):
+        self.recentes[cle] = valeur
+        self.index.pop(cle, None)
+
+    def __delitem__(self, cle):
+        if cle in self.recentes:
+            del self.recentes[cle]
+        else:
+            self.mois_modifies.add(self.index.pop(cle))
+
+    def __contains__(self, cle):
+        return cle in self.recentes or cle in self.index
+
+    def __iter__(self):
+        yield from list(self.recentes)
+        yield from [cle for cle in self.index if cle not in self.recentes]
+
+    def __len__(self):
+        return len(self.recentes) + sum(1 for cle in self.index if cle not in self.recentes)
+
+    def __deepcopy__(self, memo):
+        return {cle: copy.deepcopy(valeur, memo) for cle, valeur in self.items()}
+
+
+def _familles(donnees):
+    """{famille: valeurs} des données archivables (présences et blocs de compteurs)"""
+    familles = {"presences": donnees.get("presences", {})}
+    if "agregats" in donnees:
+        familles.update({famille: donnees["agregats"].get(famille, {}) for famille in agregats.FAMILLES})
+    return familles
+
+
+def lire(chemin):
+    """Snapshot actif dont les présences et les blocs de compteurs lisent au travers des archives"""
+    donnees = lire_snapshot(chemin)
+    if donnees is None or "archives" not in donnees:
+        return donnees
+    archives = ouvrir_archives(chemin + ".archives")
+    index = {famille: {} for famille in FAMILLES}
+    for mois, cles_par_famille in donnees.pop("archives").items():
+        for famille, cles in cles_par_famille.items():
+            index[famille].update(dict.fromkeys(cles, mois))
+    donnees["presences"] = Archivees(archives, "presences", donnees.get("presences", {}), index["presences"])
+    if "agregats" in donnees:
+        for famille in agregats.FAMILLES:
+            donnees["agregats"][famille] = Archivees(archives, famille, donnees["agregats"].get(famille, {}),
+                                                     index[famille])
+    return donnees
+
+
+def ecrire(chemin, donnees, aujourd_hui=None):
+    """Archive les mois révolus, puis écrit le snapshot actif dans un fichier temporaire"""
+    archives = ouvrir_archives(chemin + ".archives")
+    limite = calendrier.semaine_iso((aujourd_hui or date.today()) - timedelta(weeks=SEMAINES_ACTIVES))
+    familles = _familles(donnees)
+    actives = {famille: {} for famille in familles}
+    index = {famille: dict(valeurs.index) if isinstance(valeurs, Archivees) else {}
+             for famille, valeurs in familles.items()}
+    a_reecrire = set()
+    for famille, valeurs in familles.items():
+        recentes = valeurs.recentes if isinstance(valeurs, Archivees) else valeurs
+        for cle, valeur in recentes.items():
+            mois = mois_de(cle)
+            if mois_revolu(mois, limite):
+                index[famille][cle] = mois
+                a_reecrire.add(mois)
+            else:
+                actives[famille][cle] = valeur
+        if isinstance(valeurs, Archivees):
+            a_reecrire |= valeurs.mois_modifies
+
+    # Segments modifiés : valeurs déjà archivées (lues avant réécriture) + valeurs qui les rejoignent
+    par_mois = {}
+    for famille, cles in index.items():
+        for cle, mois in cles.items():
+            if mois in a_reecrire:
+                par_mois.setdefault(mois, {nom: {} for nom in familles})[famille][cle] = familles[famille][cle]
+    for mois in sorted(a_reecrire):
+        archives.ecrire(mois, par_mois.get(mois, {}))
+
+    for famille, valeurs in familles.items():
+        if isinstance(valeurs, Archivees):
+            # Données en mémoire alignées sur les fichiers : les valeurs archivées quittent les récentes
+            for cle in list(valeurs.recentes):
+                if cle not in actives[famille]:
+                    del valeurs.recentes[cle]
+            valeurs.index.clear()
+            valeurs.index.update(index[famille])
+            valeurs.mois_modifies.clear()
+
+    actif = {cle: valeur for cle, valeur in donnees.items() if cle not in ("presences", "agregats")}
+    actif["presences"] = actives["presences"]
+    if "agregats" in donnees:
+        actif["agregats"] = dict(donnees["agregats"], **{famille: actives[famille] for famille in agregats.FAMILLES})
+    resume = {}
+    for famille, cles in index.items():
+        for cle, mois in cles.items():
+            resume.setdefault(mois, {}).setdefault(famille, []).append(cle)
+    if resume:
+        actif["archives"] = resume
+    return ecrire_temporaire(chemin, actif)
@@ -0,0 +1,79 @@
+"""Cache des tableaux dérivés des données, partagé par toutes les sessions.
+
+Les pages reconstruisaient à chaque passage les mêmes DataFrames (emploi du
+temps, professeurs, statistiques). Plutôt que de hacher les données, chaque
+tableau est rangé sous une clé (page, classe, nom, plage, version) : la
+version du stockage (Stockage.version) est unique dans le processus et
+change à chaque modification, une entrée périmée n'est donc jamais relue et
+finit évincée. Le cache est borné en octets (LRU) et compte ses succès et
+ses échecs.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+# Taille maximale des tableaux gardés en mémoire, en octets
+TAILLE_MAX = 64 * 1024 * 1024
+
+
+def taille(valeur):
+    """Taille approximative d'un tableau (ou d'un tuple de tableaux), en octets"""
+    if isinstance(valeur, (tuple, list)):
+        return sum(taille(element) for element in valeur)
+    if hasattr(valeur, "memory_usage"):
+        utilisation = valeur.memory_usage(deep=True)
+        return int(utilisation.sum() if hasattr(utilisation, "sum") else utilisation)
+    return sys.getsizeof(valeur)
+
+
+class CacheTableaux:
+    """Cache LRU borné en octets ; les valeurs rendues sont partagées et ne doivent pas être modifiées"""
+
+    def __init__(self, taille_max=TAILLE_MAX):
+        self.taille_max = taille_max
+        self.taille = 0
+        self.succes = 0
+        self.echecs = 0
+        self.evictions = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle, fabrique):
+        """Valeur rangée sous `cle`, construite par `fabrique()` au premier accès"""
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                self.succes += 1
+                return self._entrees[cle][0]
+            self.echecs += 1
+        # Construction hors du verrou : deux sessions peuvent construire la même entrée, sans effet
+        valeur = fabrique()
+        octets = taille(valeur)
+        with self._verrou:
+            if cle not in self._entrees and octets <= self.taille_max:
+                self._entrees[cle] = (valeur, octets)
+                self.taille += octets
+                while self.taille > self.taille_max:
+                    _, (_, evincee) = self._entrees.popitem(last=False)
+                    self.taille -= evincee
+                    self.evictions += 1
+        return valeur
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+            self.taille = 0
+            self.succes = self.echecs = self.evictions = 0
+
+    def resume(self):
+        """Compteurs du cache : entrées, taille, succès, échecs, évictions et taux de succès"""
+        with self._verrou:
+            demandes = self.succes + self.echecs
+            return {
+                "entrees": len(self._entrees),
+                "taille": self.taille,
+                "succes": self.succes,
+                "echecs": self.echecs,
+                "evictions": self.evictions,
+                "taux": self.succes / demandes if demandes else 0.0,
+            }
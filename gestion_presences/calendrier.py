@@ -0,0 +1,61 @@
+"""Découpage du calendrier en semaines ISO et en mois pour les cumuls par période.
+
+Une semaine ISO est notée "2026-W42" et appartient au mois de son jeudi
+("2026-10") : chaque semaine tombe ainsi dans exactement un mois, et un
+mois est la réunion exacte de ses semaines.
+"""
+from datetime import date, timedelta
+
+# Jours de la semaine, dans l'ordre ISO (lundi = 0)
+JOURS = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche")
+
+
+def _date(valeur):
+    return valeur if isinstance(valeur, date) else date.fromisoformat(valeur)
+
+
+def semaine_iso(valeur):
+    """Clé de la semaine ISO contenant une date ("AAAA-MM-JJ" ou date)"""
+    if isinstance(valeur, str) and "-W" in valeur:
+        return valeur
+    annee, semaine, _ = _date(valeur).isocalendar()
+    return f"{annee}-W{semaine:02d}"
+
+
+def lundi(semaine):
+    """Date du lundi d'une semaine "AAAA-Www" """
+    annee, numero = semaine.split("-W")
+    return date.fromisocalendar(int(annee), int(numero), 1)
+
+
+def date_du_jour(semaine, jour):
+    """Date d'un jour nommé ("Mardi") d'une semaine "AAAA-Www" ; ValueError pour un jour inconnu"""
+    if jour not in JOURS:
+        raise ValueError(f"jour inconnu : {jour} (attendu : {', '.join(JOURS)})")
+    return lundi(semaine) + timedelta(days=JOURS.index(jour))
+
+
+def mois_de_semaine(semaine):
+    """Mois ("AAAA-MM") auquel est rattachée une semaine : celui de son jeudi"""
+    return (lundi(semaine) + timedelta(days=3)).strftime("%Y-%m")
+
+
+def semaines_entre(debut, fin):
+    """Clés des semaines ISO couvrant les dates de `debut` à `fin` incluses"""
+    courant = _date(debut) - timedelta(days=_date(debut).weekday())
+    semaines = []
+    while courant <= _date(fin):
+        semaines.append(semaine_iso(courant))
+        courant += timedelta(weeks=1)
+    return semaines
+
+
+def semaines_du_mois(mois):
+    """Clés des semaines rattachées à un mois "AAAA-MM" (celles dont le jeudi y tombe)"""
+    jeudi = date.fromisoformat(f"{mois}-01")
+    jeudi += timedelta(days=(3 - jeudi.weekday()) % 7)
+    semaines = []
+    while jeudi.strftime("%Y-%m") == mois:
+        semaines.append(semaine_iso(jeudi))
+        jeudi += timedelta(weeks=1)
+    return semaines
@@ -0,0 +1,178 @@
+"""Registre des classes : une classe = un effectif, un emploi du temps et un fichier de données.
+
+Le registre (`classes.json`) est petit et toujours chargé : il contient la
+liste des classes et le mot de passe de l'établissement. Les données d'une
+classe (son « fragment ») ne sont ouvertes qu'à la demande, quand une
+session la sélectionne ; seules les dernières classes utilisées restent en
+mémoire.
+"""
+import copy
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from .emploi_du_temps import CacheIndex
+from .journal import ecrire_json
+from .stockage import ouvrir_stockage
+
+FICHIER_REGISTRE = "classes.json"
+
+# Fragment de la classe créée à partir des données d'avant le multi-classes
+FICHIER_HISTORIQUE = "presences_data"
+
+EXTENSIONS = {"json": ".json", "sqlite": ".sqlite3", "binaire": ".bin"}
+
+# Nombre de classes gardées ouvertes en mémoire par processus
+MAX_CLASSES_OUVERTES = 8
+
+
+class ClasseOuverte:
+    """Stockage d'une classe ouverte et ressources qui lui sont associées (index, statistiques, alertes)"""
+
+    def __init__(self, identifiant, stockage):
+        self.identifiant = identifiant
+        self.stockage = stockage
+        self._ressources = {}
+        self._verrou = threading.Lock()
+
+    def ressource(self, nom, fabrique):
+        """Ressource créée une fois par classe ouverte : `fabrique(stockage)`"""
+        with self._verrou:
+            if nom not in self._ressources:
+                self._ressources[nom] = fabrique(self.stockage)
+            return self._ressources[nom]
+
+    def emploi_du_temps(self):
+        """Index de l'emploi du temps, reconstruit seulement quand il ou les professeurs changent"""
+        return self.ressource("emploi_du_temps", CacheIndex).index()
+
+    def statistiques(self):
+        """Moteur de statistiques de la classe (voir le module statistiques)"""
+        from .statistiques import MoteurStatistiques
+        return self.ressource("statistiques", MoteurStatistiques)
+
+    def alertes(self):
+        """Moteur d'alertes d'absence de la classe (voir le module alertes)"""
+        from .alertes import MoteurAlertes
+        return self.ressource("alertes", MoteurAlertes)
+
+
+class Registre:
+    """Liste des classes et ouverture de leurs fragments à la demande"""
+
+    def __init__(self, moteur="json", heures_par_matiere=3, chemin=FICHIER_REGISTRE,
+                 max_ouvertes=MAX_CLASSES_OUVERTES):
+        self.moteur = moteur
+        self.heures_par_matiere = heures_par_matiere
+        self.chemin = chemin
+        self.max_ouvertes = max_ouvertes
+        self._donnees = {"classes": [], "mot_de_passe_hash": ""}
+        self._mtime = None
+        self._verrou = threading.RLock()
+        # Classes récemment utilisées (gardées en mémoire) et classes encore
+        # référencées par une session : une classe n'est jamais ouverte deux fois
+        self._recentes = OrderedDict()
+        self._vivantes = weakref.WeakValueDictionary()
+
+    def _chemin_fragment(self, fichier):
+        return os.path.join(os.path.dirname(self.chemin), fichier + EXTENSIONS[self.moteur])
+
+    def _ouvrir_fragment(self, fichier, parametres):
+        return ouvrir_stockage(self.moteur, self._chemin_fragment(fichier),
+                               self.heures_par_matiere).ouvrir(lambda: copy.deepcopy(parametres))
+
+    def charger(self, parametres_par_defaut, mot_de_passe_hash_par_defaut):
+        """Lit le registre ; à la première ouverture, les données existantes deviennent la classe 1"""
+        with self._verrou:
+            try:
+                with open(self.chemin, "r") as f:
+                    self._donnees = json.load(f)
+            except FileNotFoundError:
+                historique = self._ouvrir_fragment(FICHIER_HISTORIQUE, parametres_par_defaut)
+                self._donnees = {
+                    "mot_de_passe_hash": historique.mot_de_passe_hash or mot_de_passe_hash_par_defaut,
+                    "classes": [{"id": "classe-1", "nom": "Classe 1", "fichier": FICHIER_HISTORIQUE}],
+                }
+                self._enregistrer()
+            self._mtime = self._date_modification()
+        return self
+
+    def _date_modification(self):
+        try:
+            return os.stat(self.chemin).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _enregistrer(self):
+        ecrire_json(self.chemin, self._donnees)
+        self._mtime = self._date_modification()
+
+    def verifier_fraicheur(self):
+        """Relit le registre s'il a été modifié par un autre processus"""
+        with self._verrou:
+            if self._date_modification() != self._mtime:
+                with open(self.chemin, "r") as f:
+                    self._donnees = json.load(f)
+                self._mtime = self._date_modification()
+
+    @property
+    def classes(self):
+        """Copie de la liste des classes : [{"id", "nom", "fichier"}]"""
+        with self._verrou:
+            return copy.deepcopy(self._donnees["classes"])
+
+    def nom(self, identifiant):
+        return next((classe["nom"] for classe in self.classes if classe["id"] == identifiant), identifiant)
+
+    @property
+    def mot_de_passe_hash(self):
+        return self._donnees["mot_de_passe_hash"]
+
+    def definir_mot_de_passe(self, mot_de_passe_hash):
+        with self._verrou:
+            self._donnees["mot_de_passe_hash"] = mot_de_passe_hash
+            self._enregistrer()
+
+    def creer_classe(self, nom, parametres):
+        """Ajoute une classe et initialise son fragment avec `parametres` ; retourne son identifiant"""
+        with self._verrou:
+            numeros = [int(classe["id"].rsplit("-", 1)[1]) for classe in self._donnees["classes"]]
+            identifiant = f"classe-{max(numeros, default=0) + 1}"
+            fichier = f"presences_{identifiant}"
+            self._vivantes[identifiant] = self._garder(
+                identifiant, ClasseOuverte(identifiant, self._ouvrir_fragment(fichier, parametres)))
+            self._donnees["classes"].append({"id": identifiant, "nom": nom, "fichier": fichier})
+            self._enregistrer()
+        return identifiant
+
+    def renommer_classe(self, identifiant, nom):
+        with self._verrou:
+            for classe in self._donnees["classes"]:
+                if classe["id"] == identifiant:
+                    classe["nom"] = nom
+            self._enregistrer()
+
+    def _garder(self, identifiant, classe):
+        """Place la classe en tête des classes récentes et libère les plus anciennes"""
+        self._recentes[identifiant] = classe
+        self._recentes.move_to_end(identifiant)
+        while len(self._recentes) > self.max_ouvertes:
+            self._recentes.popitem(last=False)
+        return classe
+
+    def ouvrir(self, identifiant, parametres_par_defaut):
+        """Classe ouverte correspondant à `identifiant`, chargée à la première demande"""
+        with self._verrou:
+            classe = self._recentes.get(identifiant) or self._vivantes.get(identifiant)
+            if classe is None:
+                fichier = next(c["fichier"] for c in self._donnees["classes"] if c["id"] == identifiant)
+                classe = ClasseOuverte(identifiant, self._ouvrir_fragment(fichier, parametres_par_defaut))
+                self._vivantes[identifiant] = classe
+            return self._garder(identifiant, classe)
+
+    def ouvertes(self):
+        """Identifiants des classes actuellement gardées en mémoire"""
+        with self._verrou:
+            return list(self._recentes)
@@ -0,0 +1,68 @@
+"""Représentation compacte d'un créneau (date, jour, matière) par deux masques de bits.
+
+Le bit i de `presents` vaut 1 si l'élève en position i est présent, le bit i
+de `enregistres` vaut 1 si sa présence a été saisie. Les trois statuts
+historiques se traduisent ainsi :
+
+    "yes" -> présent=1, enregistré=1
+    "no"  -> présent=0, enregistré=1
+    ""    -> présent=0, enregistré=0
+"""
+
+VIDE = (0, 0)
+
+
+def nouveau():
+    """Créneau sans aucune présence saisie : [presents, enregistres]"""
+    return [0, 0]
+
+
+def statut(creneau, position):
+    """Statut ("yes", "no" ou "") de l'élève en `position`"""
+    presents, enregistres = creneau
+    if not enregistres >> position & 1:
+        return ""
+    return "yes" if presents >> position & 1 else "no"
+
+
+def masques(statuts_par_position):
+    """Convertit {position: statut} en (masque, presents, enregistres)"""
+    masque = presents = enregistres = 0
+    for position, valeur in statuts_par_position.items():
+        bit = 1 << position
+        masque |= bit
+        if valeur == "yes":
+            presents |= bit
+            enregistres |= bit
+        elif valeur == "no":
+            enregistres |= bit
+    return masque, presents, enregistres
+
+
+def appliquer_masques(creneau, masque, presents, enregistres):
+    """Remplace les bits de `creneau` sélectionnés par `masque` (modifie la liste)"""
+    creneau[0] = (creneau[0] & ~masque) | (presents & masque)
+    creneau[1] = (creneau[1] & ~masque) | (enregistres & masque)
+    return creneau
+
+
+def compter(creneau, masque_effectif=-1):
+    """Nombre de présents et d'absents du créneau : (presents, absents)"""
+    presents, enregistres = creneau
+    presents &= masque_effectif
+    enregistres &= masque_effectif
+    return presents.bit_count(), (enregistres & ~presents).bit_count()
+
+
+def masque_effectif(nb_eleves):
+    """Masque couvrant les positions des élèves actuels"""
+    return (1 << nb_eleves) - 1
+
+
+def depuis_statuts(statuts_par_nom, eleves):
+    """Convertit l'ancien format {nom: statut} d'un créneau en [presents, enregistres]"""
+    positions = {nom: i for i, nom in enumerate(eleves)}
+    _, presents, enregistres = masques({
+        positions[nom]: valeur for nom, valeur in statuts_par_nom.items() if nom in positions
+    })
+    return [presents, enregistres]
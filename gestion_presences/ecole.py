@@ -0,0 +1,117 @@
+"""Point d'entrée de la bibliothèque, utilisable sans Streamlit.
+
+    ecole = Ecole("json", dossier="donnees")
+    classe = ecole.classe("classe-1")
+    classe.stockage.ecrire_lot("2026-W42", {("Lundi", "Mathématiques"): {"Élève 1": "yes"}})
+    classe.statistiques().par_eleve(plage=("2026-09-01", "2026-10-31"))
+    classe.alertes().actives()
+
+L'application Streamlit n'est qu'une interface au-dessus de cette API :
+registre des classes, stockage des présences (module stockage), index de
+l'emploi du temps (module emploi_du_temps), statistiques et alertes d'absence.
+"""
+import hashlib
+import os
+from datetime import date
+
+from . import calendrier
+from .classes import FICHIER_REGISTRE, Registre
+
+# Emploi du temps par défaut d'une nouvelle classe (chaque classe a ensuite le sien)
+EMPLOI_DU_TEMPS_PAR_DEFAUT = {
+    "Lundi": [
+        {"nom": "Mathématiques", "prof": "M. Dupont", "tel": "01 23 45 67 89"},
+        {"nom": "Français", "prof": "Mme. Martin", "tel": "01 34 56 78 90"},
+        {"nom": "TPA-concept", "prof": "M. Leroy", "tel": "01 45 67 89 01"}
+    ],
+    "Mardi": [
+        {"nom": "Physique-Chimie", "prof": "Mme. Bernard", "tel": "01 56 78 90 12"},
+        {"nom": "Mathématiques", "prof": "M. Dupont", "tel": "01 23 45 67 89"},
+        {"nom": "TPA-cao", "prof": "M. Petit", "tel": "01 67 89 01 23"},
+        {"nom": "EPS", "prof": "M. Robert", "tel": "01 78 90 12 34"}
+    ],
+    "Mercredi": [
+        {"nom": "Technologie", "prof": "M. Richard", "tel": "01 89 01 23 45"},
+        {"nom": "Informatique", "prof": "Mme. Durand", "tel": "01 90 12 34 56"},
+        {"nom": "Physique-Chimie", "prof": "Mme. Bernard", "tel": "01 56 78 90 12"}
+    ],
+    "Jeudi": [
+        {"nom": "Construction mécanique", "prof": "M. Simon", "tel": "02 12 34 56 78"},
+        {"nom": "Histoire-Géo", "prof": "Mme. Laurent", "tel": "02 23 45 67 89"},
+        {"nom": "Dessin", "prof": "M. Michel", "tel": "02 34 56 78 90"}
+    ],
+    "Vendredi": [
+        {"nom": "Électronique", "prof": "M. Moreau", "tel": "02 45 67 89 01"},
+        {"nom": "Anglais", "prof": "Mme. Thomas", "tel": "02 56 78 90 12"}
+    ]
+}
+
+HEURES_PAR_MATIERE = 3
+
+MOT_DE_PASSE_PAR_DEFAUT = "admin123"
+
+
+def hacher_mot_de_passe(mot_de_passe):
+    return hashlib.sha256(mot_de_passe.encode()).hexdigest()
+
+
+def semaine_en_cours():
+    """Clé de la semaine ISO courante ("2026-W42"), qui partitionne les présences"""
+    return calendrier.semaine_iso(date.today())
+
+
+def parametres_classe(emploi_du_temps=None, nb_eleves=31):
+    """Paramètres initiaux d'une classe : effectif, emploi du temps et professeurs qui en découlent"""
+    emploi_du_temps = emploi_du_temps or EMPLOI_DU_TEMPS_PAR_DEFAUT
+    professeurs = {}
+    for jour in emploi_du_temps:
+        for matiere_info in emploi_du_temps[jour]:
+            matiere_nom = matiere_info["nom"]
+            if matiere_nom not in professeurs:
+                professeurs[matiere_nom] = {
+                    "nom": matiere_info["prof"],
+                    "telephone": matiere_info["tel"]
+                }
+    return {
+        'eleves': [f"Élève {i+1}" for i in range(nb_eleves)],
+        'professeurs': professeurs,
+        'emploi_du_temps': emploi_du_temps
+    }
+
+
+class Ecole:
+    """Classes d'un établissement et accès à leurs données"""
+
+    def __init__(self, moteur="json", dossier=".", heures_par_matiere=HEURES_PAR_MATIERE):
+        # Calculés une fois par établissement (le registre en copie un exemplaire par nouvelle classe)
+        self._parametres_par_defaut = parametres_classe()
+        self.registre = Registre(moteur, heures_par_matiere, os.path.join(dossier, FICHIER_REGISTRE)).charger(
+            self._parametres_par_defaut, hacher_mot_de_passe(MOT_DE_PASSE_PAR_DEFAUT))
+
+    @property
+    def classes(self):
+        """[{"id", "nom", "fichier"}]"""
+        return self.registre.classes
+
+    def verifier_mot_de_passe(self, mot_de_passe):
+        return hacher_mot_de_passe(mot_de_passe) == self.registre.mot_de_passe_hash
+
+    def definir_mot_de_passe(self, mot_de_passe):
+        self.registre.definir_mot_de_passe(hacher_mot_de_passe(mot_de_passe))
+
+    def classe(self, identifiant):
+        """Classe ouverte (stockage, emploi du temps, statistiques), chargée à la première demande"""
+        return self.registre.ouvrir(identifiant, self._parametres_par_defaut)
+
+    def nom_classe(self, identifiant):
+        return self.registre.nom(identifiant)
+
+    def creer_classe(self, nom, nb_eleves=31, emploi_du_temps=None):
+        """Crée une classe et retourne son identifiant"""
+        return self.registre.creer_classe(nom, parametres_classe(emploi_du_temps, nb_eleves))
+
+    def renommer_classe(self, identifiant, nom):
+        self.registre.renommer_classe(identifiant, nom)
+
+    def verifier_fraicheur(self):
+        self.registre.verifier_fraicheur()
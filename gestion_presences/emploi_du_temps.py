@@ -0,0 +1,73 @@
+"""Index de l'emploi du temps et des professeurs d'une classe.
+
+L'emploi du temps ({jour: [{"nom", "prof", "tel"}]}) et les fiches
+professeurs ({matiere: {"nom", "telephone"}}) sont combinés une fois en
+structures directement consultables : matière → professeur, jour →
+créneaux, professeur → créneaux. L'index n'est reconstruit que lorsque
+l'un de ces deux paramètres change.
+"""
+import threading
+from collections import namedtuple
+
+Professeur = namedtuple("Professeur", "nom telephone")
+Creneau = namedtuple("Creneau", "jour matiere professeur")
+
+NON_DEFINI = Professeur("Professeur non défini", "")
+
+# Paramètres du stockage dont dépend l'index
+PARAMETRES = ("emploi_du_temps", "professeurs")
+
+
+def revision(stockage):
+    """Dernière version des données à laquelle l'emploi du temps ou les professeurs ont changé"""
+    return max(stockage.revisions.get(cle, 0) for cle in PARAMETRES)
+
+
+class IndexEmploiDuTemps:
+    """Vue structurée de l'emploi du temps ; la fiche professeur prime sur l'emploi du temps"""
+
+    def __init__(self, emploi_du_temps, professeurs):
+        fiches = {}
+        for matieres in emploi_du_temps.values():
+            for matiere_info in matieres:
+                fiches.setdefault(matiere_info["nom"], Professeur(matiere_info["prof"], matiere_info["tel"]))
+        fiches.update({matiere: Professeur(info["nom"], info["telephone"])
+                       for matiere, info in professeurs.items()})
+        self._fiches = fiches
+        self.jours = list(emploi_du_temps)
+        self.creneaux_du_jour = {
+            jour: [Creneau(jour, matiere_info["nom"], fiches[matiere_info["nom"]]) for matiere_info in matieres]
+            for jour, matieres in emploi_du_temps.items()
+        }
+        self.creneaux = [creneau for jour in self.jours for creneau in self.creneaux_du_jour[jour]]
+        self.matieres = list(dict.fromkeys(creneau.matiere for creneau in self.creneaux))
+        self.creneaux_du_professeur = {}
+        for creneau in self.creneaux:
+            self.creneaux_du_professeur.setdefault(creneau.professeur.nom, []).append(creneau)
+        self.professeur_par_matiere = {matiere: fiche.nom for matiere, fiche in fiches.items()}
+
+    @classmethod
+    def depuis(cls, stockage):
+        return cls(stockage.emploi_du_temps, stockage.professeurs)
+
+    def professeur(self, matiere):
+        """Fiche du professeur d'une matière (NON_DEFINI si inconnue)"""
+        return self._fiches.get(matiere, NON_DEFINI)
+
+
+class CacheIndex:
+    """Index d'un stockage, reconstruit seulement quand l'emploi du temps ou les professeurs changent"""
+
+    def __init__(self, stockage):
+        self.stockage = stockage
+        self._index = None
+        self._revisions = None
+        self._verrou = threading.Lock()
+
+    def index(self):
+        with self._verrou:
+            revisions = tuple(self.stockage.revisions.get(cle) for cle in PARAMETRES)
+            if self._index is None or self._revisions != revisions:
+                self._index = IndexEmploiDuTemps.depuis(self.stockage)
+                self._revisions = revisions
+            return self._index
@@ -0,0 +1,117 @@
+"""Export de l'historique des présences au format long (CSV ou Parquet).
+
+Une ligne par élève et par créneau renseigné :
+classe, date, semaine, jour, matière, professeur, élève, statut, heures.
+Plusieurs classes peuvent être exportées dans le même fichier.
+
+Les lignes sont produites par un générateur et écrites par blocs dans un
+fichier temporaire : la table complète n'est jamais construite en mémoire,
+quelle que soit la taille de l'historique. Le fichier (FichierExport) n'est
+lu qu'au téléchargement et supprimé dès qu'il n'est plus référencé, par
+exemple à la fin de la session qui l'a demandé.
+"""
+import contextlib
+import csv
+import importlib.util
+import io
+import itertools
+import os
+import tempfile
+import weakref
+
+from . import calendrier
+from .emploi_du_temps import IndexEmploiDuTemps
+
+COLONNES = ("classe", "date", "semaine", "jour", "matiere", "professeur", "eleve", "statut", "heures")
+
+# Nombre de lignes écrites à la fois
+TAILLE_BLOC = 10_000
+
+FORMATS = {"CSV": ".csv", "Parquet": ".parquet"}
+
+
+def parquet_disponible():
+    """Parquet nécessite pyarrow, dépendance facultative"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def lignes(classe, stockage):
+    """Itère sur l'historique d'une classe au format long, un tuple par (créneau, élève) renseigné"""
+    edt = IndexEmploiDuTemps.depuis(stockage)
+    for semaine, jour, matiere, statuts in stockage.iterer_creneaux():
+        date = calendrier.date_du_jour(semaine, jour).isoformat()
+        professeur = edt.professeur_par_matiere.get(matiere, "")
+        heures = stockage.heures(matiere)
+        for eleve, statut in statuts.items():
+            yield classe, date, semaine, jour, matiere, professeur, eleve, statut, heures
+
+
+def par_blocs(iterable, taille=TAILLE_BLOC):
+    iterateur = iter(iterable)
+    while bloc := list(itertools.islice(iterateur, taille)):
+        yield bloc
+
+
+def ecrire_csv(lignes_export, fichier):
+    """Écrit les lignes en CSV (UTF-8 avec BOM, lisible par Excel) dans un fichier binaire"""
+    texte = io.TextIOWrapper(fichier, encoding="utf-8-sig", newline="")
+    ecrivain = csv.writer(texte)
+    ecrivain.writerow(COLONNES)
+    for bloc in par_blocs(lignes_export):
+        ecrivain.writerows(bloc)
+    texte.flush()
+    texte.detach()
+
+
+def ecrire_parquet(lignes_export, fichier):
+    """Écrit les lignes en Parquet, un groupe de lignes par bloc"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(colonne, pa.float64() if colonne == "heures" else pa.string())
+                        for colonne in COLONNES])
+    with pq.ParquetWriter(fichier, schema, compression="zstd") as ecrivain:
+        for bloc in par_blocs(lignes_export):
+            colonnes = zip(*bloc)
+            ecrivain.write_table(pa.Table.from_arrays(
+                [pa.array(valeurs, type=champ.type) for valeurs, champ in zip(colonnes, schema)],
+                schema=schema))
+
+
+def _supprimer(chemin):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(chemin)
+
+
+class FichierExport:
+    """Fichier temporaire d'un export, supprimé par `supprimer`, quand l'objet disparaît ou à l'arrêt"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.supprimer = weakref.finalize(self, _supprimer, chemin)
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.chemin)[1]
+
+    def lire(self):
+        """Contenu du fichier, lu au moment du téléchargement"""
+        with open(self.chemin, "rb") as f:
+            return f.read()
+
+
+def exporter(classes, format_export):
+    """Écrit l'export des classes [(nom, stockage)] dans un fichier temporaire et retourne son FichierExport.
+
+    Lève ValueError (fichier supprimé) si un créneau porte un jour inconnu.
+    """
+    ecrire = {"CSV": ecrire_csv, "Parquet": ecrire_parquet}[format_export]
+    with tempfile.NamedTemporaryFile(prefix="presences_", suffix=FORMATS[format_export],
+                                     delete=False) as fichier:
+        resultat = FichierExport(fichier.name)
+        try:
+            ecrire(itertools.chain.from_iterable(lignes(nom, stockage) for nom, stockage in classes), fichier)
+        except BaseException:
+            resultat.supprimer()
+            raise
+    return resultat
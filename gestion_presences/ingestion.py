@@ -0,0 +1,301 @@
+"""API HTTP locale de saisie des présences, pour les lecteurs de badges.
+
+Un petit serveur asyncio (bibliothèque standard uniquement) reçoit des lots
+JSON d'événements :
+
+    POST /presences
+    [{"date": "2026-10-19", "jour": "Lundi", "matiere": "Mathématiques",
+      "eleve": "Élève 3", "statut": "yes", "classe": "classe-1"}, ...]
+
+`classe` (identifiant ou nom) est facultative : la première classe par
+défaut. Chaque événement est validé contre l'emploi du temps et la liste
+d'élèves de sa classe ; la réponse donne le nombre d'événements acceptés et
+les rejets, avec leur position dans le lot. `GET /sante` renvoie l'état du
+serveur.
+
+Les événements acceptés de toutes les requêtes reçues pendant
+DELAI_REGROUPEMENT sont regroupés par classe et par semaine, puis écrits
+hors de la boucle asyncio, en un seul `ecrire_lot` par groupe, dans le même
+stockage que les pages de l'application. La réponse part une fois le lot
+écrit ; si l'écriture d'un groupe échoue, seules les requêtes qui y ont des
+événements reçoivent une erreur (500), qui détaille les groupes en échec.
+La validation et l'écriture relisent au besoin le registre et les classes
+modifiés par un autre processus (l'application Streamlit, par exemple).
+
+Dans l'application, `PRESENCES_INGESTION_PORT=8765` démarre le serveur dans
+un fil du processus Streamlit (`PRESENCES_INGESTION_HOTE`, 127.0.0.1 par
+défaut). Seul, sans Streamlit :
+
+    python -m gestion_presences.ingestion --moteur json --dossier . --port 8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from http import HTTPStatus
+
+from . import calendrier
+from .stockage import MOTEURS
+
+PORT = int(os.environ.get("PRESENCES_INGESTION_PORT") or 0)
+HOTE = os.environ.get("PRESENCES_INGESTION_HOTE", "127.0.0.1")
+
+# Attente avant d'écrire, pour regrouper les requêtes arrivées ensemble (secondes)
+DELAI_REGROUPEMENT = 0.05
+
+# Taille maximale d'un corps de requête, en octets
+TAILLE_MAX = 4 * 1024 * 1024
+
+CHAMPS = ("date", "jour", "matiere", "eleve", "statut")
+STATUTS = ("yes", "no", "")
+
+
+class Ingestion:
+    """Serveur d'ingestion d'un établissement : validation, regroupement et écriture des événements"""
+
+    def __init__(self, ecole, delai=DELAI_REGROUPEMENT):
+        self.ecole = ecole
+        self.delai = delai
+        self.hote = None
+        self.port = None
+        self.erreur = None
+        self.evenements_ecrits = 0
+        self.lots_ecrits = 0
+        self._file = None
+
+    def _classes(self):
+        """Identifiant de chaque classe, sous son identifiant et sous son nom ("" : la première)"""
+        self.ecole.verifier_fraicheur()
+        classes = self.ecole.classes
+        noms = {"": classes[0]["id"]} if classes else {}
+        for classe in classes:
+            noms[classe["nom"]] = noms[classe["id"]] = classe["id"]
+        return noms
+
+    def valider(self, evenements):
+        """Retourne les événements valides [(classe, semaine, jour, matiere, eleve, statut)]
+        et les rejets [{"index", "erreur"}].
+
+        Lit le registre et les classes concernées (relues si modifiées par un autre
+        processus) : à appeler hors de la boucle asyncio.
+        """
+        acceptes = []
+        rejets = []
+        classes = self._classes()
+        references = {}
+        for index, evenement in enumerate(evenements):
+            try:
+                if not isinstance(evenement, dict):
+                    raise ValueError("un objet JSON est attendu")
+                manquants = [champ for champ in CHAMPS if champ not in evenement]
+                if manquants:
+                    raise ValueError(f"champ(s) manquant(s) : {', '.join(manquants)}")
+                if not all(isinstance(evenement[champ], str) for champ in CHAMPS):
+                    raise ValueError(f"les champs {', '.join(CHAMPS)} doivent être des chaînes")
+                nom_classe = evenement.get("classe") or ""
+                if nom_classe not in classes:
+                    raise ValueError(f"classe inconnue : {nom_classe}")
+                classe = classes[nom_classe]
+                if classe not in references:
+                    ouverte = self.ecole.classe(classe)
+                    ouverte.stockage.verifier_fraicheur()
+                    edt = ouverte.emploi_du_temps()
+                    references[classe] = (
+                        {jour: {creneau.matiere for creneau in creneaux}
+                         for jour, creneaux in edt.creneaux_du_jour.items()},
+                        set(ouverte.stockage.eleves),
+                    )
+                matieres_par_jour, eleves = references[classe]
+                jour, matiere, eleve, statut = (evenement[champ] for champ in CHAMPS[1:])
+                if jour not in matieres_par_jour:
+                    raise ValueError(f"jour absent de l'emploi du temps : {jour}")
+                if matiere not in matieres_par_jour[jour]:
+                    raise ValueError(f"pas de {matiere} le {jour}")
+                if eleve not in eleves:
+                    raise ValueError(f"élève inconnu : {eleve}")
+                if statut not in STATUTS:
+                    raise ValueError(f"statut invalide : {statut!r} (attendu : yes, no ou vide)")
+                try:
+                    semaine = calendrier.semaine_iso(evenement["date"])
+                except ValueError:
+                    raise ValueError(f"date invalide : {evenement['date']}") from None
+                if calendrier.date_du_jour(semaine, jour).isoformat() != evenement["date"]:
+                    raise ValueError(f"le {evenement['date']} n'est pas un {jour}")
+            except ValueError as erreur:
+                rejets.append({"index": index, "erreur": str(erreur)})
+            else:
+                acceptes.append((classe, semaine, jour, matiere, eleve, statut))
+        return acceptes, rejets
+
+    async def soumettre(self, acceptes):
+        """Confie des événements validés à l'écrivain ; rend la main une fois le lot écrit.
+
+        Retourne les échecs des groupes (classe, semaine) de ces événements : {groupe: erreur}.
+        """
+        resultat = asyncio.get_running_loop().create_future()
+        await self._file.put((acceptes, resultat))
+        return await resultat
+
+    async def _ecrivain(self):
+        while True:
+            lots = [await self._file.get()]
+            await asyncio.sleep(self.delai)
+            while not self._file.empty():
+                lots.append(self._file.get_nowait())
+            # Dans l'ordre d'arrivée : le dernier statut reçu pour une cellule l'emporte
+            groupes = {}
+            for acceptes, _ in lots:
+                for classe, semaine, jour, matiere, eleve, statut in acceptes:
+                    groupes.setdefault((classe, semaine), {}).setdefault((jour, matiere), {})[eleve] = statut
+            try:
+                echecs = await asyncio.to_thread(self._ecrire, groupes)
+            except Exception as erreur:
+                echecs = dict.fromkeys(groupes, erreur)
+            # Chaque requête n'est en échec que pour ses propres groupes
+            for acceptes, resultat in lots:
+                siens = {(classe, semaine) for classe, semaine, *_ in acceptes}
+                echecs_requete = {groupe: echecs[groupe] for groupe in siens if groupe in echecs}
+                self.evenements_ecrits += sum((classe, semaine) not in echecs_requete
+                                              for classe, semaine, *_ in acceptes)
+                resultat.set_result(echecs_requete)
+
+    def _ecrire(self, groupes):
+        """Une écriture par classe et par semaine, sur les données relues si besoin ; retourne {groupe: erreur}"""
+        echecs = {}
+        for (classe, semaine), modifications in groupes.items():
+            try:
+                stockage = self.ecole.classe(classe).stockage
+                stockage.verifier_fraicheur()
+                stockage.ecrire_lot(semaine, modifications)
+            except Exception as erreur:
+                echecs[(classe, semaine)] = erreur
+            else:
+                self.lots_ecrits += 1
+        return echecs
+
+    async def _traiter(self, methode, chemin, corps):
+        """Retourne (code HTTP, réponse JSON)"""
+        chemin = chemin.split("?", 1)[0]
+        if chemin == "/sante":
+            return HTTPStatus.OK, {"statut": "ok", "evenements_ecrits": self.evenements_ecrits,
+                                   "lots_ecrits": self.lots_ecrits}
+        if chemin != "/presences":
+            return HTTPStatus.NOT_FOUND, {"erreur": f"ressource inconnue : {chemin}"}
+        if methode != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"erreur": "POST attendu"}
+        try:
+            evenements = json.loads(corps)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"erreur": "JSON invalide"}
+        if isinstance(evenements, dict):
+            evenements = evenements.get("evenements")
+        if not isinstance(evenements, list):
+            return HTTPStatus.BAD_REQUEST, {"erreur": "une liste d'événements est attendue"}
+        # Validation hors de la boucle : elle peut charger une classe depuis le disque
+        acceptes, rejets = await asyncio.to_thread(self.valider, evenements)
+        echecs = await self.soumettre(acceptes) if acceptes else {}
+        if echecs:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {
+                "erreur": "écriture impossible pour une partie des événements",
+                "acceptes": sum((classe, semaine) not in echecs for classe, semaine, *_ in acceptes),
+                "echecs": [{"classe": classe, "semaine": semaine, "erreur": str(erreur)}
+                           for (classe, semaine), erreur in echecs.items()],
+                "rejets": rejets,
+            }
+        return HTTPStatus.OK, {"acceptes": len(acceptes), "rejets": rejets}
+
+    async def _connexion(self, lecteur, ecrivain):
+        """Requêtes HTTP/1.1 d'une connexion (gardée ouverte entre les lots)"""
+        try:
+            while True:
+                ligne = await lecteur.readline()
+                if not ligne:
+                    break
+                entetes = {}
+                while True:
+                    entete = await lecteur.readline()
+                    if entete in (b"\r\n", b"\n", b""):
+                        break
+                    nom, _, valeur = entete.decode("latin-1").partition(":")
+                    entetes[nom.strip().lower()] = valeur.strip()
+                garder = entetes.get("connection", "").lower() != "close"
+                try:
+                    methode, chemin, _ = ligne.decode("latin-1").split(" ", 2)
+                    longueur = int(entetes.get("content-length") or 0)
+                except ValueError:
+                    code, reponse, garder = HTTPStatus.BAD_REQUEST, {"erreur": "requête invalide"}, False
+                else:
+                    if longueur > TAILLE_MAX:
+                        code, reponse, garder = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"erreur": "lot trop gros"}, False
+                    else:
+                        corps = await lecteur.readexactly(longueur) if longueur else b""
+                        code, reponse = await self._traiter(methode, chemin, corps)
+                contenu = json.dumps(reponse, ensure_ascii=False).encode("utf-8")
+                ecrivain.write(
+                    f"HTTP/1.1 {code.value} {code.phrase}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(contenu)}\r\n"
+                    f"Connection: {'keep-alive' if garder else 'close'}\r\n\r\n".encode("latin-1") + contenu)
+                await ecrivain.drain()
+                if not garder:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            ecrivain.close()
+
+    async def servir(self, hote=HOTE, port=PORT, pret=None):
+        """Sert jusqu'à l'arrêt de la boucle ; `pret` (threading.Event) est levé une fois le port ouvert"""
+        self._file = asyncio.Queue()
+        self.hote = hote
+        try:
+            serveur = await asyncio.start_server(self._connexion, hote, port)
+            self.port = serveur.sockets[0].getsockname()[1]
+        except OSError as erreur:
+            self.erreur = erreur
+            raise
+        finally:
+            if pret is not None:
+                pret.set()
+        ecrivain = asyncio.create_task(self._ecrivain())
+        async with serveur:
+            try:
+                await serveur.serve_forever()
+            finally:
+                ecrivain.cancel()
+
+
+def demarrer(ecole, hote=HOTE, port=PORT):
+    """Démarre le serveur dans un fil du processus et retourne l'Ingestion (port 0 : port libre)"""
+    ingestion = Ingestion(ecole)
+    pret = threading.Event()
+    threading.Thread(target=asyncio.run, args=(ingestion.servir(hote, port, pret),),
+                     name="ingestion", daemon=True).start()
+    pret.wait()
+    if ingestion.erreur is not None:
+        raise ingestion.erreur
+    return ingestion
+
+
+def main(arguments=None):
+    from .ecole import Ecole
+
+    parseur = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parseur.add_argument("--moteur", choices=MOTEURS, default="json")
+    parseur.add_argument("--dossier", default=".", help="dossier des données (classes.json)")
+    parseur.add_argument("--hote", default=HOTE)
+    parseur.add_argument("--port", type=int, default=PORT or 8765)
+    options = parseur.parse_args(arguments)
+    ingestion = Ingestion(Ecole(options.moteur, options.dossier))
+    print(f"Ingestion sur http://{options.hote}:{options.port}/presences")
+    try:
+        asyncio.run(ingestion.servir(options.hote, options.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""Stockage par journal : un snapshot complet + un journal des modifications.
+
+Chaque modification est ajoutée en fin de journal (une ligne JSON), ce qui rend
+le coût d'écriture proportionnel à la modification et non à l'historique.
+Les lignes ne sont pas écrites par la requête qui les produit : un thread
+d'écriture les regroupe pendant DELAI_ECRITURE puis les ajoute en une seule
+écriture suivie d'un fsync. Un thread d'arrière-plan compacte périodiquement
+le journal dans le snapshot, remplacé atomiquement (fichier temporaire +
+fsync + renommage) : le snapshot n'est jamais à moitié écrit. Le snapshot est
+en JSON par défaut ; un autre format se branche par ses fonctions de lecture
+et d'écriture (voir le module stockage_binaire).
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+from . import agregats, calendrier, creneaux
+
+# Version du format des données : 2 = créneaux encodés en masques de bits,
+# 3 = présences partitionnées par semaine ISO, sans créneau vide
+FORMAT = 3
+
+# Nombre d'enregistrements dans le journal au-delà duquel on compacte
+SEUIL_COMPACTION = 200
+
+# Fenêtre de regroupement des écritures du journal (secondes)
+DELAI_ECRITURE = 0.2
+
+_journaux = {}
+_journaux_verrou = threading.Lock()
+
+
+def migrer(donnees):
+    """Convertit en place des données d'un format antérieur au format courant"""
+    if donnees.get("format", 1) < 2:
+        eleves = donnees.get("eleves", [])
+        for jours in donnees.get("presences", {}).values():
+            for matieres in jours.values():
+                for matiere, statuts in matieres.items():
+                    matieres[matiere] = creneaux.depuis_statuts(statuts, eleves)
+    if donnees.get("format", 1) < 3:
+        # Une entrée par jour calendaire -> une entrée par semaine ISO ; les jours
+        # d'une même semaine sont fusionnés dans l'ordre, le plus récent l'emportant
+        par_semaine = {}
+        for date, jours in sorted(donnees.get("presences", {}).items()):
+            for jour, matieres in jours.items():
+                for matiere, (presents, enregistres) in matieres.items():
+                    if enregistres:
+                        creneau = (par_semaine.setdefault(calendrier.semaine_iso(date), {})
+                                   .setdefault(jour, {}).setdefault(matiere, creneaux.nouveau()))
+                        creneaux.appliquer_masques(creneau, enregistres, presents, enregistres)
+        donnees["presences"] = par_semaine
+        # Les compteurs ne correspondent plus aux créneaux fusionnés
+        donnees.pop("agregats", None)
+    donnees["format"] = FORMAT
+    return donnees
+
+
+def _semaine(enregistrement):
+    # Les enregistrements antérieurs au format 3 portent une date calendaire
+    if "semaine" in enregistrement:
+        return enregistrement["semaine"]
+    return calendrier.semaine_iso(enregistrement["date"])
+
+
+def _elaguer(presences, semaine, jour, matiere):
+    """Retire un créneau devenu vide, puis le jour et la semaine s'ils sont vides"""
+    jours = presences[semaine]
+    if jours[jour][matiere] == creneaux.nouveau():
+        del jours[jour][matiere]
+        if not jours[jour]:
+            del jours[jour]
+            if not jours:
+                del presences[semaine]
+
+
+def appliquer(donnees, enregistrement):
+    """Applique un enregistrement du journal aux données en mémoire.
+
+    Les enregistrements qui modifient des présences portent les heures des
+    matières concernées, ce qui permet de tenir à jour les compteurs cumulés
+    (`donnees["agregats"]`) aussi bien en direct qu'au rejeu ou à la compaction.
+    """
+    op = enregistrement["op"]
+    if op in ("creneau", "presences"):
+        semaine = _semaine(enregistrement)
+        presences = donnees.setdefault("presences", {})
+        creneau = (presences.setdefault(semaine, {})
+                   .setdefault(enregistrement["jour"], {})
+                   .setdefault(enregistrement["matiere"], creneaux.nouveau()))
+        avant = tuple(creneau)
+        if op == "creneau":
+            creneaux.appliquer_masques(creneau, enregistrement["masque"],
+                                       enregistrement["presents"], enregistrement["enregistres"])
+        else:
+            # Ancien format : statuts indexés par nom d'élève
+            positions = {nom: i for i, nom in enumerate(donnees.get("eleves", []))}
+            creneaux.appliquer_masques(creneau, *creneaux.masques({
+                positions[nom]: statut
+                for nom, statut in enregistrement["statuts"].items() if nom in positions
+            }))
+        if "agregats" in donnees and "heures" in enregistrement:
+            agregats.appliquer_delta(donnees["agregats"], semaine,
+                                     enregistrement["jour"], enregistrement["matiere"],
+                                     enregistrement["heures"], avant, creneau)
+        _elaguer(presences, semaine, enregistrement["jour"], enregistrement["matiere"])
+    elif op in ("effacer_semaine", "effacer_date"):
+        semaine = _semaine(enregistrement)
+        jours = donnees.setdefault("presences", {}).pop(semaine, {})
+        if "agregats" in donnees and "heures" in enregistrement:
+            for jour, matieres in jours.items():
+                for matiere, creneau in matieres.items():
+                    agregats.appliquer_delta(donnees["agregats"], semaine, jour, matiere,
+                                             enregistrement["heures"].get(matiere, 0), creneau, creneaux.VIDE)
+    elif op == "lot":
+        for sous_enregistrement in enregistrement["enregistrements"]:
+            appliquer(donnees, sous_enregistrement)
+    elif op == "meta":
+        donnees[enregistrement["cle"]] = enregistrement["valeur"]
+    elif op == "eleves":
+        # Renommage : seuls les noms changés, indexés par position
+        eleves = list(donnees.get("eleves", []))
+        for position, nom in enregistrement["noms"].items():
+            eleves[int(position)] = nom
+        donnees["eleves"] = eleves
+
+
+def lire_snapshot(chemin):
+    try:
+        with open(chemin, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _lire_journal(chemin):
+    """Itère sur les enregistrements d'un fichier journal"""
+    try:
+        with open(chemin, 'r', encoding='utf-8') as f:
+            for numero, ligne in enumerate(f, 1):
+                if not ligne.endswith("\n"):
+                    # Dernière ligne tronquée par un arrêt brutal : on l'ignore
+                    return
+                try:
+                    yield json.loads(ligne)
+                except json.JSONDecodeError:
+                    raise ValueError(f"journal illisible : {chemin}, ligne {numero}")
+    except FileNotFoundError:
+        return
+
+
+def _tronquer_fin_dechiree(chemin):
+    """Coupe le journal après sa dernière ligne complète, pour que les ajouts suivants
+    ne se retrouvent pas collés à une ligne tronquée"""
+    try:
+        with open(chemin, 'r+b') as f:
+            taille = fin = f.seek(0, os.SEEK_END)
+            while fin > 0:
+                debut = max(0, fin - 4096)
+                f.seek(debut)
+                bloc = f.read(fin - debut)
+                position = bloc.rfind(b"\n")
+                if position >= 0:
+                    fin = debut + position + 1
+                    break
+                fin = debut
+            if fin < taille:
+                f.truncate(fin)
+                f.flush()
+                os.fsync(f.fileno())
+    except FileNotFoundError:
+        return
+
+
+def ecrire_temporaire(chemin, donnees):
+    """Écrit les données dans un fichier temporaire, à renommer ensuite sur `chemin`"""
+    temporaire = chemin + ".tmp"
+    with open(temporaire, 'w') as f:
+        json.dump(donnees, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    return temporaire
+
+
+def ecrire_json(chemin, donnees):
+    """Remplace atomiquement un fichier JSON (fichier temporaire + fsync + renommage)"""
+    os.replace(ecrire_temporaire(chemin, donnees), chemin)
+
+
+class Journal:
+    """Snapshot (JSON par défaut) + journal en ajout seul pour un fichier de données.
+
+    `lire(chemin)` retourne les données du snapshot (None s'il n'existe pas),
+    `ecrire(chemin, donnees)` les écrit dans un fichier temporaire et retourne son chemin.
+    """
+
+    def __init__(self, chemin_snapshot, seuil_compaction=SEUIL_COMPACTION, delai_ecriture=DELAI_ECRITURE,
+                 lire=lire_snapshot, ecrire=ecrire_temporaire):
+        self.chemin_snapshot = chemin_snapshot
+        self._lire = lire
+        self._ecrire = ecrire
+        self.chemin_journal = chemin_snapshot + ".journal"
+        # Journal gelé pendant une compaction en cours
+        self.chemin_compaction = self.chemin_journal + ".compaction"
+        self.seuil_compaction = seuil_compaction
+        self._verrou = threading.Lock()
+        self._compaction_verrou = threading.Lock()
+        self._nb_enregistrements = sum(1 for _ in _lire_journal(self.chemin_journal))
+        self._signature = None
+        self.format_lu = FORMAT
+        # Lignes en attente d'écriture par le thread d'écriture
+        self.delai_ecriture = delai_ecriture
+        self._en_attente = []
+        self._attente_verrou = threading.Lock()
+        self._signal = threading.Event()
+        self._ecrivain = None
+
+    def signature(self):
+        """Date de modification et taille des fichiers du journal"""
+        signature = []
+        for chemin in (self.chemin_snapshot, self.chemin_compaction, self.chemin_journal):
+            try:
+                etat = os.stat(chemin)
+                signature.append((etat.st_mtime_ns, etat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def modifie_exterieurement(self):
+        """Vrai si les fichiers ont changé depuis le dernier accès de ce processus"""
+        with self._verrou:
+            return self.signature() != self._signature
+
+    def existe(self):
+        return any(os.path.exists(chemin) for chemin in
+                   (self.chemin_snapshot, self.chemin_compaction, self.chemin_journal))
+
+    def charger(self):
+        """Relit le snapshot puis rejoue la fin du journal (None si aucune donnée)"""
+        self.vider()
+        with self._verrou:
+            if not self.existe():
+                return None
+            donnees = self._lire(self.chemin_snapshot) or {"format": FORMAT}
+            # Format lu sur disque, pour que le stockage réécrive un snapshot migré
+            self.format_lu = donnees.get("format", 1)
+            migrer(donnees)
+            for chemin in (self.chemin_compaction, self.chemin_journal):
+                _tronquer_fin_dechiree(chemin)
+                for enregistrement in _lire_journal(chemin):
+                    appliquer(donnees, enregistrement)
+            self._signature = self.signature()
+        return donnees
+
+    def ajouter(self, enregistrement):
+        """Confie un enregistrement au thread d'écriture, sans attendre le disque"""
+        ligne = json.dumps(enregistrement, ensure_ascii=False) + "\n"
+        with self._attente_verrou:
+            self._en_attente.append(ligne)
+            if self._ecrivain is None:
+                self._ecrivain = threading.Thread(target=self._boucle_ecriture,
+                                                  name="ecriture-journal", daemon=True)
+                self._ecrivain.start()
+        self._signal.set()
+
+    def en_attente(self):
+        """Nombre d'enregistrements pas encore écrits sur disque"""
+        with self._attente_verrou:
+            return len(self._en_attente)
+
+    def _boucle_ecriture(self):
+        while True:
+            self._signal.wait()
+            # Les modifications arrivées pendant ce délai partent dans la même écriture
+            time.sleep(self.delai_ecriture)
+            self._signal.clear()
+            try:
+                self.vider()
+            except OSError:
+                # Disque indisponible : les lignes restent en attente, nouvel essai plus tard
+                time.sleep(1)
+                self._signal.set()
+
+    def vider(self):
+        """Écrit immédiatement les enregistrements en attente (une écriture + fsync)"""
+        with self._verrou:
+            with self._attente_verrou:
+                lignes, self._en_attente = self._en_attente, []
+            if not lignes:
+                return
+            try:
+                with open(self.chemin_journal, 'a', encoding='utf-8') as f:
+                    f.write("".join(lignes))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                with self._attente_verrou:
+                    self._en_attente[:0] = lignes
+                raise
+            self._signature = self.signature()
+            self._nb_enregistrements += len(lignes)
+            compacter = self._nb_enregistrements >= self.seuil_compaction
+        if compacter:
+            self.compacter_en_arriere_plan()
+
+    def ecrire_snapshot(self, donnees):
+        """Remplace le snapshot par les données fournies et vide le journal"""
+        with self._compaction_verrou, self._verrou:
+            # Les données fournies incluent déjà les modifications en attente
+            with self._attente_verrou:
+                self._en_attente = []
+            os.replace(self._ecrire(self.chemin_snapshot, donnees), self.chemin_snapshot)
+            for chemin in (self.chemin_compaction, self.chemin_journal):
+                if os.path.exists(chemin):
+                    os.remove(chemin)
+            self._signature = self.signature()
+            self._nb_enregistrements = 0
+
+    def compacter(self):
+        """Intègre le journal dans le snapshot"""
+        self.vider()
+        with self._compaction_verrou:
+            with self._verrou:
+                if os.path.exists(self.chemin_journal):
+                    if os.path.exists(self.chemin_compaction):
+                        # Compaction précédente interrompue : on complète le journal gelé
+                        with open(self.chemin_journal, 'r', encoding='utf-8') as source, \
+                                open(self.chemin_compaction, 'a', encoding='utf-8') as cible:
+                            cible.write(source.read())
+                        os.remove(self.chemin_journal)
+                    else:
+                        os.replace(self.chemin_journal, self.chemin_compaction)
+                self._signature = self.signature()
+                self._nb_enregistrements = 0
+                if not os.path.exists(self.chemin_compaction):
+                    return
+
+            # Le rejeu et la sérialisation se font hors du verrou : les ajouts
+            # continuent pendant ce temps dans un nouveau journal.
+            donnees = migrer(self._lire(self.chemin_snapshot) or {"format": FORMAT})
+            for enregistrement in _lire_journal(self.chemin_compaction):
+                appliquer(donnees, enregistrement)
+            temporaire = self._ecrire(self.chemin_snapshot, donnees)
+
+            with self._verrou:
+                os.replace(temporaire, self.chemin_snapshot)
+                os.remove(self.chemin_compaction)
+                self._signature = self.signature()
+
+    def compacter_en_arriere_plan(self):
+        """Lance une compaction dans un thread si aucune n'est en cours"""
+        if self._compaction_verrou.locked():
+            return
+        threading.Thread(target=self.compacter, name="compaction-journal", daemon=True).start()
+
+
+def ouvrir_journal(chemin_snapshot, seuil_compaction=SEUIL_COMPACTION, lire=lire_snapshot,
+                   ecrire=ecrire_temporaire):
+    """Retourne le journal partagé par toutes les sessions pour ce fichier"""
+    cle = os.path.abspath(chemin_snapshot)
+    with _journaux_verrou:
+        if cle not in _journaux:
+            _journaux[cle] = Journal(chemin_snapshot, seuil_compaction, lire=lire, ecrire=ecrire)
+        return _journaux[cle]
+
+
+@atexit.register
+def vider_tous():
+    """Écrit les modifications en attente de tous les journaux (à l'arrêt du processus)"""
+    with _journaux_verrou:
+        journaux = list(_journaux.values())
+    for journal in journaux:
+        journal.vider()
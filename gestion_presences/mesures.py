@@ -0,0 +1,87 @@
+"""Mesures de performance facultatives, activées par PRESENCES_MESURES=1.
+
+Les valeurs (durées en ms, tailles en Ko) sont regroupées par page et par
+mesure ; seules les TAILLE_HISTORIQUE dernières sont gardées pour calculer
+les centiles. Avec PRESENCES_MESURES_FICHIER, chaque valeur est aussi
+ajoutée à un fichier JSON lignes. Désactivées, les mesures se réduisent à
+un test de booléen : `chrono` renvoie un contexte vide partagé.
+"""
+import contextlib
+import json
+import math
+import os
+import pickle
+import threading
+import time
+from collections import deque
+
+ACTIVES = os.environ.get("PRESENCES_MESURES", "") not in ("", "0")
+FICHIER = os.environ.get("PRESENCES_MESURES_FICHIER") or None
+
+# Nombre de valeurs conservées par (page, mesure)
+TAILLE_HISTORIQUE = 500
+
+CENTILES = (50, 90, 99)
+
+_VIDE = contextlib.nullcontext()
+_valeurs = {}
+_verrou = threading.Lock()
+
+
+def enregistrer(page, mesure, valeur):
+    if not ACTIVES:
+        return
+    with _verrou:
+        _valeurs.setdefault((page, mesure), deque(maxlen=TAILLE_HISTORIQUE)).append(valeur)
+        if FICHIER:
+            with open(FICHIER, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"horodatage": time.time(), "page": page, "mesure": mesure,
+                                    "valeur": round(valeur, 3)}, ensure_ascii=False) + "\n")
+
+
+@contextlib.contextmanager
+def _chrono(page, mesure):
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        enregistrer(page, mesure, (time.perf_counter() - debut) * 1000)
+
+
+def chrono(page, mesure):
+    """Contexte qui enregistre la durée du bloc, en millisecondes"""
+    return _chrono(page, mesure) if ACTIVES else _VIDE
+
+
+def taille_ko(valeurs):
+    """Taille approximative (sérialisée) d'objets Python, en Ko ; les objets non sérialisables sont ignorés"""
+    taille = 0
+    for valeur in valeurs:
+        try:
+            taille += len(pickle.dumps(valeur))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            pass
+    return taille / 1024
+
+
+def _centile(valeurs_triees, centile):
+    # Méthode du rang le plus proche
+    return valeurs_triees[max(0, math.ceil(centile / 100 * len(valeurs_triees)) - 1)]
+
+
+def centiles():
+    """Une ligne par (page, mesure) : nombre de valeurs, centiles et maximum"""
+    with _verrou:
+        copies = {cle: sorted(valeurs) for cle, valeurs in _valeurs.items()}
+    lignes = []
+    for (page, mesure), valeurs in sorted(copies.items()):
+        ligne = {"Page": page, "Mesure": mesure, "N": len(valeurs)}
+        ligne.update({f"p{centile}": round(_centile(valeurs, centile), 2) for centile in CENTILES})
+        ligne["max"] = round(valeurs[-1], 2)
+        lignes.append(ligne)
+    return lignes
+
+
+def reinitialiser():
+    with _verrou:
+        _valeurs.clear()
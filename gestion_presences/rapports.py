@@ -0,0 +1,317 @@
+"""Rapports d'assiduité de fin de période, générés en arrière-plan.
+
+Pour une plage de dates (un trimestre), chaque élève reçoit un rapport des
+heures présentes et absentes par matière et par professeur, comme l'onglet
+"Par élève" des statistiques mais sur toute la période ; chaque classe reçoit
+une synthèse par élève et par matière. Les rapports (HTML ou CSV) sont
+réunis dans une archive zip.
+
+Les données des classes sont lues une seule fois, au lancement : un
+instantané (masques des seules semaines de la plage) est écrit dans un
+fichier, que chaque processus de calcul charge une fois sans jamais toucher
+au stockage. Dans l'application, le calcul tourne dans un processus séparé
+suivi par un fil du serveur, sans bloquer les sessions, qui lisent sa
+progression (`Travail`).
+
+    python -m gestion_presences.rapports --dossier . --debut 2026-09-01 --fin 2026-12-19
+"""
+import argparse
+import contextlib
+import csv
+import html
+import io
+import os
+import pickle
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import calendrier
+from .stockage import MOTEURS
+
+FORMATS = {"HTML": ".html", "CSV": ".csv"}
+
+# Processus de calcul d'un travail
+PROCESSUS = min(4, os.cpu_count() or 1)
+
+# Élèves par tâche confiée à un processus
+TAILLE_TACHE = 8
+
+COLONNES = ("Heures présentes", "Heures absentes", "Taux de présence")
+
+
+def instantane(classe, nom, debut, fin):
+    """Données d'une classe ouverte utiles aux rapports de la plage (dictionnaire sérialisable)"""
+    stockage = classe.stockage
+    edt = classe.emploi_du_temps()
+    masques = stockage.masques_creneaux(calendrier.semaines_entre(debut, fin))
+    matieres = list(dict.fromkeys(edt.matieres + [matiere for _, _, matiere, _, _ in masques]))
+    return {
+        "nom": nom,
+        "debut": str(debut),
+        "fin": str(fin),
+        "eleves": list(stockage.eleves),
+        "matieres": [(matiere, edt.professeur(matiere).nom, stockage.heures(matiere)) for matiere in matieres],
+        "creneaux": [(matiere, presents, enregistres) for _, _, matiere, presents, enregistres in masques],
+    }
+
+
+def _taux(presentes, absentes):
+    total = presentes + absentes
+    return f"{presentes * 100 / total:.1f}%" if total else "0.0%"
+
+
+def _compter(masque):
+    return bin(masque).count("1")
+
+
+def heures_eleve(donnees, position):
+    """{matiere: [heures présentes, heures absentes]} d'un élève sur la plage"""
+    heures = {matiere: nombre for matiere, _, nombre in donnees["matieres"]}
+    comptes = {matiere: [0, 0] for matiere in heures}
+    for matiere, presents, enregistres in donnees["creneaux"]:
+        if enregistres >> position & 1:
+            comptes[matiere][0 if presents >> position & 1 else 1] += heures[matiere]
+    return comptes
+
+
+def _regrouper(donnees, comptes):
+    """Lignes par matière et par professeur : [(nom, présentes, absentes, taux)]"""
+    par_matiere = []
+    par_professeur = {}
+    for matiere, professeur, _ in donnees["matieres"]:
+        presentes, absentes = comptes[matiere]
+        par_matiere.append((matiere, presentes, absentes, _taux(presentes, absentes)))
+        cumul = par_professeur.setdefault(professeur, [0, 0])
+        cumul[0] += presentes
+        cumul[1] += absentes
+    return par_matiere, [(professeur, p, a, _taux(p, a)) for professeur, (p, a) in par_professeur.items()]
+
+
+def _rendre(titre, donnees, sections, format_rapport):
+    """Document d'un rapport : sections [(titre, première colonne, lignes)]"""
+    if format_rapport == "CSV":
+        tampon = io.StringIO()
+        ecrivain = csv.writer(tampon)
+        ecrivain.writerow(("Regroupement", "Nom") + COLONNES)
+        for titre_section, _, lignes in sections:
+            ecrivain.writerows((titre_section,) + tuple(ligne) for ligne in lignes)
+        return tampon.getvalue()
+    morceaux = [f"<!DOCTYPE html>\n<html lang=\"fr\"><head><meta charset=\"utf-8\"><title>{html.escape(titre)}</title>"
+                "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+                "td,th{border:1px solid #999;padding:4px 8px}td+td{text-align:right}</style></head><body>",
+                f"<h1>{html.escape(titre)}</h1>",
+                f"<p>{html.escape(donnees['nom'])}, du {donnees['debut']} au {donnees['fin']}</p>"]
+    for titre_section, premiere, lignes in sections:
+        morceaux.append(f"<h2>{html.escape(titre_section)}</h2><table><tr>"
+                        + "".join(f"<th>{html.escape(colonne)}</th>" for colonne in (premiere,) + COLONNES) + "</tr>")
+        morceaux.extend("<tr>" + "".join(f"<td>{html.escape(str(valeur))}</td>" for valeur in ligne) + "</tr>"
+                        for ligne in lignes)
+        morceaux.append("</table>")
+    morceaux.append("</body></html>\n")
+    return "".join(morceaux)
+
+
+def _nom_fichier(nom):
+    return re.sub(r"[^\w-]+", "_", nom).strip("_") or "sans_nom"
+
+
+def _ecrire(chemin, contenu):
+    with open(chemin, "w", encoding="utf-8", newline="") as f:
+        f.write(contenu)
+
+
+# Instantané chargé une fois par processus de calcul
+_donnees = None
+
+
+def _charger(chemin):
+    global _donnees
+    with open(chemin, "rb") as f:
+        _donnees = pickle.load(f)
+
+
+def _rapports_eleves(identifiant, positions, dossier, format_rapport):
+    """Écrit les rapports d'un groupe d'élèves ; retourne leur nombre"""
+    donnees = _donnees[identifiant]
+    for position in positions:
+        eleve = donnees["eleves"][position]
+        par_matiere, par_professeur = _regrouper(donnees, heures_eleve(donnees, position))
+        contenu = _rendre(f"Assiduité de {eleve}", donnees,
+                          [("Par matière", "Matière", par_matiere), ("Par professeur", "Professeur", par_professeur)],
+                          format_rapport)
+        _ecrire(os.path.join(dossier, f"{position + 1:03d}_{_nom_fichier(eleve)}{FORMATS[format_rapport]}"), contenu)
+    return len(positions)
+
+
+def _rapport_classe(identifiant, dossier, format_rapport):
+    """Écrit la synthèse d'une classe : une ligne par élève, puis par matière"""
+    donnees = _donnees[identifiant]
+    par_eleve = []
+    for position, eleve in enumerate(donnees["eleves"]):
+        comptes = heures_eleve(donnees, position).values()
+        presentes = sum(p for p, _ in comptes)
+        absentes = sum(a for _, a in comptes)
+        par_eleve.append((eleve, presentes, absentes, _taux(presentes, absentes)))
+    heures = {matiere: nombre for matiere, _, nombre in donnees["matieres"]}
+    comptes = {matiere: [0, 0] for matiere in heures}
+    for matiere, presents, enregistres in donnees["creneaux"]:
+        comptes[matiere][0] += _compter(presents & enregistres) * heures[matiere]
+        comptes[matiere][1] += _compter(enregistres & ~presents) * heures[matiere]
+    par_matiere, par_professeur = _regrouper(donnees, comptes)
+    contenu = _rendre(f"Synthèse de {donnees['nom']}", donnees,
+                      [("Par élève", "Élève", par_eleve), ("Par matière", "Matière", par_matiere),
+                       ("Par professeur", "Professeur", par_professeur)],
+                      format_rapport)
+    _ecrire(os.path.join(dossier, f"000_synthese{FORMATS[format_rapport]}"), contenu)
+    return 1
+
+
+def generer(chemin_instantane, archive, format_rapport="HTML", processus=PROCESSUS, progression=None):
+    """Écrit les rapports de l'instantané par un groupe de processus, puis l'archive zip.
+
+    `progression(faits, total)` est appelée après chaque tâche terminée.
+    """
+    with open(chemin_instantane, "rb") as f:
+        donnees = pickle.load(f)
+    total = sum(len(classe["eleves"]) + 1 for classe in donnees.values())
+    faits = 0
+    with tempfile.TemporaryDirectory(prefix="rapports_") as dossier:
+        with ProcessPoolExecutor(processus, initializer=_charger, initargs=(chemin_instantane,)) as groupe:
+            taches = []
+            for identifiant, classe in donnees.items():
+                sortie = os.path.join(dossier, _nom_fichier(classe["nom"]))
+                os.makedirs(sortie, exist_ok=True)
+                taches.append(groupe.submit(_rapport_classe, identifiant, sortie, format_rapport))
+                for premier in range(0, len(classe["eleves"]), TAILLE_TACHE):
+                    positions = range(premier, min(premier + TAILLE_TACHE, len(classe["eleves"])))
+                    taches.append(groupe.submit(_rapports_eleves, identifiant, positions, sortie, format_rapport))
+            for tache in as_completed(taches):
+                faits += tache.result()
+                if progression is not None:
+                    progression(faits, total)
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_rapports:
+            for repertoire, _, fichiers in sorted(os.walk(dossier)):
+                for nom in sorted(fichiers):
+                    zip_rapports.write(os.path.join(repertoire, nom),
+                                       os.path.relpath(os.path.join(repertoire, nom), dossier))
+    return total
+
+
+def _supprimer(chemin):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(chemin)
+
+
+class Travail:
+    """Génération des rapports dans un processus séparé, suivie par les sessions.
+
+    Le processus (`python -m gestion_presences.rapports --instantane ...`) a son
+    propre groupe de processus de calcul : ceux-ci ne réimportent pas le script
+    Streamlit, qui est le module principal du serveur. L'archive est supprimée
+    par `supprimer`, quand le travail disparaît ou à l'arrêt.
+    """
+
+    def __init__(self, donnees, format_rapport):
+        self.total = sum(len(classe["eleves"]) + 1 for classe in donnees.values())
+        self.faits = 0
+        self.termine = False
+        self.erreur = None
+        self.archive = None
+        self.duree = None
+        self._donnees = donnees
+        self._format = format_rapport
+        with tempfile.NamedTemporaryFile(prefix="rapports_", suffix=".zip", delete=False) as fichier:
+            self._chemin_archive = fichier.name
+        self.supprimer = weakref.finalize(self, _supprimer, self._chemin_archive)
+
+    @property
+    def progression(self):
+        return self.faits / self.total if self.total else 1.0
+
+    def executer(self, processus=PROCESSUS):
+        debut = time.perf_counter()
+        try:
+            with tempfile.TemporaryDirectory(prefix="rapports_") as dossier:
+                chemin = os.path.join(dossier, "instantane.pickle")
+                with open(chemin, "wb") as f:
+                    pickle.dump(self._donnees, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._donnees = None
+                archive = self._chemin_archive
+                racine = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                commande = [sys.executable, "-m", "gestion_presences.rapports", "--instantane", chemin,
+                            "--archive", archive, "--format", self._format, "--processus", str(processus)]
+                # Erreurs dans un fichier : un tube non lu pendant la progression pourrait se remplir
+                # et bloquer les deux processus
+                with open(os.path.join(dossier, "erreurs.txt"), "w+") as sortie_erreurs:
+                    with subprocess.Popen(commande, cwd=racine, stdout=subprocess.PIPE, stderr=sortie_erreurs,
+                                          text=True) as generation:
+                        for ligne in generation.stdout:
+                            self.faits = int(ligne.split("/")[0])
+                    sortie_erreurs.seek(0)
+                    erreurs = sortie_erreurs.read()
+                if generation.returncode:
+                    raise RuntimeError(erreurs.strip().splitlines()[-1] if erreurs.strip() else
+                                       f"code de retour {generation.returncode}")
+                self.archive = archive
+        except Exception as erreur:
+            self.erreur = erreur
+            self.supprimer()
+        finally:
+            self._donnees = None
+            self.duree = time.perf_counter() - debut
+            self.termine = True
+
+
+def lancer(classes, debut, fin, format_rapport="HTML", processus=PROCESSUS):
+    """Lit l'instantané des classes [(identifiant, nom, classe ouverte)] et génère leurs rapports
+    en arrière-plan ; retourne le Travail, à suivre par `progression` et `termine`"""
+    donnees = {identifiant: instantane(classe, nom, debut, fin) for identifiant, nom, classe in classes}
+    travail = Travail(donnees, format_rapport)
+    threading.Thread(target=travail.executer, args=(processus,), name="rapports", daemon=True).start()
+    return travail
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parseur.add_argument("--instantane", help="instantané déjà écrit (sinon, lu dans --dossier)")
+    parseur.add_argument("--archive", help="archive zip à écrire (par défaut dans le dossier courant)")
+    parseur.add_argument("--moteur", choices=MOTEURS, default="json")
+    parseur.add_argument("--dossier", default=".", help="dossier des données (classes.json)")
+    parseur.add_argument("--debut", help="AAAA-MM-JJ")
+    parseur.add_argument("--fin", help="AAAA-MM-JJ")
+    parseur.add_argument("--format", choices=list(FORMATS), default="HTML")
+    parseur.add_argument("--processus", type=int, default=PROCESSUS)
+    options = parseur.parse_args(arguments)
+
+    if options.instantane:
+        # Lancé par Travail : une ligne "faits/total" par tâche terminée
+        generer(options.instantane, options.archive, options.format, options.processus,
+                lambda faits, total: print(f"{faits}/{total}", flush=True))
+        return 0
+
+    from .ecole import Ecole
+
+    if not (options.debut and options.fin):
+        parseur.error("--debut et --fin sont nécessaires sans --instantane")
+    ecole = Ecole(options.moteur, options.dossier)
+    archive = options.archive or f"rapports_{options.debut}_{options.fin}.zip"
+    debut = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="rapports_") as dossier:
+        chemin = os.path.join(dossier, "instantane.pickle")
+        with open(chemin, "wb") as f:
+            pickle.dump({classe["id"]: instantane(ecole.classe(classe["id"]), classe["nom"], options.debut, options.fin)
+                         for classe in ecole.classes}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        total = generer(chemin, archive, options.format, options.processus)
+    print(f"{total} rapports en {time.perf_counter() - debut:.2f} s ({options.processus} processus) : {archive}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
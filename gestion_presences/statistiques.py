@@ -0,0 +1,184 @@
+"""Moteur de statistiques vectorisé pour la page "📊 Statistiques".
+
+Les présences d'une semaine sont converties en un cadre NumPy/pandas : une
+ligne par créneau (semaine, jour, matière, heures) et deux matrices
+booléennes créneaux × élèves (présents, absents). Les trois vues (par élève,
+par matière, par professeur) sont ensuite des réductions vectorisées sur ce
+cadre, sans boucle Python sur les élèves ni les jours. Seules les semaines
+consultées sont lues, et un cadre n'est reconstruit que si sa semaine a été
+écrite (fil des changements du stockage) : le coût d'une vue par semaine ne
+dépend pas de l'historique, archivé ou non.
+
+Sans semaine, les vues cumulées (depuis le début, ou sur une plage de dates
+`plage=(debut, fin)`) sont lues dans les compteurs tenus à jour par le
+stockage : leur coût ne dépend pas de l'historique.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import agregats, calendrier
+
+# Nombre de cadres par semaine gardés en mémoire
+MAX_CADRES = 8
+
+
+def _matrice(entiers, nb_eleves):
+    """Convertit une liste de masques de bits en matrice booléenne (len(entiers) × nb_eleves)"""
+    nb_octets = max(1, (nb_eleves + 7) // 8)
+    masque = (1 << nb_eleves) - 1
+    tampon = b"".join((entier & masque).to_bytes(nb_octets, "little") for entier in entiers)
+    octets = np.frombuffer(tampon, dtype=np.uint8).reshape(len(entiers), nb_octets)
+    return np.unpackbits(octets, axis=1, bitorder="little")[:, :nb_eleves].astype(bool)
+
+
+def _taux(presents, absents):
+    """Taux de présence formaté ("93.3%") ; 0 quand rien n'est saisi"""
+    presents = np.asarray(presents, dtype=float)
+    total = presents + np.asarray(absents, dtype=float)
+    taux = np.divide(presents * 100, total, out=np.zeros_like(total), where=total > 0)
+    return pd.Series(taux).map("{:.1f}%".format).to_numpy()
+
+
+class CadrePresences:
+    """Présences d'un stockage sous forme de tableaux NumPy"""
+
+    def __init__(self, masques, eleves, heures_par_matiere):
+        self.eleves = list(eleves)
+        self.creneaux = pd.DataFrame(
+            [(semaine, jour, matiere) for semaine, jour, matiere, _, _ in masques],
+            columns=["semaine", "jour", "matiere"],
+        )
+        if isinstance(heures_par_matiere, dict):
+            heures = self.creneaux["matiere"].map(heures_par_matiere).fillna(0)
+        else:
+            heures = pd.Series(heures_par_matiere, index=self.creneaux.index)
+        self.heures = heures.to_numpy(dtype=float)
+        presents = _matrice([p for *_, p, _ in masques], len(self.eleves))
+        enregistres = _matrice([e for *_, e in masques], len(self.eleves))
+        self.presents = presents
+        self.absents = enregistres & ~presents
+
+    def selection(self, semaine=None):
+        """Masque booléen des créneaux d'une semaine (tous si None)"""
+        if semaine is None:
+            return np.ones(len(self.creneaux), dtype=bool)
+        return (self.creneaux["semaine"] == semaine).to_numpy()
+
+    def comptes_par_creneau(self, semaine=None):
+        """Nombre de présents/absents par (jour, matière), indexé par (jour, matiere)"""
+        selection = self.selection(semaine)
+        comptes = self.creneaux[selection][["jour", "matiere"]].assign(
+            presents=self.presents[selection].sum(axis=1),
+            absents=self.absents[selection].sum(axis=1),
+        )
+        return comptes.groupby(["jour", "matiere"], sort=False)[["presents", "absents"]].sum()
+
+
+class MoteurStatistiques:
+    """Calcule les vues statistiques, sur des cadres par semaine reconstruits quand leur semaine change"""
+
+    def __init__(self, stockage):
+        self.stockage = stockage
+        # {semaine: CadrePresences}, du moins au plus récemment utilisé
+        self._cadres = OrderedDict()
+        self._version = None
+        self._verrou = threading.Lock()
+
+    def cadre(self, semaine):
+        """Cadre des présences d'une semaine"""
+        with self._verrou:
+            version, changements = self.stockage.changements_depuis(self._version)
+            if changements is None:
+                self._cadres.clear()
+            else:
+                for semaine_ecrite, _ in changements:
+                    self._cadres.pop(semaine_ecrite, None)
+            self._version = version
+            if semaine in self._cadres:
+                self._cadres.move_to_end(semaine)
+            else:
+                self._cadres[semaine] = CadrePresences(self.stockage.masques_creneaux([semaine]),
+                                                       self.stockage.eleves, self.stockage.heures_par_matiere)
+                if len(self._cadres) > MAX_CADRES:
+                    self._cadres.popitem(last=False)
+            return self._cadres[semaine]
+
+    def _cumuls(self, plage):
+        """Bloc de compteurs depuis le début, ou sur la plage (debut, fin)"""
+        if plage is None:
+            return self.stockage.cumul()
+        return self.stockage.cumul_periode(*plage)
+
+    def par_eleve(self, semaine=None, plage=None):
+        """Heures de présence/absence par élève pour une semaine (cumul si None)"""
+        if semaine is None:
+            eleves = self.stockage.eleves
+            compteurs = np.array(agregats.par_eleve(self._cumuls(plage), len(eleves)),
+                                 dtype=float).reshape(-1, 4)
+            presentes = compteurs[:, agregats.HEURES_PRESENTES]
+            absentes = compteurs[:, agregats.HEURES_ABSENTES]
+        else:
+            cadre = self.cadre(semaine)
+            eleves = cadre.eleves
+            presentes = cadre.heures @ cadre.presents
+            absentes = cadre.heures @ cadre.absents
+        return pd.DataFrame({
+            "Élève": eleves,
+            "Heures présentes": presentes.astype(int),
+            "Heures absentes": absentes.astype(int),
+            "Taux de présence": _taux(presentes, absentes),
+        })
+
+    def _par_creneau_edt(self, creneaux_edt, professeur_par_matiere, semaine, plage):
+        """Comptes alignés sur l'emploi du temps (un créneau sans saisie compte 0)"""
+        edt = pd.DataFrame(creneaux_edt, columns=["jour", "matiere"])
+        if semaine is None:
+            cumuls = self._cumuls(plage)
+            compteurs = [agregats.par_creneau(cumuls, jour, matiere) for jour, matiere in creneaux_edt]
+            edt["presents"] = [compteur[agregats.SEANCES_PRESENTES] for compteur in compteurs]
+            edt["absents"] = [compteur[agregats.SEANCES_ABSENTES] for compteur in compteurs]
+        else:
+            comptes = self.cadre(semaine).comptes_par_creneau()
+            edt = edt.join(comptes, on=["jour", "matiere"]).fillna(0)
+        edt["professeur"] = edt["matiere"].map(professeur_par_matiere)
+        return edt.astype({"presents": int, "absents": int})
+
+    def par_matiere(self, creneaux_edt, professeur_par_matiere, semaine=None, plage=None):
+        edt = self._par_creneau_edt(creneaux_edt, professeur_par_matiere, semaine, plage)
+        return pd.DataFrame({
+            "Jour": edt["jour"],
+            "Matière": edt["matiere"],
+            "Professeur": edt["professeur"],
+            "Présents": edt["presents"],
+            "Absents": edt["absents"],
+            "Taux": _taux(edt["presents"], edt["absents"]),
+        })
+
+    def par_professeur(self, creneaux_edt, professeur_par_matiere, semaine=None, plage=None):
+        edt = self._par_creneau_edt(creneaux_edt, professeur_par_matiere, semaine, plage)
+        groupes = edt.groupby("professeur", sort=False)
+        profs = pd.DataFrame({
+            "Matières": groupes["matiere"].agg(lambda matieres: ", ".join(dict.fromkeys(matieres))),
+            "Séances avec présence": groupes["presents"].sum(),
+            "Séances avec absence": groupes["absents"].sum(),
+        })
+        profs["Taux présence"] = _taux(profs["Séances avec présence"], profs["Séances avec absence"])
+        return profs.rename_axis("Professeur").reset_index()
+
+    def par_semaine(self, debut, fin):
+        """Séances présentes/absentes de chaque semaine de la plage, lues dans les blocs hebdomadaires"""
+        semaines = calendrier.semaines_entre(debut, fin)
+        blocs = self.stockage.agregats_periodes(semaines)
+        totaux = np.array([agregats.total(blocs[semaine]) if semaine in blocs else [0, 0, 0, 0]
+                           for semaine in semaines], dtype=float).reshape(-1, 4)
+        presents = totaux[:, agregats.SEANCES_PRESENTES]
+        absents = totaux[:, agregats.SEANCES_ABSENTES]
+        return pd.DataFrame({
+            "Semaine": semaines,
+            "Présents": presents.astype(int),
+            "Absents": absents.astype(int),
+            "Taux de présence": _taux(presents, absents),
+        })
@@ -0,0 +1,616 @@
+"""Couche de stockage des présences.
+
+L'application ne manipule plus directement le dictionnaire imbriqué
+`presences[date][jour][matiere][eleve]` : elle passe par un objet `Stockage`
+qui répond à des requêtes ciblées. Trois moteurs sont disponibles derrière
+la même interface : JSON (snapshot + journal), binaire (snapshot en colonnes
+projeté en mémoire + journal, voir le module stockage_binaire) et SQLite.
+
+Les présences sont partitionnées par semaine ISO ("2026-W42", voir le module
+calendrier) et stockées de façon creuse : un créneau ou une semaine absents
+signifient « non saisi », rien n'est pré-alloué.
+"""
+import copy
+import itertools
+import os
+import threading
+from collections import Counter, deque
+from types import MappingProxyType
+
+from . import agregats, archives, creneaux
+from .journal import FORMAT, appliquer, ouvrir_journal
+
+# Données hors présences conservées par le stockage (mot_de_passe_hash : ancien
+# emplacement du mot de passe, désormais tenu par le registre des classes)
+PARAMETRES = ('eleves', 'mot_de_passe_hash', 'professeurs', 'emploi_du_temps', 'alertes')
+
+MOTEURS = ('json', 'sqlite', 'binaire')
+
+# Nombre d'écritures de présences gardées dans le fil des changements
+MAX_CHANGEMENTS = 1000
+
+# Versions des données, uniques dans le processus : une classe rouverte ne
+# reprend jamais une version déjà vue, qui peut servir de clé de cache
+_versions = itertools.count(1)
+
+
+def fusionner(modifications, vus, actuels, ecrites=frozenset()):
+    """Fusion à trois voies d'une saisie avec les statuts enregistrés entre-temps.
+
+    `vus` sont les statuts lus par l'utilisateur avant sa saisie, `actuels` ceux
+    enregistrés maintenant (même forme que `modifications`), `ecrites` les
+    cellules (jour, matiere, eleve) réécrites depuis la lecture, même revenues à
+    leur statut d'origine. Une cellule changée entre-temps par une autre session
+    n'est pas écrasée. Retourne les modifications à écrire et les conflits
+    [(jour, matiere, eleve, actuel, saisi)].
+    """
+    retenues = {}
+    conflits = []
+    for creneau, statuts in modifications.items():
+        for eleve, saisi in statuts.items():
+            actuel = actuels.get(creneau, {}).get(eleve, "")
+            if actuel == saisi:
+                continue
+            if actuel != vus.get(creneau, {}).get(eleve, "") or (*creneau, eleve) in ecrites:
+                conflits.append((*creneau, eleve, actuel, saisi))
+            else:
+                retenues.setdefault(creneau, {})[eleve] = saisi
+    return retenues, conflits
+
+
+class Stockage:
+    """Interface commune des moteurs de stockage.
+
+    Une seule instance par processus est partagée entre toutes les sessions :
+    les mutations passent par le verrou et augmentent `version`, les lectures
+    renvoient des vues ou des copies qu'une session ne peut pas altérer. Les
+    écritures d'une même classe restent donc sérialisées (fusion et mise à jour
+    en mémoire ; le journal est écrit hors du verrou), celles de classes
+    différentes non.
+    """
+
+    # Description de l'emplacement des données, affichée dans les paramètres
+    emplacement = ""
+
+    def __init__(self, heures_par_matiere=3):
+        self.version = 0
+        # Version des données à laquelle chaque paramètre a changé pour la dernière fois
+        self.revisions = {}
+        # Nombre d'heures d'une séance : une valeur unique ou {matiere: heures}
+        self.heures_par_matiere = heures_par_matiere
+        self._parametres = {}
+        self._verrou = threading.RLock()
+        # Fil des écritures de présences : (version précédente, version, semaine,
+        # {(jour, matiere): élèves écrits} ou None pour toute la semaine)
+        self._changements = deque(maxlen=MAX_CHANGEMENTS)
+        # Version de la dernière écriture sortie du fil
+        self._oubliee = 0
+
+    def heures(self, matiere):
+        if isinstance(self.heures_par_matiere, dict):
+            return self.heures_par_matiere.get(matiere, 0)
+        return self.heures_par_matiere
+
+    @property
+    def eleves(self):
+        return tuple(self._parametres.get('eleves', ()))
+
+    @property
+    def professeurs(self):
+        return MappingProxyType(self._parametres.get('professeurs', {}))
+
+    @property
+    def mot_de_passe_hash(self):
+        return self._parametres.get('mot_de_passe_hash', "")
+
+    @property
+    def emploi_du_temps(self):
+        """Matières de chaque jour : {jour: [{"nom", "prof", "tel"}]}"""
+        return MappingProxyType(self._parametres.get('emploi_du_temps', {}))
+
+    @property
+    def alertes(self):
+        """Seuils d'alerte d'absence enregistrés pour la classe (voir le module alertes)"""
+        return MappingProxyType(self._parametres.get('alertes', {}))
+
+    def ouvrir(self, parametres_par_defaut):
+        """Charge les données, ou initialise le stockage avec les paramètres par défaut"""
+        with self._verrou:
+            defauts = parametres_par_defaut()
+            parametres = self._charger()
+            if parametres is None:
+                parametres = defauts
+                self._initialiser(parametres)
+            self._parametres = {**defauts, **parametres}
+            self._nouvelle_version()
+            self.revisions = dict.fromkeys(self._parametres, self.version)
+        return self
+
+    def verifier_fraicheur(self):
+        """Recharge les données si elles ont été modifiées hors de ce processus"""
+        with self._verrou:
+            if self._modifie_exterieurement():
+                self._nouvelle_version()
+                for cle, valeur in (self._charger() or {}).items():
+                    if self._parametres.get(cle) != valeur:
+                        self._parametres[cle] = valeur
+                        self.revisions[cle] = self.version
+
+    def importer(self, source):
+        """Recopie les données d'un autre stockage déjà chargé"""
+        with self._verrou:
+            self._initialiser({cle: source._parametres[cle] for cle in PARAMETRES
+                               if cle in source._parametres})
+            self._parametres.update(source._parametres)
+            for semaine, jour, matiere, statuts in source.iterer_creneaux():
+                self._ecrire_presences(semaine, jour, matiere, statuts)
+
+    def ecrire_parametre(self, cle, valeur):
+        """Enregistre un paramètre (élèves, professeurs, mot de passe)"""
+        with self._verrou:
+            self._ecrire_parametre(cle, valeur)
+            self._parametres[cle] = valeur
+            self._nouvelle_version()
+            self.revisions[cle] = self.version
+
+    def renommer_eleves(self, noms):
+        """Renomme des élèves désignés par leur position : {position: nouveau nom}.
+
+        Les présences sont rangées par position, pas par nom : seuls les noms
+        changés sont écrits. Retourne les renommages effectifs ; lève
+        ValueError pour une position inconnue, un nom vide ou déjà porté.
+        """
+        with self._verrou:
+            eleves = list(self.eleves)
+            changes = {}
+            for position, nom in noms.items():
+                nom = str(nom).strip()
+                if not 0 <= position < len(eleves):
+                    raise ValueError(f"élève inconnu : n° {position + 1}")
+                if not nom:
+                    raise ValueError(f"nom vide pour l'élève n° {position + 1}")
+                if nom != eleves[position]:
+                    changes[position] = eleves[position] = nom
+            occurrences = Counter(eleves)
+            doublons = sorted({nom for nom in changes.values() if occurrences[nom] > 1})
+            if doublons:
+                raise ValueError(f"nom déjà porté par un autre élève : {', '.join(doublons)}")
+            if changes:
+                self._renommer_eleves(changes, eleves)
+                self._parametres['eleves'] = eleves
+                self._nouvelle_version()
+                self.revisions['eleves'] = self.version
+            return changes
+
+    def ecrire_presences(self, semaine, jour, matiere, statuts):
+        """Enregistre les statuts ("yes", "no" ou "") d'élèves pour un créneau"""
+        with self._verrou:
+            self._ecrire_presences(semaine, jour, matiere, statuts)
+            self._nouvelle_version(semaine, {(jour, matiere): frozenset(statuts)})
+
+    def ecrire_lot(self, semaine, modifications, vus=None, version=None):
+        """Enregistre en une seule écriture plusieurs créneaux : {(jour, matiere): {eleve: statut}}.
+
+        Avec `vus` (statuts lus avant la saisie, même forme), les cellules modifiées
+        entre-temps par une autre session sont conservées et retournées comme
+        conflits (voir `fusionner`) ; les autres modifications sont fusionnées.
+        `version` est la version des données à laquelle `vus` ont été lus : une
+        cellule écrite depuis par ce processus est en conflit même si elle a
+        retrouvé son statut ; les écritures d'un autre processus ne se voient
+        qu'à leur statut.
+        """
+        with self._verrou:
+            ecrites = frozenset()
+            if vus is not None and version is not None:
+                ecrites = self._ecrites_depuis(semaine, version, modifications)
+            retenues, conflits = self._ecrire_lot(semaine, modifications, vus, ecrites)
+            self._nouvelle_version(semaine, {creneau: frozenset(statuts) for creneau, statuts in retenues.items()})
+        return conflits
+
+    def _ecrites_depuis(self, semaine, version, modifications):
+        """Cellules de `modifications` écrites dans la semaine après `version` : {(jour, matiere, eleve)}"""
+        cellules = {(*creneau, eleve) for creneau, statuts in modifications.items() for eleve in statuts}
+        if version < self._oubliee:
+            # Le fil ne remonte plus jusqu'à `version` : toutes peuvent avoir été écrites
+            return cellules
+        ecrites = set()
+        for _, numero, semaine_ecrite, creneaux_ecrits in self._changements:
+            if numero > version and semaine_ecrite == semaine:
+                ecrites.update(cellule for cellule in cellules if creneaux_ecrits is None
+                               or cellule[2] in creneaux_ecrits.get(cellule[:2], ()))
+        return ecrites
+
+    def effacer_semaine(self, semaine):
+        with self._verrou:
+            self._effacer_semaine(semaine)
+            self._nouvelle_version(semaine)
+
+    def changements_depuis(self, version):
+        """Écritures de présences faites depuis `version` : (version courante, [(semaine, élèves)]).
+
+        Les élèves valent None quand toute la semaine a changé. La liste vaut
+        None quand le fil ne suffit pas à décrire les changements (paramètre
+        modifié, rechargement, fil dépassé) : tout est alors à relire.
+        """
+        with self._verrou:
+            if version is None:
+                return self.version, None
+            changements = []
+            attendue = version
+            for precedente, numero, semaine, creneaux_ecrits in self._changements:
+                if numero <= version:
+                    continue
+                if precedente != attendue:
+                    return self.version, None
+                changements.append((semaine, None if creneaux_ecrits is None
+                                    else frozenset().union(*creneaux_ecrits.values())))
+                attendue = numero
+            if attendue != self.version:
+                return self.version, None
+            return self.version, changements
+
+    def _nouvelle_version(self, semaine=None, creneaux_ecrits=None):
+        """Change la version des données ; une écriture de présences (semaine) entre dans le fil"""
+        precedente = self.version
+        self.version = next(_versions)
+        if semaine is not None:
+            if len(self._changements) == self._changements.maxlen:
+                self._oubliee = self._changements[0][1]
+            self._changements.append((precedente, self.version, semaine, creneaux_ecrits))
+
+    def statut(self, semaine, jour, matiere, eleve):
+        """Statut d'un élève pour un créneau ("" si non renseigné)"""
+        return self.statuts_creneau(semaine, jour, matiere).get(eleve, "")
+
+    def verifier_agregats(self):
+        """Compare les compteurs cumulés à un recalcul complet ; retourne les écarts"""
+        with self._verrou:
+            attendus = agregats.reconstruire(self.masques_creneaux(), self.heures)
+            return agregats.differences(attendus, self.agregats())
+
+    def reconstruire_agregats(self):
+        """Recalcule les compteurs cumulés depuis les présences et les enregistre"""
+        with self._verrou:
+            self._remplacer_agregats(agregats.reconstruire(self.masques_creneaux(), self.heures))
+            self._nouvelle_version()
+
+    def cumul_periode(self, debut, fin):
+        """Compteurs cumulés des semaines de `debut` à `fin`, lus dans les blocs par semaine et par mois"""
+        return agregats.fusionner(self.agregats_periodes(agregats.plan_periode(debut, fin)).values())
+
+    # Méthodes à fournir par chaque moteur
+
+    def _charger(self):
+        """Retourne les paramètres enregistrés (dict), ou None si le stockage est vide"""
+        raise NotImplementedError
+
+    def _modifie_exterieurement(self):
+        raise NotImplementedError
+
+    def _initialiser(self, parametres):
+        raise NotImplementedError
+
+    def _ecrire_parametre(self, cle, valeur):
+        raise NotImplementedError
+
+    def _renommer_eleves(self, noms, eleves):
+        """Écrit les seuls noms changés ({position: nom}) ; `eleves` est la liste complète renommée"""
+        self._ecrire_parametre('eleves', eleves)
+
+    def _ecrire_presences(self, semaine, jour, matiere, statuts):
+        raise NotImplementedError
+
+    def _ecrire_lot(self, semaine, modifications, vus=None, ecrites=frozenset()):
+        """Écrit le lot ; retourne les modifications retenues et les conflits"""
+        conflits = []
+        if vus is not None:
+            modifications, conflits = fusionner(modifications, vus, self.statuts_semaine(semaine), ecrites)
+        for (jour, matiere), statuts in modifications.items():
+            self._ecrire_presences(semaine, jour, matiere, statuts)
+        return modifications, conflits
+
+    def _effacer_semaine(self, semaine):
+        raise NotImplementedError
+
+    def _remplacer_agregats(self, valeur):
+        raise NotImplementedError
+
+    def agregats(self):
+        """Copie des compteurs cumulés (voir le module agregats)"""
+        raise NotImplementedError
+
+    def cumul(self):
+        """Copie du seul bloc des compteurs depuis le début ({"eleves", "creneaux"}), sans les périodes"""
+        tout = self.agregats()
+        return {"eleves": tout["eleves"], "creneaux": tout["creneaux"]}
+
+    def agregats_periodes(self, cles):
+        """Copie des blocs de compteurs des périodes demandées : {clé: bloc}"""
+        raise NotImplementedError
+
+    def semaine_existe(self, semaine):
+        raise NotImplementedError
+
+    def semaines(self):
+        """Semaines ayant des présences enregistrées, dans l'ordre chronologique"""
+        raise NotImplementedError
+
+    def statuts_creneau(self, semaine, jour, matiere):
+        """Statuts renseignés pour un créneau : {eleve: statut}"""
+        raise NotImplementedError
+
+    def statuts_eleve(self, semaine, eleve):
+        """Statuts renseignés d'un élève sur la semaine : {(jour, matiere): statut}"""
+        raise NotImplementedError
+
+    def statuts_semaine(self, semaine):
+        """Statuts renseignés de toute la semaine : {(jour, matiere): {eleve: statut}}"""
+        raise NotImplementedError
+
+    def iterer_creneaux(self):
+        """Itère sur les créneaux renseignés : (semaine, jour, matiere, {eleve: statut})"""
+        raise NotImplementedError
+
+    def masques_creneaux(self, semaines=None):
+        """Liste des créneaux sous forme de masques : (semaine, jour, matiere, presents, enregistres),
+        de toutes les semaines ou des seules `semaines` demandées"""
+        raise NotImplementedError
+
+    def comptes_par_eleve(self, semaine):
+        """Nombre de séances présentes/absentes par élève : {eleve: (presents, absents)}"""
+        raise NotImplementedError
+
+    def comptes_par_creneau(self, semaine):
+        """Nombre d'élèves présents/absents par créneau : {(jour, matiere): (presents, absents)}"""
+        raise NotImplementedError
+
+    def sauvegarder(self):
+        """Force l'écriture complète des données sur disque"""
+
+    def ecritures_en_attente(self):
+        """Nombre de modifications acceptées mais pas encore écrites sur disque"""
+        return 0
+
+    def fichiers(self):
+        """Fichiers où sont conservées les données"""
+        return []
+
+    def taille(self):
+        """Taille des données sur disque, en octets"""
+        return sum(os.path.getsize(chemin) for chemin in self.fichiers() if os.path.exists(chemin))
+
+
+class StockageJSON(Stockage):
+    """Moteur historique : presences_data.json + journal des modifications.
+
+    Les mois révolus sont archivés dans presences_data.json.archives/ (voir le module archives).
+    """
+
+    def __init__(self, chemin='presences_data.json', heures_par_matiere=3):
+        super().__init__(heures_par_matiere)
+        self.journal = ouvrir_journal(chemin, lire=archives.lire, ecrire=archives.ecrire)
+        self.emplacement = f"{chemin} (+ journal {self.journal.chemin_journal})"
+        self.donnees = {'presences': {}}
+
+    def _charger(self):
+        donnees = self.journal.charger()
+        if donnees is None:
+            return None
+        donnees.setdefault('presences', {})
+        self.donnees = donnees
+        if self.journal.format_lu < FORMAT or 'semaines' not in donnees.get('agregats', {}):
+            # Données d'un format antérieur : compteurs recalculés et snapshot réécrit une fois
+            donnees['agregats'] = agregats.reconstruire(self.masques_creneaux(), self.heures)
+            self.journal.ecrire_snapshot(donnees)
+        return {cle: donnees[cle] for cle in PARAMETRES if cle in donnees}
+
+    def _modifie_exterieurement(self):
+        return self.journal.modifie_exterieurement()
+
+    def _initialiser(self, parametres):
+        self.donnees = dict(parametres, presences={}, agregats=agregats.nouveaux(), format=FORMAT)
+        self.journal.ecrire_snapshot(self.donnees)
+
+    def _executer(self, enregistrement):
+        appliquer(self.donnees, enregistrement)
+        self.journal.ajouter(enregistrement)
+
+    def _ecrire_parametre(self, cle, valeur):
+        self._executer({"op": "meta", "cle": cle, "valeur": valeur})
+
+    def _renommer_eleves(self, noms, eleves):
+        self._executer({"op": "eleves", "noms": {str(position): nom for position, nom in noms.items()}})
+
+    def _positions(self):
+        return {nom: i for i, nom in enumerate(self.eleves)}
+
+    def _enregistrement_creneau(self, semaine, jour, matiere, statuts, positions):
+        masque, presents, enregistres = creneaux.masques({
+            positions[eleve]: statut for eleve, statut in statuts.items() if eleve in positions
+        })
+        return {"op": "creneau", "semaine": semaine, "jour": jour, "matiere": matiere,
+                "masque": masque, "presents": presents, "enregistres": enregistres,
+                "heures": self.heures(matiere)}
+
+    def _ecrire_presences(self, semaine, jour, matiere, statuts):
+        self._executer(self._enregistrement_creneau(semaine, jour, matiere, statuts, self._positions()))
+
+    def _ecrire_lot(self, semaine, modifications, vus=None, ecrites=frozenset()):
+        conflits = []
+        if vus is not None:
+            # Sous le verrou du stockage : aucune écriture ne peut s'intercaler
+            modifications, conflits = fusionner(modifications, vus, self.statuts_semaine(semaine), ecrites)
+        if modifications:
+            # Une seule ligne de journal pour tout le lot
+            positions = self._positions()
+            self._executer({"op": "lot", "enregistrements": [
+                self._enregistrement_creneau(semaine, jour, matiere, statuts, positions)
+                for (jour, matiere), statuts in modifications.items()
+            ]})
+        return modifications, conflits
+
+    def _effacer_semaine(self, semaine):
+        matieres = {matiere for jour in self.donnees['presences'].get(semaine, {}).values() for matiere in jour}
+        self._executer({"op": "effacer_semaine", "semaine": semaine,
+                        "heures": {matiere: self.heures(matiere) for matiere in matieres}})
+
+    def _remplacer_agregats(self, valeur):
+        self._executer({"op": "meta", "cle": "agregats", "valeur": valeur})
+
+    def agregats(self):
+        with self._verrou:
+            return copy.deepcopy(self.donnees['agregats'])
+
+    def cumul(self):
+        with self._verrou:
+            return copy.deepcopy({cle: self.donnees['agregats'][cle] for cle in ("eleves", "creneaux")})
+
+    def agregats_periodes(self, cles):
+        with self._verrou:
+            return copy.deepcopy(agregats.blocs_periodes(self.donnees['agregats'], cles))
+
+    def semaine_existe(self, semaine):
+        return semaine in self.donnees['presences']
+
+    def semaines(self):
+        with self._verrou:
+            return sorted(self.donnees['presences'])
+
+    def _creneau(self, semaine, jour, matiere):
+        return self.donnees['presences'].get(semaine, {}).get(jour, {}).get(matiere, creneaux.VIDE)
+
+    def statut(self, semaine, jour, matiere, eleve):
+        position = self._positions().get(eleve)
+        if position is None:
+            return ""
+        with self._verrou:
+            return creneaux.statut(self._creneau(semaine, jour, matiere), position)
+
+    def statuts_creneau(self, semaine, jour, matiere):
+        with self._verrou:
+            creneau = tuple(self._creneau(semaine, jour, matiere))
+        return {
+            eleve: creneaux.statut(creneau, i)
+            for i, eleve in enumerate(self.eleves)
+            if creneau[1] >> i & 1
+        }
+
+    def statuts_eleve(self, semaine, eleve):
+        position = self._positions().get(eleve)
+        if position is None:
+            return {}
+        statuts = {}
+        with self._verrou:
+            for jour, matieres in self.donnees['presences'].get(semaine, {}).items():
+                for matiere, creneau in matieres.items():
+                    statut = creneaux.statut(creneau, position)
+                    if statut:
+                        statuts[(jour, matiere)] = statut
+        return statuts
+
+    def statuts_semaine(self, semaine):
+        eleves = self.eleves
+        with self._verrou:
+            creneaux_semaine = [
+                (jour, matiere, tuple(creneau))
+                for jour, matieres in self.donnees['presences'].get(semaine, {}).items()
+                for matiere, creneau in matieres.items()
+            ]
+        return {
+            (jour, matiere): {
+                eleve: creneaux.statut(creneau, i) for i, eleve in enumerate(eleves) if creneau[1] >> i & 1
+            }
+            for jour, matiere, creneau in creneaux_semaine
+        }
+
+    def iterer_creneaux(self):
+        with self._verrou:
+            semaines = [
+                (semaine, jour, matiere, tuple(creneau))
+                for semaine, jours in self.donnees['presences'].items()
+                for jour, matieres in jours.items()
+                for matiere, creneau in matieres.items()
+            ]
+        eleves = self.eleves
+        for semaine, jour, matiere, creneau in semaines:
+            if creneau[1]:
+                yield semaine, jour, matiere, {
+                    eleve: creneaux.statut(creneau, i)
+                    for i, eleve in enumerate(eleves) if creneau[1] >> i & 1
+                }
+
+    def masques_creneaux(self, semaines=None):
+        with self._verrou:
+            presences = self.donnees['presences']
+            if semaines is None:
+                semaines = list(presences)
+            return [
+                (semaine, jour, matiere, presents, enregistres)
+                for semaine in semaines if semaine in presences
+                for jour, matieres in presences[semaine].items()
+                for matiere, (presents, enregistres) in matieres.items()
+            ]
+
+    def comptes_par_eleve(self, semaine):
+        eleves = self.eleves
+        nb = len(eleves)
+        masque = creneaux.masque_effectif(nb)
+        # Masques des créneaux mis bout à bout (un pas de `nb` bits par créneau) :
+        # les bits d'un élève sont comptés d'un seul bit_count à travers un peigne
+        presents = enregistres = peigne = 0
+        with self._verrou:
+            for matieres in self.donnees['presences'].get(semaine, {}).values():
+                for bits_presents, bits_enregistres in matieres.values():
+                    presents = presents << nb | bits_presents & masque
+                    enregistres = enregistres << nb | bits_enregistres & masque
+                    peigne = peigne << nb | 1
+        absents = enregistres & ~presents
+        return {
+            eleve: ((presents >> i & peigne).bit_count(), (absents >> i & peigne).bit_count())
+            for i, eleve in enumerate(eleves)
+        }
+
+    def comptes_par_creneau(self, semaine):
+        masque = creneaux.masque_effectif(len(self.eleves))
+        with self._verrou:
+            return {
+                (jour, matiere): creneaux.compter(creneau, masque)
+                for jour, matieres in self.donnees['presences'].get(semaine, {}).items()
+                for matiere, creneau in matieres.items()
+            }
+
+    def sauvegarder(self):
+        self.journal.compacter()
+
+    def ecritures_en_attente(self):
+        return self.journal.en_attente()
+
+    def fichiers(self):
+        dossier = self.journal.chemin_snapshot + ".archives"
+        segments = sorted(os.path.join(dossier, nom) for nom in os.listdir(dossier)) if os.path.isdir(dossier) else []
+        return [self.journal.chemin_snapshot, self.journal.chemin_compaction, self.journal.chemin_journal] + segments
+
+
+def ouvrir_stockage(moteur='json', chemin=None, heures_par_matiere=3):
+    """Ouvre le stockage demandé ("json", "sqlite" ou "binaire")"""
+    if moteur == 'json':
+        return StockageJSON(chemin or 'presences_data.json', heures_par_matiere)
+    if moteur == 'sqlite':
+        from .stockage_sqlite import StockageSQLite
+        chemin = chemin or 'presences_data.sqlite3'
+        stockage = StockageSQLite(chemin, heures_par_matiere)
+        chemin_json = os.path.splitext(chemin)[0] + '.json'
+        if stockage._charger() is None and os.path.exists(chemin_json):
+            # Première ouverture : reprise des données du moteur JSON
+            stockage.importer(StockageJSON(chemin_json, heures_par_matiere).ouvrir(dict))
+        return stockage
+    if moteur == 'binaire':
+        from .stockage_binaire import StockageBinaire, convertir
+        chemin = chemin or 'presences_data.bin'
+        stockage = StockageBinaire(chemin, heures_par_matiere)
+        chemin_json = os.path.splitext(chemin)[0] + '.json'
+        if not stockage.journal.existe() and os.path.exists(chemin_json):
+            # Première ouverture : conversion des données du moteur JSON
+            convertir(chemin_json, chemin, heures_par_matiere)
+        return stockage
+    raise ValueError(f"Moteur de stockage inconnu : {moteur} (attendu : {', '.join(MOTEURS)})")
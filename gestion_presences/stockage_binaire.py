@@ -0,0 +1,347 @@
+"""Moteur binaire : snapshot en colonnes projeté en mémoire + journal des modifications.
+
+Le snapshot JSON se relit en entier et produit un objet Python par créneau ;
+le snapshot binaire est projeté en mémoire (mmap) et une semaine de présences
+ou un bloc de compteurs n'est décodé que lorsqu'il est lu ou modifié. Les
+écritures passent par le même journal que le moteur JSON (module journal),
+seul le format du snapshot change. Disposition du fichier (entiers
+little-endian) :
+
+    en-tête      "PRSB", version, nombre de sections, largeur L des masques (octets),
+                 puis (position, taille) de chaque section
+    chaines      table des chaînes (élèves, semaines, jours, matières) : nombre, positions, UTF-8
+    meta         paramètres (hors élèves), format et compteurs cumulés depuis le début, en JSON
+    eleves       identifiants de chaîne des élèves, dans l'ordre des positions
+    semaines     par semaine : (chaîne, premier créneau, nombre de créneaux)
+    creneaux     par créneau : (chaîne du jour, chaîne de la matière)
+    presents     par créneau, masque de L octets : bit i = élève en position i présent
+    enregistres  par créneau, masque de L octets : bit i = statut de l'élève i saisi
+    blocs        par semaine ou mois de compteurs : (chaîne de la période, position, taille)
+    json_blocs   blocs de compteurs par période (module agregats), en JSON, bout à bout
+
+Les colonnes sont de largeur fixe et rangées par semaine : lire une semaine
+ne touche que les pages de ses créneaux. Le fichier remplacé par une compaction
+reste lisible par les projections déjà ouvertes (sémantique POSIX).
+
+    python -m gestion_presences.stockage_binaire presences_data.json presences_data.bin
+"""
+import argparse
+import copy
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import MutableMapping
+
+from . import agregats
+from .journal import ouvrir_journal
+from .stockage import Stockage, StockageJSON
+
+MAGIQUE = b"PRSB"
+
+# Version de la disposition du fichier (indépendante du format des données, journal.FORMAT)
+VERSION_BINAIRE = 1
+
+SECTIONS = ("chaines", "meta", "eleves", "semaines", "creneaux", "presents", "enregistres",
+            "blocs", "json_blocs")
+
+EN_TETE = struct.Struct("<4sHHI")
+SECTION = struct.Struct("<QQ")
+SEMAINE = struct.Struct("<III")
+CRENEAU = struct.Struct("<II")
+BLOC = struct.Struct("<III")
+
+
+def _largeur(masque):
+    """Nombre d'octets nécessaires pour un masque"""
+    return (masque.bit_length() + 7) // 8
+
+
+class SnapshotBinaire:
+    """Lecture d'un snapshot binaire projeté en mémoire"""
+
+    def __init__(self, carte):
+        self.carte = carte
+        magique, version, nb_sections, self.largeur = EN_TETE.unpack_from(carte)
+        if magique != MAGIQUE or version > VERSION_BINAIRE:
+            raise ValueError(f"Snapshot binaire illisible (version {version})")
+        self.sections = dict(zip(SECTIONS, (SECTION.unpack_from(carte, EN_TETE.size + SECTION.size * i)
+                                            for i in range(nb_sections))))
+        debut, _ = self.sections["chaines"]
+        (nb_chaines,) = struct.unpack_from("<I", carte, debut)
+        positions = struct.unpack_from(f"<{nb_chaines + 1}I", carte, debut + 4)
+        texte = debut + 4 + 4 * (nb_chaines + 1)
+        self.chaines = [carte[texte + a:texte + b].decode("utf-8") for a, b in zip(positions, positions[1:])]
+        self.meta = json.loads(self._section("meta"))
+        eleves = self._section("eleves")
+        self.eleves = [self.chaines[i] for i in struct.unpack(f"<{len(eleves) // 4}I", eleves)]
+        # {semaine: (premier créneau, nombre de créneaux)}
+        self.index = {self.chaines[chaine]: (premier, nb)
+                      for chaine, premier, nb in SEMAINE.iter_unpack(self._section("semaines"))}
+        # {famille: {période: (position, taille)}}
+        self.blocs = {famille: {} for famille in agregats.FAMILLES}
+        for chaine, position, taille in BLOC.iter_unpack(self._section("blocs")):
+            periode = self.chaines[chaine]
+            self.blocs[agregats.famille(periode)][periode] = (position, taille)
+
+    def _section(self, nom):
+        debut, taille = self.sections[nom]
+        return self.carte[debut:debut + taille]
+
+    def _colonne(self, nom, premier, nb):
+        position = self.sections[nom][0] + self.largeur * premier
+        return self.carte[position:position + self.largeur * nb]
+
+    def brut(self, semaine):
+        """Créneaux [(jour, matiere)] d'une semaine et octets de ses deux colonnes de masques"""
+        premier, nb = self.index[semaine]
+        debut = self.sections["creneaux"][0] + CRENEAU.size * premier
+        creneaux = [(self.chaines[jour], self.chaines[matiere])
+                    for jour, matiere in CRENEAU.iter_unpack(self.carte[debut:debut + CRENEAU.size * nb])]
+        return creneaux, self._colonne("presents", premier, nb), self._colonne("enregistres", premier, nb)
+
+    def semaine(self, semaine):
+        """Décode une semaine : {jour: {matiere: [presents, enregistres]}}"""
+        creneaux, presents, enregistres = self.brut(semaine)
+        largeur = self.largeur
+        jours = {}
+        for i, (jour, matiere) in enumerate(creneaux):
+            jours.setdefault(jour, {})[matiere] = [
+                int.from_bytes(presents[i * largeur:(i + 1) * largeur], "little"),
+                int.from_bytes(enregistres[i * largeur:(i + 1) * largeur], "little"),
+            ]
+        return jours
+
+    def bloc_brut(self, famille, periode):
+        """Octets JSON du bloc de compteurs d'une période"""
+        position, taille = self.blocs[famille][periode]
+        debut = self.sections["json_blocs"][0] + position
+        return self.carte[debut:debut + taille]
+
+
+class _Projection(MutableMapping):
+    """Dictionnaire dont les valeurs sont décodées à la demande depuis le snapshot.
+
+    Une valeur lue ou modifiée est décodée une fois et gardée en mémoire ; les
+    autres restent dans la projection et sont recopiées telles quelles.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self._decodees = {}
+        self._retirees = set()
+
+    def _cles(self):
+        """Clés présentes dans le snapshot"""
+        raise NotImplementedError
+
+    def _decoder(self, cle):
+        raise NotImplementedError
+
+    def __getitem__(self, cle):
+        if cle not in self._decodees:
+            if cle in self._retirees or cle not in self._cles():
+                raise KeyError(cle)
+            self._decodees[cle] = self._decoder(cle)
+        return self._decodees[cle]
+
+    def __setitem__(self, cle, valeur):
+        self._decodees[cle] = valeur
+        self._retirees.discard(cle)
+
+    def __delitem__(self, cle):
+        if cle not in self:
+            raise KeyError(cle)
+        self._decodees.pop(cle, None)
+        self._retirees.add(cle)
+
+    def __contains__(self, cle):
+        return cle in self._decodees or (cle in self._cles() and cle not in self._retirees)
+
+    def __iter__(self):
+        yield from list(self._decodees)
+        for cle in self._cles():
+            if cle not in self._decodees and cle not in self._retirees:
+                yield cle
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __deepcopy__(self, memo):
+        return {cle: copy.deepcopy(valeur, memo) for cle, valeur in self.items()}
+
+    def intacte(self, cle):
+        """Vrai si la valeur n'a été ni décodée ni retirée : ses octets peuvent être recopiés"""
+        return cle not in self._decodees and cle not in self._retirees and cle in self._cles()
+
+
+class PresencesBinaires(_Projection):
+    """Présences {semaine: {jour: {matiere: [presents, enregistres]}}} lues à la demande"""
+
+    def _cles(self):
+        return self.snapshot.index
+
+    def _decoder(self, semaine):
+        return self.snapshot.semaine(semaine)
+
+    def masques(self):
+        """(semaine, jour, matiere, presents, enregistres) de tous les créneaux, sans garder les semaines décodées"""
+        for semaine in self:
+            jours = self._decodees[semaine] if semaine in self._decodees else self.snapshot.semaine(semaine)
+            for jour, matieres in jours.items():
+                for matiere, (presents, enregistres) in matieres.items():
+                    yield semaine, jour, matiere, presents, enregistres
+
+
+class BlocsBinaires(_Projection):
+    """Blocs de compteurs d'une famille de périodes ("semaines" ou "mois") lus à la demande"""
+
+    def __init__(self, snapshot, famille):
+        super().__init__(snapshot)
+        self.famille = famille
+
+    def _cles(self):
+        return self.snapshot.blocs[self.famille]
+
+    def _decoder(self, periode):
+        return json.loads(self.snapshot.bloc_brut(self.famille, periode))
+
+
+def lire_binaire(chemin):
+    """Données d'un snapshot binaire, projetées en mémoire (None si le fichier n'existe pas)"""
+    try:
+        with open(chemin, "rb") as f:
+            carte = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    snapshot = SnapshotBinaire(carte)
+    donnees = dict(snapshot.meta, eleves=snapshot.eleves, presences=PresencesBinaires(snapshot))
+    if "agregats" in donnees:
+        donnees["agregats"] = dict(donnees["agregats"], **{
+            famille: BlocsBinaires(snapshot, famille) for famille in agregats.FAMILLES})
+    return donnees
+
+
+def ecrire_binaire(chemin, donnees):
+    """Écrit les données dans un fichier binaire temporaire, à renommer ensuite sur `chemin`"""
+    chaines = {}
+
+    def chaine(texte):
+        return chaines.setdefault(texte, len(chaines))
+
+    eleves = [chaine(eleve) for eleve in donnees.get("eleves", [])]
+    presences = donnees.get("presences", {})
+    binaires = isinstance(presences, PresencesBinaires)
+    # Les semaines intactes sont recopiées octet par octet : la largeur ne peut que croître
+    largeur = max([1, presences.snapshot.largeur if binaires else 1] + [
+        _largeur(enregistres) for semaine in presences if not (binaires and presences.intacte(semaine))
+        for matieres in presences[semaine].values() for _, enregistres in matieres.values()
+    ])
+    semaines, creneaux = bytearray(), bytearray()
+    colonnes = {"presents": bytearray(), "enregistres": bytearray()}
+    nb_creneaux = 0
+    for semaine in sorted(presences):
+        premier = nb_creneaux
+        if binaires and presences.intacte(semaine):
+            creneaux_semaine, *octets = presences.snapshot.brut(semaine)
+            ancienne = presences.snapshot.largeur
+            for i, (jour, matiere) in enumerate(creneaux_semaine):
+                creneaux += CRENEAU.pack(chaine(jour), chaine(matiere))
+                for nom, source in zip(colonnes, octets):
+                    colonnes[nom] += source[i * ancienne:(i + 1) * ancienne].ljust(largeur, b"\0")
+            nb_creneaux += len(creneaux_semaine)
+        else:
+            for jour, matieres in presences[semaine].items():
+                for matiere, (presents, enregistres) in matieres.items():
+                    creneaux += CRENEAU.pack(chaine(jour), chaine(matiere))
+                    colonnes["presents"] += (presents & enregistres).to_bytes(largeur, "little")
+                    colonnes["enregistres"] += enregistres.to_bytes(largeur, "little")
+                    nb_creneaux += 1
+        semaines += SEMAINE.pack(chaine(semaine), premier, nb_creneaux - premier)
+
+    # Compteurs : le cumul depuis le début va dans meta, chaque période dans son propre bloc
+    meta = {cle: valeur for cle, valeur in donnees.items() if cle not in ("eleves", "presences")}
+    blocs, json_blocs = bytearray(), bytearray()
+    if "agregats" in meta:
+        compteurs = meta["agregats"]
+        meta["agregats"] = {cle: valeur for cle, valeur in compteurs.items() if cle not in agregats.FAMILLES}
+        for famille in agregats.FAMILLES:
+            periodes = compteurs.get(famille, {})
+            for periode in sorted(periodes):
+                if isinstance(periodes, BlocsBinaires) and periodes.intacte(periode):
+                    octets = periodes.snapshot.bloc_brut(famille, periode)
+                else:
+                    octets = json.dumps(periodes[periode], separators=(",", ":")).encode("utf-8")
+                blocs += BLOC.pack(chaine(periode), len(json_blocs), len(octets))
+                json_blocs += octets
+
+    textes = [texte.encode("utf-8") for texte in chaines]
+    positions = [0]
+    for texte in textes:
+        positions.append(positions[-1] + len(texte))
+    contenus = {
+        "chaines": struct.pack(f"<I{len(positions)}I", len(textes), *positions) + b"".join(textes),
+        "meta": json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        "eleves": struct.pack(f"<{len(eleves)}I", *eleves),
+        "semaines": semaines,
+        "creneaux": creneaux,
+        **colonnes,
+        "blocs": blocs,
+        "json_blocs": json_blocs,
+    }
+    position = EN_TETE.size + SECTION.size * len(SECTIONS)
+    table = []
+    for nom in SECTIONS:
+        table.append(SECTION.pack(position, len(contenus[nom])))
+        position += len(contenus[nom])
+
+    temporaire = chemin + ".tmp"
+    with open(temporaire, "wb") as f:
+        f.write(EN_TETE.pack(MAGIQUE, VERSION_BINAIRE, len(SECTIONS), largeur))
+        f.write(b"".join(table))
+        for nom in SECTIONS:
+            f.write(contenus[nom])
+        f.flush()
+        os.fsync(f.fileno())
+    return temporaire
+
+
+def convertir(source, cible, heures_par_matiere=3):
+    """Convertit en une fois des données JSON (snapshot + journal) en snapshot binaire"""
+    json_source = StockageJSON(source, heures_par_matiere)
+    if json_source._charger() is None:
+        raise FileNotFoundError(source)
+    os.replace(ecrire_binaire(cible, json_source.donnees), cible)
+
+
+class StockageBinaire(StockageJSON):
+    """Snapshot binaire projeté en mémoire + journal des modifications (voir le module)"""
+
+    def __init__(self, chemin='presences_data.bin', heures_par_matiere=3):
+        Stockage.__init__(self, heures_par_matiere)
+        self.journal = ouvrir_journal(chemin, lire=lire_binaire, ecrire=ecrire_binaire)
+        self.emplacement = f"{chemin} (+ journal {self.journal.chemin_journal})"
+        self.donnees = {'presences': {}}
+
+    def masques_creneaux(self, semaines=None):
+        presences = self.donnees['presences']
+        if semaines is not None or not isinstance(presences, PresencesBinaires):
+            return super().masques_creneaux(semaines)
+        with self._verrou:
+            return list(presences.masques())
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(description=convertir.__doc__)
+    parseur.add_argument("source", help="snapshot JSON (son journal est rejoué)")
+    parseur.add_argument("cible", help="snapshot binaire à écrire")
+    parseur.add_argument("--heures", type=int, default=3, help="heures par séance, pour les compteurs")
+    options = parseur.parse_args(arguments)
+    convertir(options.source, options.cible, options.heures)
+    print(f"{options.source} -> {options.cible} ({os.path.getsize(options.cible)} octets)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+"""Moteur de stockage SQLite : une table de présences normalisée et indexée.
+
+Seules les présences renseignées ("yes"/"no") ont une ligne ; une cellule
+absente de la table vaut "". Les élèves sont identifiés par leur position
+dans la liste, ce qui permet de les renommer sans perdre leurs présences.
+"""
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+from . import agregats, calendrier, creneaux
+from .stockage import Stockage, fusionner
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parametres (
+    cle TEXT PRIMARY KEY,
+    valeur TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS eleves (
+    id INTEGER PRIMARY KEY,
+    nom TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS professeurs (
+    matiere TEXT PRIMARY KEY,
+    nom TEXT NOT NULL,
+    telephone TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS semaines (
+    semaine TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS presences (
+    semaine TEXT NOT NULL,
+    jour TEXT NOT NULL,
+    matiere TEXT NOT NULL,
+    eleve INTEGER NOT NULL REFERENCES eleves(id),
+    statut TEXT NOT NULL CHECK (statut IN ('yes', 'no')),
+    PRIMARY KEY (semaine, jour, matiere, eleve)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS presences_par_eleve ON presences (eleve, semaine);
+CREATE TABLE IF NOT EXISTS compteurs_eleves (
+    eleve INTEGER PRIMARY KEY,
+    seances_presentes INTEGER NOT NULL,
+    seances_absentes INTEGER NOT NULL,
+    heures_presentes REAL NOT NULL,
+    heures_absentes REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compteurs_creneaux (
+    jour TEXT NOT NULL,
+    matiere TEXT NOT NULL,
+    seances_presentes INTEGER NOT NULL,
+    seances_absentes INTEGER NOT NULL,
+    heures_presentes REAL NOT NULL,
+    heures_absentes REAL NOT NULL,
+    PRIMARY KEY (jour, matiere)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cumuls_eleves (
+    periode TEXT NOT NULL,
+    eleve INTEGER NOT NULL,
+    seances_presentes INTEGER NOT NULL,
+    seances_absentes INTEGER NOT NULL,
+    heures_presentes REAL NOT NULL,
+    heures_absentes REAL NOT NULL,
+    PRIMARY KEY (periode, eleve)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cumuls_creneaux (
+    periode TEXT NOT NULL,
+    jour TEXT NOT NULL,
+    matiere TEXT NOT NULL,
+    seances_presentes INTEGER NOT NULL,
+    seances_absentes INTEGER NOT NULL,
+    heures_presentes REAL NOT NULL,
+    heures_absentes REAL NOT NULL,
+    PRIMARY KEY (periode, jour, matiere)
+) WITHOUT ROWID;
+"""
+
+# Ajout d'un delta aux compteurs, dans la même transaction que l'écriture des présences
+CUMUL = ("ON CONFLICT ({}) DO UPDATE SET "
+         "seances_presentes = seances_presentes + excluded.seances_presentes, "
+         "seances_absentes = seances_absentes + excluded.seances_absentes, "
+         "heures_presentes = heures_presentes + excluded.heures_presentes, "
+         "heures_absentes = heures_absentes + excluded.heures_absentes")
+
+
+class StockageSQLite(Stockage):
+    """Présences dans une base SQLite embarquée"""
+
+    def __init__(self, chemin='presences_data.sqlite3', heures_par_matiere=3):
+        super().__init__(heures_par_matiere)
+        self.emplacement = chemin
+        # La connexion est partagée entre les sessions et les threads de Streamlit
+        self._connexion = sqlite3.connect(chemin, check_same_thread=False)
+        with self._verrou, self._connexion as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.executescript(SCHEMA)
+            self._migrer(c)
+        self._ids = {}
+        self._data_version = None
+
+    @staticmethod
+    def _migrer(c):
+        """Met à jour une base créée par une version antérieure de l'application"""
+        if 'date' in {colonne[1] for colonne in c.execute("PRAGMA table_info(presences)")}:
+            # Présences par date calendaire -> par semaine ISO ; les jours d'une même
+            # semaine sont fusionnés dans l'ordre, le plus récent l'emportant
+            fusion = {
+                (calendrier.semaine_iso(date), jour, matiere, eleve): statut
+                for date, jour, matiere, eleve, statut in c.execute(
+                    "SELECT date, jour, matiere, eleve, statut FROM presences ORDER BY date")
+            }
+            c.execute("ALTER TABLE presences RENAME COLUMN date TO semaine")
+            c.execute("ALTER TABLE semaines RENAME COLUMN date TO semaine")
+            c.execute("DELETE FROM presences")
+            c.execute("DELETE FROM semaines")
+            c.executemany("INSERT INTO presences (semaine, jour, matiere, eleve, statut) VALUES (?, ?, ?, ?, ?)",
+                          [(*cle, statut) for cle, statut in fusion.items()])
+            c.executemany("INSERT INTO semaines (semaine) VALUES (?)",
+                          [(semaine,) for semaine in sorted({cle[0] for cle in fusion})])
+            # Les compteurs ne correspondent plus aux créneaux fusionnés : recalculés au chargement
+            for table in ("compteurs_eleves", "compteurs_creneaux", "cumuls_eleves", "cumuls_creneaux"):
+                c.execute(f"DELETE FROM {table}")
+
+    def fichiers(self):
+        return [self.emplacement, self.emplacement + "-wal"]
+
+    def _requete(self, sql, parametres=()):
+        with self._verrou:
+            return self._connexion.execute(sql, parametres).fetchall()
+
+    def _charger_ids(self):
+        self._ids = {nom: id_ for id_, nom in self._requete("SELECT id, nom FROM eleves")}
+
+    def _noms(self):
+        return {id_: nom for nom, id_ in self._ids.items()}
+
+    def _charger(self):
+        self._data_version = self._requete("PRAGMA data_version")[0][0]
+        if not self._requete("SELECT 1 FROM parametres UNION ALL SELECT 1 FROM eleves LIMIT 1"):
+            return None
+        self._charger_ids()
+        if (not self._requete("SELECT 1 FROM cumuls_creneaux LIMIT 1")
+                and self._requete("SELECT 1 FROM presences LIMIT 1")):
+            # Base antérieure aux compteurs cumulés par période : on les calcule une fois
+            self._remplacer_agregats(agregats.reconstruire(self.masques_creneaux(), self.heures))
+        return {
+            **{cle: json.loads(valeur) for cle, valeur in self._requete("SELECT cle, valeur FROM parametres")},
+            'eleves': [nom for (nom,) in self._requete("SELECT nom FROM eleves ORDER BY id")],
+            'professeurs': {
+                matiere: {"nom": nom, "telephone": telephone}
+                for matiere, nom, telephone in self._requete(
+                    "SELECT matiere, nom, telephone FROM professeurs")
+            },
+        }
+
+    def _modifie_exterieurement(self):
+        # data_version ne change que pour les écritures d'autres connexions
+        return self._requete("PRAGMA data_version")[0][0] != self._data_version
+
+    def _initialiser(self, parametres):
+        for cle, valeur in parametres.items():
+            self._ecrire_parametre(cle, valeur)
+
+    def _ecrire_parametre(self, cle, valeur):
+        with self._verrou, self._connexion as c:
+            if cle == 'eleves':
+                c.execute("DELETE FROM eleves WHERE id >= ?", (len(valeur),))
+                c.executemany("INSERT OR REPLACE INTO eleves (id, nom) VALUES (?, ?)",
+                              enumerate(valeur))
+            elif cle == 'professeurs':
+                c.execute("DELETE FROM professeurs")
+                c.executemany("INSERT INTO professeurs (matiere, nom, telephone) VALUES (?, ?, ?)",
+                              [(matiere, info["nom"], info["telephone"])
+                               for matiere, info in valeur.items()])
+            else:
+                c.execute("INSERT OR REPLACE INTO parametres (cle, valeur) VALUES (?, ?)",
+                          (cle, json.dumps(valeur)))
+            if cle == 'eleves':
+                self._charger_ids()
+
+    def _renommer_eleves(self, noms, eleves):
+        with self._verrou, self._connexion as c:
+            c.executemany("UPDATE eleves SET nom = ? WHERE id = ?",
+                          [(nom, position) for position, nom in noms.items()])
+            for position in noms:
+                if self._ids.get(self.eleves[position]) == position:
+                    del self._ids[self.eleves[position]]
+            self._ids.update({nom: position for position, nom in noms.items()})
+
+    def semaine_existe(self, semaine):
+        return bool(self._requete("SELECT 1 FROM semaines WHERE semaine = ?", (semaine,)))
+
+    def semaines(self):
+        return [semaine for (semaine,) in self._requete("SELECT semaine FROM semaines ORDER BY semaine")]
+
+    def _effacer_semaine(self, semaine):
+        delta = agregats.nouveaux()
+        with self._verrou, self._connexion as c:
+            for _, jour, matiere, presents, enregistres in self._masques("WHERE semaine = ?", (semaine,)):
+                agregats.appliquer_delta(delta, semaine, jour, matiere, self.heures(matiere),
+                                         (presents, enregistres), creneaux.VIDE)
+            self._cumuler(c, delta)
+            c.execute("DELETE FROM presences WHERE semaine = ?", (semaine,))
+            c.execute("DELETE FROM semaines WHERE semaine = ?", (semaine,))
+
+    def _cumuler(self, c, delta):
+        """Ajoute un delta de compteurs (structure du module agregats) aux tables de compteurs"""
+        c.executemany("INSERT INTO compteurs_eleves VALUES (?, ?, ?, ?, ?) " + CUMUL.format("eleve"),
+                      [(eleve, *compteur) for eleve, compteur in enumerate(delta["eleves"]) if any(compteur)])
+        c.executemany("INSERT INTO compteurs_creneaux VALUES (?, ?, ?, ?, ?, ?) " + CUMUL.format("jour, matiere"),
+                      [(jour, matiere, *compteur) for jour, matieres in delta["creneaux"].items()
+                       for matiere, compteur in matieres.items()])
+        blocs = [(periode, bloc) for famille in agregats.FAMILLES
+                 for periode, bloc in delta.get(famille, {}).items()]
+        c.executemany("INSERT INTO cumuls_eleves VALUES (?, ?, ?, ?, ?, ?) " + CUMUL.format("periode, eleve"),
+                      [(periode, eleve, *compteur) for periode, bloc in blocs
+                       for eleve, compteur in enumerate(bloc["eleves"]) if any(compteur)])
+        c.executemany("INSERT INTO cumuls_creneaux VALUES (?, ?, ?, ?, ?, ?, ?) "
+                      + CUMUL.format("periode, jour, matiere"),
+                      [(periode, jour, matiere, *compteur) for periode, bloc in blocs
+                       for jour, matieres in bloc["creneaux"].items()
+                       for matiere, compteur in matieres.items()])
+
+    def _remplacer_agregats(self, valeur):
+        with self._verrou, self._connexion as c:
+            for table in ("compteurs_eleves", "compteurs_creneaux", "cumuls_eleves", "cumuls_creneaux"):
+                c.execute(f"DELETE FROM {table}")
+            self._cumuler(c, valeur)
+
+    @staticmethod
+    def _remplir(bloc, lignes_eleves, lignes_creneaux):
+        for eleve, *compteur in lignes_eleves:
+            while len(bloc["eleves"]) < eleve:
+                bloc["eleves"].append([0, 0, 0, 0])
+            bloc["eleves"].append(compteur)
+        for jour, matiere, *compteur in lignes_creneaux:
+            bloc["creneaux"].setdefault(jour, {})[matiere] = compteur
+        return bloc
+
+    def agregats(self):
+        resultat = self._remplir(agregats.nouveaux(),
+                                 self._requete("SELECT * FROM compteurs_eleves ORDER BY eleve"),
+                                 self._requete("SELECT * FROM compteurs_creneaux"))
+        for periode, bloc in self._blocs("").items():
+            resultat[agregats.famille(periode)][periode] = bloc
+        return resultat
+
+    def cumul(self):
+        return self._remplir({"eleves": [], "creneaux": {}},
+                             self._requete("SELECT * FROM compteurs_eleves ORDER BY eleve"),
+                             self._requete("SELECT * FROM compteurs_creneaux"))
+
+    def agregats_periodes(self, cles):
+        if not cles:
+            return {}
+        return self._blocs(f"WHERE periode IN ({', '.join('?' * len(cles))})", list(cles))
+
+    def _blocs(self, filtre, parametres=()):
+        """Blocs de compteurs par période lus dans les tables cumuls_* : {periode: bloc}"""
+        lignes = {}
+        for table, indice in (("cumuls_eleves", 0), ("cumuls_creneaux", 1)):
+            for periode, *ligne in self._requete(f"SELECT * FROM {table} {filtre} ORDER BY 1, 2",
+                                                 parametres):
+                lignes.setdefault(periode, ([], []))[indice].append(ligne)
+        return {periode: self._remplir({"eleves": [], "creneaux": {}}, *lignes_periode)
+                for periode, lignes_periode in lignes.items()}
+
+    def _ecrire_presences(self, semaine, jour, matiere, statuts):
+        self._ecrire_lot(semaine, {(jour, matiere): statuts})
+
+    def _ecrire_lot(self, semaine, modifications, vus=None, ecrites=frozenset()):
+        # Tous les créneaux du lot et leurs compteurs dans une seule transaction
+        renseignes = []
+        effaces = []
+        conflits = []
+        delta = agregats.nouveaux()
+        with self._verrou, self._connexion as c:
+            # Transaction ouverte en écriture dès la lecture : un autre processus ne
+            # peut pas modifier la semaine entre la lecture des masques et l'écriture
+            c.execute("BEGIN IMMEDIATE")
+            avant_semaine = {(jour, matiere): (presents, enregistres) for _, jour, matiere, presents, enregistres
+                             in self._masques("WHERE semaine = ?", (semaine,))}
+            if vus is not None:
+                noms = self._noms()
+                actuels = {creneau: {noms[id_]: creneaux.statut(masques, id_) for id_ in noms}
+                           for creneau, masques in avant_semaine.items()}
+                modifications, conflits = fusionner(modifications, vus, actuels, ecrites)
+                if not modifications:
+                    return modifications, conflits
+            for (jour, matiere), statuts in modifications.items():
+                positions = {}
+                for eleve, statut in statuts.items():
+                    if eleve not in self._ids:
+                        continue
+                    positions[self._ids[eleve]] = statut
+                    if statut in ("yes", "no"):
+                        renseignes.append((semaine, jour, matiere, self._ids[eleve], statut))
+                    else:
+                        effaces.append((semaine, jour, matiere, self._ids[eleve]))
+                avant = avant_semaine.get((jour, matiere), creneaux.VIDE)
+                apres = creneaux.appliquer_masques(list(avant), *creneaux.masques(positions))
+                agregats.appliquer_delta(delta, semaine, jour, matiere, self.heures(matiere), avant, apres)
+            self._cumuler(c, delta)
+            c.execute("INSERT OR IGNORE INTO semaines (semaine) VALUES (?)", (semaine,))
+            c.executemany("INSERT OR REPLACE INTO presences (semaine, jour, matiere, eleve, statut) "
+                          "VALUES (?, ?, ?, ?, ?)", renseignes)
+            c.executemany("DELETE FROM presences WHERE semaine = ? AND jour = ? AND matiere = ? "
+                          "AND eleve = ?", effaces)
+            if effaces:
+                c.execute("DELETE FROM semaines WHERE semaine = ? AND NOT EXISTS "
+                          "(SELECT 1 FROM presences WHERE semaine = ?)", (semaine, semaine))
+        return modifications, conflits
+
+    def statut(self, semaine, jour, matiere, eleve):
+        if eleve not in self._ids:
+            return ""
+        lignes = self._requete(
+            "SELECT statut FROM presences WHERE semaine = ? AND jour = ? AND matiere = ? AND eleve = ?",
+            (semaine, jour, matiere, self._ids[eleve]))
+        return lignes[0][0] if lignes else ""
+
+    def statuts_creneau(self, semaine, jour, matiere):
+        noms = self._noms()
+        return {
+            noms[eleve]: statut
+            for eleve, statut in self._requete(
+                "SELECT eleve, statut FROM presences WHERE semaine = ? AND jour = ? AND matiere = ?",
+                (semaine, jour, matiere))
+            if eleve in noms
+        }
+
+    def statuts_eleve(self, semaine, eleve):
+        if eleve not in self._ids:
+            return {}
+        return {
+            (jour, matiere): statut
+            for jour, matiere, statut in self._requete(
+                "SELECT jour, matiere, statut FROM presences WHERE eleve = ? AND semaine = ?",
+                (self._ids[eleve], semaine))
+        }
+
+    def statuts_semaine(self, semaine):
+        noms = self._noms()
+        statuts = {}
+        for jour, matiere, eleve, statut in self._requete(
+                "SELECT jour, matiere, eleve, statut FROM presences WHERE semaine = ?", (semaine,)):
+            if eleve in noms:
+                statuts.setdefault((jour, matiere), {})[noms[eleve]] = statut
+        return statuts
+
+    def _lecture(self):
+        """Connexion en lecture seule pour les longs parcours : elle lit un instantané
+        (mode WAL) sans bloquer la connexion partagée ni les écritures"""
+        return sqlite3.connect(Path(os.path.abspath(self.emplacement)).as_uri() + "?mode=ro",
+                               uri=True, check_same_thread=False)
+
+    def iterer_creneaux(self):
+        # Les lignes sont lues au fil de l'eau, jamais toutes chargées en mémoire
+        noms = self._noms()
+        creneau, statuts = None, {}
+        connexion = self._lecture()
+        try:
+            for semaine, jour, matiere, eleve, statut in connexion.execute(
+                    "SELECT semaine, jour, matiere, eleve, statut FROM presences "
+                    "ORDER BY semaine, jour, matiere"):
+                if (semaine, jour, matiere) != creneau:
+                    if statuts:
+                        yield (*creneau, statuts)
+                    creneau, statuts = (semaine, jour, matiere), {}
+                if eleve in noms:
+                    statuts[noms[eleve]] = statut
+            if statuts:
+                yield (*creneau, statuts)
+        finally:
+            connexion.close()
+
+    def masques_creneaux(self, semaines=None):
+        if semaines is None:
+            return self._masques()
+        semaines = list(semaines)
+        if not semaines:
+            return []
+        return self._masques(f"WHERE semaine IN ({', '.join('?' * len(semaines))})", semaines)
+
+    def _masques(self, filtre="", parametres=()):
+        # Les masques sont calculés par SQLite, par blocs de 62 élèves pour tenir
+        # dans un entier 64 bits, puis recollés ici
+        masques = {}
+        for semaine, jour, matiere, bloc, presents, enregistres in self._requete(
+                "SELECT semaine, jour, matiere, eleve / 62 AS bloc, "
+                "SUM(CASE WHEN statut = 'yes' THEN 1 << (eleve % 62) ELSE 0 END), "
+                "SUM(1 << (eleve % 62)) "
+                f"FROM presences {filtre} GROUP BY semaine, jour, matiere, bloc", parametres):
+            masque = masques.setdefault((semaine, jour, matiere), [0, 0])
+            masque[0] |= presents << (62 * bloc)
+            masque[1] |= enregistres << (62 * bloc)
+        return [(*creneau, presents, enregistres)
+                for creneau, (presents, enregistres) in masques.items()]
+
+    def comptes_par_eleve(self, semaine):
+        noms = self._noms()
+        return {
+            noms[eleve]: (presents, absents)
+            for eleve, presents, absents in self._requete(
+                "SELECT eleve, SUM(statut = 'yes'), SUM(statut = 'no') FROM presences "
+                "WHERE semaine = ? GROUP BY eleve", (semaine,))
+            if eleve in noms
+        }
+
+    def comptes_par_creneau(self, semaine):
+        return {
+            (jour, matiere): (presents, absents)
+            for jour, matiere, presents, absents in self._requete(
+                "SELECT jour, matiere, SUM(statut = 'yes'), SUM(statut = 'no') FROM presences "
+                "WHERE semaine = ? GROUP BY jour, matiere", (semaine,))
+        }
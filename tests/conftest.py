@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gestion_presences import journal  # noqa: E402
+from gestion_presences.ecole import Ecole  # noqa: E402
+from gestion_presences.stockage import MOTEURS  # noqa: E402
+
+
+@pytest.fixture(params=MOTEURS)
+def moteur(request):
+    return request.param
+
+
+@pytest.fixture
+def ouvrir(tmp_path):
+    """Ouvre l'établissement du dossier de test, après écriture des journaux en attente"""
+    def ouvrir(moteur):
+        journal.vider_tous()
+        return Ecole(moteur, str(tmp_path))
+    yield ouvrir
+    journal.vider_tous()
+
+
+@pytest.fixture
+def stockage(moteur, ouvrir):
+    ecole = ouvrir(moteur)
+    return ecole.classe(ecole.classes[0]["id"]).stockage
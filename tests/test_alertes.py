@@ -0,0 +1,51 @@
+import random
+from datetime import date, timedelta
+
+from gestion_presences import calendrier
+from gestion_presences.alertes import ABSENCES_CONSECUTIVES, HEURES_ABSENTES, MoteurAlertes
+
+AUJOURD_HUI = date(2026, 10, 14)
+
+
+def test_alertes(stockage):
+    stockage.ecrire_parametre("alertes", {"heures": 5, "semaines": 4, "consecutives": 2})
+    semaine = calendrier.semaine_iso(AUJOURD_HUI)
+    precedente = calendrier.semaine_iso(AUJOURD_HUI - timedelta(weeks=1))
+    stockage.ecrire_presences(precedente, "Lundi", "Mathématiques", {"Élève 1": "no"})
+    stockage.ecrire_presences(semaine, "Lundi", "Mathématiques", {"Élève 1": "no", "Élève 2": "no"})
+    alertes = MoteurAlertes(stockage).actives(AUJOURD_HUI)
+    assert [(alerte.eleve, alerte.regle) for alerte in alertes] == [
+        ("Élève 1", HEURES_ABSENTES), ("Élève 1", ABSENCES_CONSECUTIVES)]
+    # Une présence interrompt la série
+    stockage.ecrire_presences(semaine, "Mardi", "Mathématiques", {"Élève 1": "yes"})
+    assert [alerte.regle for alerte in MoteurAlertes(stockage).actives(AUJOURD_HUI)] == [HEURES_ABSENTES]
+
+
+def test_alertes_incrementales_egales_a_un_recalcul(stockage):
+    hasard = random.Random(1)
+    moteur = MoteurAlertes(stockage)
+    creneaux = [(jour, matiere["nom"]) for jour, matieres in stockage.emploi_du_temps.items() for matiere in matieres]
+    semaines = calendrier.semaines_entre(AUJOURD_HUI - timedelta(weeks=7), AUJOURD_HUI)
+    for i in range(200):
+        semaine = hasard.choice(semaines)
+        tirage = hasard.random()
+        if tirage < 0.6:
+            modifications = {}
+            for _ in range(hasard.randint(1, 3)):
+                modifications.setdefault(hasard.choice(creneaux), {})[hasard.choice(stockage.eleves)] = \
+                    hasard.choice(["yes", "no", "no", ""])
+            stockage.ecrire_lot(semaine, modifications)
+        elif tirage < 0.9:
+            stockage.ecrire_presences(semaine, *hasard.choice(creneaux), {
+                eleve: hasard.choice(["yes", "no", "no"]) for eleve in hasard.sample(stockage.eleves, 5)})
+        elif tirage < 0.95:
+            stockage.effacer_semaine(semaine)
+        else:
+            stockage.ecrire_parametre("alertes", {"heures": hasard.choice([3, 6, 9]), "semaines": hasard.choice([2, 4]),
+                                                  "consecutives": hasard.choice([2, 3])})
+        if i % 5 == 0:
+            assert moteur.actives(AUJOURD_HUI) == MoteurAlertes(stockage).actives(AUJOURD_HUI)
+    assert moteur.actives(AUJOURD_HUI)
+    # Fenêtre qui glisse
+    plus_tard = AUJOURD_HUI + timedelta(weeks=2)
+    assert moteur.actives(plus_tard) == MoteurAlertes(stockage).actives(plus_tard)
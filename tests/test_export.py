@@ -0,0 +1,41 @@
+import csv
+import gc
+import os
+
+import pytest
+
+from gestion_presences import export
+
+
+def test_dates_selon_le_jour_de_la_semaine(ouvrir):
+    ecole = ouvrir("json")
+    # Classe sans lundi : ses créneaux du mardi restent datés du mardi
+    identifiant = ecole.creer_classe("Sans lundi", 3, {
+        "Mardi": [{"nom": "EPS", "prof": "M. Robert", "tel": ""}],
+        "Jeudi": [{"nom": "Dessin", "prof": "M. Michel", "tel": ""}],
+    })
+    stockage = ecole.classe(identifiant).stockage
+    stockage.ecrire_presences("2026-W42", "Mardi", "EPS", {"Élève 1": "yes"})
+    stockage.ecrire_presences("2026-W42", "Jeudi", "Dessin", {"Élève 2": "no"})
+
+    fichier = export.exporter([("Sans lundi", stockage)], "CSV")
+    with open(fichier.chemin, encoding="utf-8-sig", newline="") as f:
+        lignes = list(csv.DictReader(f))
+    assert [(ligne["jour"], ligne["date"], ligne["professeur"]) for ligne in lignes] == [
+        ("Mardi", "2026-10-13", "M. Robert"), ("Jeudi", "2026-10-15", "M. Michel")]
+
+    # Le fichier disparaît avec le dernier objet qui le référence
+    chemin = fichier.chemin
+    del fichier
+    gc.collect()
+    assert not os.path.exists(chemin)
+
+
+def test_jour_inconnu_refuse(stockage, tmp_path, monkeypatch):
+    stockage.ecrire_presences("2026-W42", "Jour férié", "EPS", {"Élève 1": "yes"})
+    temporaire = tmp_path / "export"
+    temporaire.mkdir()
+    monkeypatch.setattr(export.tempfile, "tempdir", str(temporaire))
+    with pytest.raises(ValueError, match="jour inconnu : Jour férié"):
+        export.exporter([("Classe 1", stockage)], "CSV")
+    assert os.listdir(temporaire) == []
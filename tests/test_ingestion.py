@@ -0,0 +1,92 @@
+import http.client
+import json
+import subprocess
+import sys
+
+from gestion_presences import ingestion
+
+RACINE = __file__.rsplit("/tests/", 1)[0]
+
+# Modification du registre et des élèves par un autre processus (l'application, par exemple)
+AUTRE_PROCESSUS = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from gestion_presences import journal
+from gestion_presences.ecole import Ecole
+ecole = Ecole(sys.argv[2], sys.argv[3])
+ecole.classe("classe-1").stockage.renommer_eleves({0: "Ana", 1: "Élève 1"})
+ecole.renommer_classe("classe-1", "2nde A")
+journal.vider_tous()
+"""
+
+
+def envoyer(serveur, evenements):
+    connexion = http.client.HTTPConnection("127.0.0.1", serveur.port)
+    connexion.request("POST", "/presences", json.dumps(evenements))
+    reponse = connexion.getresponse()
+    resultat = reponse.status, json.loads(reponse.read())
+    connexion.close()
+    return resultat
+
+
+def evenement(eleve, classe="", jour="Lundi", matiere="Mathématiques", date="2026-10-12"):
+    return {"date": date, "jour": jour, "matiere": matiere, "eleve": eleve, "statut": "no", "classe": classe}
+
+
+def test_validation(moteur, ouvrir):
+    serveur = ingestion.demarrer(ouvrir(moteur), "127.0.0.1", 0)
+    statut, reponse = envoyer(serveur, [
+        evenement("Élève 1"), evenement("Élève 1", jour="Dimanche"), evenement("Inconnu"),
+        evenement("Élève 1", classe="Classe 9"), evenement("Élève 1", date="2026-13-45"), 3,
+        evenement("Élève 1", date="2026-10-13")])
+    assert statut == 200
+    assert reponse["acceptes"] == 1
+    assert [rejet["index"] for rejet in reponse["rejets"]] == [1, 2, 3, 4, 5, 6]
+    assert reponse["rejets"][-1]["erreur"] == "le 2026-10-13 n'est pas un Lundi"
+
+
+def test_donnees_modifiees_par_un_autre_processus(moteur, ouvrir, tmp_path):
+    ecole = ouvrir(moteur)
+    serveur = ingestion.demarrer(ecole, "127.0.0.1", 0)
+    assert envoyer(serveur, [evenement("Élève 1")])[1]["acceptes"] == 1
+
+    subprocess.run([sys.executable, "-c", AUTRE_PROCESSUS, RACINE, moteur, str(tmp_path)], check=True)
+    statut, reponse = envoyer(serveur, [evenement("Ana", classe="2nde A", matiere="Français"),
+                                        evenement("Élève 1", classe="2nde A", matiere="Français")])
+    assert (statut, reponse["rejets"]) == (200, [])
+    stockage = ecole.classe("classe-1").stockage
+    # Écrits à la position actuelle de chaque nom
+    assert stockage.statuts_semaine("2026-W42") == {
+        ("Lundi", "Mathématiques"): {"Ana": "no"},
+        ("Lundi", "Français"): {"Ana": "no", "Élève 1": "no"},
+    }
+
+
+def test_echec_d_un_groupe(ouvrir, monkeypatch):
+    ecole = ouvrir("json")
+    ecole.creer_classe("2nde B")
+    serveur = ingestion.demarrer(ecole, "127.0.0.1", 0)
+    serveur.delai = 0.3
+    stockage_b = ecole.classe("classe-2").stockage
+    ecrire_lot = type(stockage_b).ecrire_lot
+
+    def ecrire_lot_defaillant(stockage, semaine, modifications, vus=None):
+        if stockage is stockage_b:
+            raise OSError("disque plein")
+        return ecrire_lot(stockage, semaine, modifications, vus)
+    monkeypatch.setattr(type(stockage_b), "ecrire_lot", ecrire_lot_defaillant)
+
+    # Deux requêtes regroupées dans le même lot : seule celle qui touche la classe 2 échoue
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(2) as groupe:
+        premiere = groupe.submit(envoyer, serveur, [evenement("Élève 1")])
+        seconde = groupe.submit(envoyer, serveur, [evenement("Élève 2"), evenement("Élève 2", classe="2nde B")])
+        premiere, seconde = premiere.result(), seconde.result()
+    assert premiere == (200, {"acceptes": 1, "rejets": []})
+    statut, reponse = seconde
+    assert statut == 500
+    assert reponse["acceptes"] == 1
+    assert reponse["echecs"] == [{"classe": "classe-2", "semaine": "2026-W42", "erreur": "disque plein"}]
+    assert ecole.classe("classe-1").stockage.statuts_creneau("2026-W42", "Lundi", "Mathématiques") == {
+        "Élève 1": "no", "Élève 2": "no"}
+    assert serveur.evenements_ecrits == 2
@@ -0,0 +1,39 @@
+import os
+import zipfile
+from datetime import date, timedelta
+
+from gestion_presences import calendrier, rapports
+
+FIN = date.today()
+DEBUT = FIN - timedelta(weeks=3)
+
+
+def test_rapports(ouvrir):
+    ecole = ouvrir("json")
+    classe = ecole.classe("classe-1")
+    for semaine in calendrier.semaines_entre(DEBUT, FIN):
+        classe.stockage.ecrire_lot(semaine, {("Lundi", "Mathématiques"): {"Élève 1": "no", "Élève 2": "yes"},
+                                             ("Mardi", "EPS"): {"Élève 1": "yes"}})
+    travail = rapports.Travail({"classe-1": rapports.instantane(classe, "Classe 1", DEBUT, FIN)}, "CSV")
+    travail.executer(processus=2)
+    assert travail.erreur is None
+    assert travail.faits == travail.total == 32
+    with zipfile.ZipFile(travail.archive) as archive:
+        assert len(archive.namelist()) == 32
+    chemin = travail.archive
+    del travail
+    assert not os.path.exists(chemin)
+
+    donnees = rapports.instantane(classe, "Classe 1", DEBUT, FIN)
+    par_eleve = classe.statistiques().par_eleve(plage=(DEBUT, FIN))
+    assert [sum(presentes for presentes, _ in rapports.heures_eleve(donnees, i).values()) for i in range(31)] == \
+        par_eleve["Heures présentes"].tolist()
+
+
+def test_erreur_du_processus(ouvrir):
+    classe = ouvrir("json").classe("classe-1")
+    travail = rapports.Travail({"classe-1": rapports.instantane(classe, "Classe 1", DEBUT, FIN)}, "PDF")
+    travail.executer(processus=1)
+    assert travail.termine and travail.archive is None
+    assert not travail.supprimer.alive
+    assert "invalid choice: 'PDF'" in str(travail.erreur)
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from gestion_presences import calendrier
+from gestion_presences.archives import Archives
+from gestion_presences.statistiques import MoteurStatistiques
+
+RECENTE = calendrier.semaine_iso(date.today())
+
+
+def test_semaine_recente_sans_lire_les_archives(ouvrir, monkeypatch):
+    ecole = ouvrir("json")
+    stockage = ecole.classe("classe-1").stockage
+    # Deux ans d'historique, archivés à la sauvegarde
+    for semaine in calendrier.semaines_entre(date.today() - timedelta(weeks=110), date.today() - timedelta(weeks=20)):
+        stockage.ecrire_presences(semaine, "Lundi", "Mathématiques", {"Élève 1": "no", "Élève 2": "yes"})
+    stockage.ecrire_presences(RECENTE, "Lundi", "Mathématiques", {"Élève 1": "yes"})
+    stockage.sauvegarder()
+    stockage = ouvrir("json").classe("classe-1").stockage
+
+    lus = []
+    segment = Archives.segment
+    monkeypatch.setattr(Archives, "segment", lambda self, mois: lus.append(mois) or segment(self, mois))
+    moteur = MoteurStatistiques(stockage)
+    assert moteur.par_eleve(RECENTE)["Heures présentes"][0] == 3
+    stockage.ecrire_presences(RECENTE, "Mardi", "Mathématiques", {"Élève 1": "no"})
+    par_eleve = moteur.par_eleve(RECENTE)
+    assert par_eleve.iloc[0].tolist()[:3] == ["Élève 1", 3, 3]
+    par_matiere = moteur.par_matiere([("Lundi", "Mathématiques"), ("Mardi", "Mathématiques")], {}, RECENTE)
+    assert par_matiere["Présents"].tolist() == [1, 0]
+    assert lus == []
+
+
+def test_cadre_garde_les_semaines_non_modifiees(stockage):
+    precedente = calendrier.semaine_iso(date.today() - timedelta(weeks=1))
+    stockage.ecrire_presences(precedente, "Lundi", "EPS", {"Élève 1": "no"})
+    moteur = MoteurStatistiques(stockage)
+    cadre = moteur.cadre(precedente)
+    stockage.ecrire_presences(RECENTE, "Lundi", "EPS", {"Élève 1": "yes"})
+    assert moteur.cadre(precedente) is cadre
+    stockage.ecrire_presences(precedente, "Lundi", "EPS", {"Élève 2": "no"})
+    assert moteur.cadre(precedente) is not cadre
+    assert moteur.par_eleve(precedente)["Heures absentes"].tolist()[:3] == [3, 3, 0]
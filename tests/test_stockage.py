@@ -0,0 +1,182 @@
+import json
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from gestion_presences import calendrier, journal
+from gestion_presences.ecole import hacher_mot_de_passe
+from gestion_presences.stockage import fusionner
+
+ANCIENNE = "2024-W10"
+RECENTE = calendrier.semaine_iso(date.today())
+
+
+def rouvrir(ouvrir, moteur):
+    ecole = ouvrir(moteur)
+    return ecole.classe(ecole.classes[0]["id"]).stockage
+
+
+def test_aller_retour(moteur, ouvrir, stockage, tmp_path):
+    saisie = {("Lundi", "Mathématiques"): {"Élève 1": "yes", "Élève 2": "no"},
+              ("Mardi", "EPS"): {"Élève 31": "no"}}
+    stockage.ecrire_lot(RECENTE, saisie)
+    stockage.ecrire_lot(ANCIENNE, saisie)
+    stockage.sauvegarder()
+
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.statuts_semaine(RECENTE) == saisie
+    assert relu.statuts_semaine(ANCIENNE) == saisie
+    assert relu.semaines() == [ANCIENNE, RECENTE]
+    assert relu.verifier_agregats() == []
+    if moteur == "json":
+        assert os.listdir(tmp_path / "presences_data.json.archives") == ["2024-03.json.gz"]
+
+    # Modification d'une semaine archivée, relue après sauvegarde
+    relu.ecrire_presences(ANCIENNE, "Lundi", "Mathématiques", {"Élève 1": "no", "Élève 2": ""})
+    relu.sauvegarder()
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.statuts_semaine(ANCIENNE) == {("Lundi", "Mathématiques"): {"Élève 1": "no"},
+                                             ("Mardi", "EPS"): {"Élève 31": "no"}}
+    assert relu.statuts_semaine(RECENTE) == saisie
+    assert relu.verifier_agregats() == []
+
+    relu.effacer_semaine(ANCIENNE)
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.semaines() == [RECENTE]
+    assert relu.verifier_agregats() == []
+
+
+def test_journal_rejoue_sans_sauvegarde(moteur, ouvrir, stockage):
+    for i in range(1, 6):
+        stockage.ecrire_presences(RECENTE, "Lundi", "Français", {f"Élève {i}": "no"})
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.statuts_creneau(RECENTE, "Lundi", "Français") == {f"Élève {i}": "no" for i in range(1, 6)}
+    assert relu.verifier_agregats() == []
+
+
+def test_journal_tronque_apres_arret_brutal(moteur, ouvrir, stockage):
+    if moteur == "sqlite":
+        pytest.skip("pas de journal")
+    stockage.ecrire_presences(RECENTE, "Lundi", "Français", {"Élève 1": "no"})
+    journal.vider_tous()
+    # Arrêt pendant l'écriture d'une ligne
+    with open(stockage.journal.chemin_journal, "a", encoding="utf-8") as f:
+        f.write('{"op": "presences", "semaine"')
+
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.statuts_creneau(RECENTE, "Lundi", "Français") == {"Élève 1": "no"}
+    relu.ecrire_presences(RECENTE, "Lundi", "Français", {"Élève 2": "yes"})
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.statuts_creneau(RECENTE, "Lundi", "Français") == {"Élève 1": "no", "Élève 2": "yes"}
+
+
+def test_migration_du_format_initial(moteur, ouvrir, tmp_path):
+    """presences_data.json de la première version : une entrée par date, statuts par nom"""
+    with open(tmp_path / "presences_data.json", "w") as f:
+        json.dump({
+            "eleves": ["Ana", "Bruno", "Chloé"],
+            "presences": {
+                "2026-10-12": {"Lundi": {"Mathématiques": {"Ana": "yes", "Bruno": "no", "Chloé": ""}}},
+                "2026-10-13": {"Lundi": {"Mathématiques": {"Ana": "no", "Bruno": "", "Chloé": ""}}},
+                "2026-10-14": {"Mercredi": {"Technologie": {"Ana": "", "Bruno": "", "Chloé": "yes"}}},
+            },
+            "mot_de_passe_hash": hacher_mot_de_passe("secret"),
+            "professeurs": {"Mathématiques": {"nom": "M. Dupont", "telephone": "01 23 45 67 89"}},
+        }, f, indent=4)
+
+    ecole = ouvrir(moteur)
+    assert ecole.classes == [{"id": "classe-1", "nom": "Classe 1", "fichier": "presences_data"}]
+    assert ecole.verifier_mot_de_passe("secret")
+    stockage = ecole.classe("classe-1").stockage
+    assert stockage.eleves == ("Ana", "Bruno", "Chloé")
+    assert stockage.professeurs["Mathématiques"]["nom"] == "M. Dupont"
+    # Les jours d'une même semaine sont fusionnés, le plus récent l'emportant
+    assert stockage.statuts_semaine("2026-W42") == {
+        ("Lundi", "Mathématiques"): {"Ana": "no", "Bruno": "no"},
+        ("Mercredi", "Technologie"): {"Chloé": "yes"},
+    }
+    assert stockage.verifier_agregats() == []
+
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.statuts_semaine("2026-W42") == stockage.statuts_semaine("2026-W42")
+
+
+def test_renommer_eleves(moteur, ouvrir, stockage):
+    stockage.ecrire_presences(RECENTE, "Lundi", "Mathématiques", {"Élève 1": "no", "Élève 2": "yes"})
+    version = stockage.version
+
+    # Échange de deux noms : les présences restent à leur position
+    assert stockage.renommer_eleves({0: "Élève 2", 1: " Élève 1 ", 2: "Élève 3"}) == {0: "Élève 2", 1: "Élève 1"}
+    assert stockage.version != version
+    assert stockage.statuts_creneau(RECENTE, "Lundi", "Mathématiques") == {"Élève 2": "no", "Élève 1": "yes"}
+    stockage.ecrire_presences(RECENTE, "Lundi", "Mathématiques", {"Élève 2": "yes"})
+    assert stockage.statut(RECENTE, "Lundi", "Mathématiques", "Élève 2") == "yes"
+
+    eleves = stockage.eleves
+    for renommage, message in (({31: "Zoé"}, "inconnu"), ({3: "  "}, "vide"), ({3: "Élève 5"}, "déjà porté"),
+                               ({3: "Zoé", 4: "Zoé"}, "déjà porté")):
+        with pytest.raises(ValueError, match=message):
+            stockage.renommer_eleves(renommage)
+    assert stockage.eleves == eleves
+    assert stockage.renommer_eleves({3: "Élève 4"}) == {}
+
+    stockage.renommer_eleves({30: "Zoé"})
+    relu = rouvrir(ouvrir, moteur)
+    assert relu.eleves == ("Élève 2", "Élève 1") + eleves[2:30] + ("Zoé",)
+    assert relu.statuts_creneau(RECENTE, "Lundi", "Mathématiques") == {"Élève 2": "yes", "Élève 1": "yes"}
+
+
+def test_fusionner():
+    vus = {("Lundi", "EPS"): {"A": "yes", "B": "no"}}
+    actuels = {("Lundi", "EPS"): {"A": "no", "B": "no", "C": "yes"}}
+    modifications = {("Lundi", "EPS"): {"A": "", "B": "yes", "C": "yes"}, ("Mardi", "EPS"): {"A": "no"}}
+    retenues, conflits = fusionner(modifications, vus, actuels)
+    # A changé entre-temps : conflit ; C vaut déjà la saisie : rien à écrire
+    assert conflits == [("Lundi", "EPS", "A", "no", "")]
+    assert retenues == {("Lundi", "EPS"): {"B": "yes"}, ("Mardi", "EPS"): {"A": "no"}}
+
+
+def test_ecrire_lot_garde_les_cellules_modifiees_entre_temps(stockage):
+    creneau = ("Lundi", "Français")
+    stockage.ecrire_lot(RECENTE, {creneau: {"Élève 1": "yes"}})
+    vus = stockage.statuts_semaine(RECENTE)
+    stockage.ecrire_lot(RECENTE, {creneau: {"Élève 1": "no"}})  # autre session
+    conflits = stockage.ecrire_lot(RECENTE, {creneau: {"Élève 1": "", "Élève 2": "yes"}}, vus)
+    assert conflits == [("Lundi", "Français", "Élève 1", "no", "")]
+    assert stockage.statuts_creneau(RECENTE, *creneau) == {"Élève 1": "no", "Élève 2": "yes"}
+
+
+def test_ecrire_lot_voit_une_cellule_revenue_a_son_statut(stockage):
+    creneau = ("Lundi", "Français")
+    stockage.ecrire_lot(RECENTE, {creneau: {"Élève 1": "yes"}})
+    version = stockage.version
+    vus = stockage.statuts_semaine(RECENTE)
+    # Autres sessions : Élève 1 passe à absent puis revient à présent, Élève 3 ailleurs
+    stockage.ecrire_lot(RECENTE, {creneau: {"Élève 1": "no"}})
+    stockage.ecrire_lot(RECENTE, {creneau: {"Élève 1": "yes"}, ("Mardi", "EPS"): {"Élève 3": "no"}})
+    conflits = stockage.ecrire_lot(RECENTE, {creneau: {"Élève 1": "", "Élève 2": "yes"},
+                                             ("Mardi", "EPS"): {"Élève 2": "no"}}, vus, version)
+    assert conflits == [("Lundi", "Français", "Élève 1", "yes", "")]
+    assert stockage.statuts_creneau(RECENTE, *creneau) == {"Élève 1": "yes", "Élève 2": "yes"}
+    assert stockage.statuts_creneau(RECENTE, "Mardi", "EPS") == {"Élève 2": "no", "Élève 3": "no"}
+
+
+def test_changements_depuis(stockage):
+    version = stockage.version
+    stockage.ecrire_presences(RECENTE, "Lundi", "EPS", {"Élève 1": "no"})
+    stockage.effacer_semaine(ANCIENNE)
+    assert stockage.changements_depuis(version) == (stockage.version, [(RECENTE, {"Élève 1"}), (ANCIENNE, None)])
+    stockage.ecrire_parametre("alertes", {"heures": 3})
+    assert stockage.changements_depuis(version) == (stockage.version, None)
+
+
+def test_comptes(stockage):
+    semaine = calendrier.semaine_iso(date.today() - timedelta(weeks=1))
+    stockage.ecrire_lot(semaine, {("Lundi", "EPS"): {"Élève 1": "yes", "Élève 2": "no"},
+                                  ("Mardi", "EPS"): {"Élève 1": "no"}})
+    comptes = stockage.comptes_par_eleve(semaine)
+    assert comptes["Élève 1"] == (1, 1)
+    assert comptes["Élève 2"] == (0, 1)
+    assert comptes.get("Élève 3", (0, 0)) == (0, 0)
+    assert stockage.comptes_par_creneau(semaine) == {("Lundi", "EPS"): (1, 1), ("Mardi", "EPS"): (0, 1)}